@@ -1,35 +1,113 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, UploadFile, File, Form, HTTPException, Depends, Header
+from fastapi.responses import HTMLResponse, FileResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi import Request
 import json
 import asyncio
+import hmac
 import os
+from contextlib import asynccontextmanager
 from pathlib import Path
 import time
-import tracemalloc  # Import tracemalloc for memory allocation tracking
-
-# Enable tracemalloc to trace memory allocations
-tracemalloc.start()
+import uuid
+from typing import Callable, Dict, Optional, Tuple
 
 # Import deep research functionality
 from langchain_azure_ai.chat_models import AzureAIChatCompletionsModel
 from azure.core.credentials import AzureKeyCredential
-from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.messages.ai import add_usage
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, START, END
 
 from prompts import query_writer_instructions, summarizer_instructions, reflection_instructions, get_current_date
-from formatting import deduplicate_and_format_sources, format_sources
+from prompts import multi_query_writer_instructions, multi_reflection_instructions
+from formatting import deduplicate_and_format_sources, format_sources, format_final_summary
 from states import SummaryState, SummaryStateInput, SummaryStateOutput
+from configuration import Configuration, ConfigurationError
+from streaming import DeltaCoalescer
+from think_parser import ThinkTagParser, strip_thinking_tokens
+from sessions import SessionRegistry
+from search_client import SearchClient
+from caching import search_cache_from_env
+from llm_cache import LLMResponseCache, llm_cache_from_env, llm_cache_key, sampling_params
+from stopping import LoopSignals, StoppingPolicy, has_knowledge_gap, is_repeated_query, new_source_share
+from checkpoints import CheckpointStore, checkpoint_store_from_env
+from batch import DEFAULT_BATCH_DIR, BatchRunner, parse_topics, read_topics
+from context_budget import PromptUsage, fit_sections, token_counter_from_env, trim_paragraphs
+from fingerprints import FingerprintIndex, simhash, source_text
+from rate_limit import get_rate_limiter, rate_limit_stats, without_sdk_retries
+from metrics import MetricsRegistry, timed
+from memory_profile import memory_profiler_from_env
+from cassette import cassette_from_env
+from json_extract import JSONObjectExtractor, extract_json_object
+from prefetch import SearchPrefetcher
 
-from tavily import AsyncTavilyClient
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
-app = FastAPI(title="Azure Deep Research")
+# Records or replays model and search calls when CASSETTE_MODE is record or replay
+cassette = cassette_from_env()
+
+# Memory tracing is off unless MEMORY_TRACE is set; it can also be started through the admin endpoints
+memory_profiler = memory_profiler_from_env()
+
+# Searches started while the query and reflection steps are still streaming, when pipelined_search is set
+search_prefetcher = SearchPrefetcher()
+
+# Shared search client, optional LLM response cache and compiled graph, created in the app lifespan
+search_client: SearchClient = None
+llm_cache: LLMResponseCache = None
+research_graph = None
+checkpoint_store: CheckpointStore = None
+
+# Batch jobs started through the HTTP API, keyed by batch id
+batch_dir = Path(os.getenv("BATCH_DIR", str(DEFAULT_BATCH_DIR)))
+batches: Dict[str, Tuple[BatchRunner, asyncio.Task]] = {}
+
+# Prompt token counting and per-node usage, shared by every run
+token_counter = token_counter_from_env()
+prompt_usage = PromptUsage()
+
+# Prometheus metrics served at /metrics; gauges are read from the app's own stats when scraped
+metrics = MetricsRegistry(prefix="deep_research_")
+node_duration = metrics.histogram("node_duration_seconds", "Time spent in each research graph node", labels=("node",))
+llm_calls_total = metrics.counter("llm_calls_total", "Model calls, by node (cached answers excluded)", labels=("node",))
+llm_tokens_total = metrics.counter("llm_tokens_total", "Model tokens by node and kind (prompt, completion, reasoning)", labels=("node", "kind"))
+search_queries_total = metrics.counter("search_queries_total", "Search queries run by the web_research node, cached or not")
+json_retries_total = metrics.counter("llm_json_retries_total", "Model calls repeated because the answer had no usable JSON object", labels=("node",))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled search client and one compiled graph serve every research run in this process
+    global search_client, llm_cache, research_graph, checkpoint_store
+    search_cache = search_cache_from_env()
+    search_client = SearchClient.from_env(cache=search_cache, cassette=cassette)
+    llm_cache = llm_cache_from_env()
+    checkpoint_store = await checkpoint_store_from_env()
+    research_graph = setup_graph(checkpointer=checkpoint_store.saver if checkpoint_store is not None else None)
+    # Load the tokenizer off the event loop; it may have to be downloaded once
+    await asyncio.to_thread(lambda: token_counter.encoding)
+    try:
+        yield
+    finally:
+        # Stop running batches; their finished reports are already on disk
+        for _, task in batches.values():
+            task.cancel()
+        await asyncio.gather(*(task for _, task in batches.values()), return_exceptions=True)
+        await search_client.aclose()
+        if search_cache is not None:
+            search_cache.close()
+        if llm_cache is not None:
+            llm_cache.close()
+        if checkpoint_store is not None:
+            await checkpoint_store.close()
+        cassette.close()
+
+app = FastAPI(title="Azure Deep Research", lifespan=lifespan)
 
 # Mount static files
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
@@ -37,47 +115,240 @@ app.mount("/static", StaticFiles(directory="app/static"), name="static")
 # Set up templates
 templates = Jinja2Templates(directory="app/templates")
 
-# Store active connections
-active_connections = {}
-images = []
+# Research sessions keyed by client_id
+sessions = SessionRegistry(
+    queue_size=int(os.getenv("OUTBOUND_QUEUE_SIZE", "256")),
+    queue_policy=os.getenv("OUTBOUND_QUEUE_POLICY", "drop"),
+)
+
+metrics.gauge("active_sessions", "Sessions with a connected websocket or a run in flight", lambda: len(sessions))
+metrics.gauge("running_sessions", "Sessions with a research run in flight", lambda: sum(1 for s in sessions if s.is_running))
+metrics.gauge("outbound_queued_messages", "Messages waiting in the websocket send queues", lambda: sum(len(s.outbound) for s in sessions if s.outbound is not None))
+metrics.gauge("outbound_max_queue_depth", "Deepest any open websocket send queue has been", lambda: max((s.outbound.max_depth for s in sessions if s.outbound is not None), default=0))
+metrics.gauge("batch_topics_pending", "Batch topics not yet researched", lambda: sum(runner.stats()["remaining"] for runner, _ in batches.values()))
+metrics.gauge("search_pool_in_use", "Search requests holding a pooled connection", lambda: search_client.in_use if search_client else None)
+metrics.counter_function("search_requests_total", "Search requests sent to Tavily (cache misses)", lambda: search_client.requests if search_client else None)
+metrics.counter_function("search_errors_total", "Search requests that failed", lambda: search_client.errors if search_client else None)
+metrics.gauge("cache_hit_ratio", "Share of lookups answered from cache", lambda: {
+    "search": search_client.cache.stats()["hit_ratio"] if search_client and search_client.cache is not None else None,
+    "llm": llm_cache.stats()["hit_ratio"] if llm_cache is not None else None,
+}, labels=("cache",))
+metrics.counter_function("rate_limit_retries_total", "Calls retried after a throttled or failed request", lambda: {
+    name: stats["retries"] for name, stats in rate_limit_stats().items()
+}, labels=("limiter",))
+metrics.counter_function("rate_limit_throttled_total", "Throttling responses (429) received", lambda: {
+    name: stats["throttled"] for name, stats in rate_limit_stats().items()
+}, labels=("limiter",))
+metrics.counter_function("search_prefetches_total", "Searches started while a query was still streaming, by outcome", lambda: {
+    outcome: search_prefetcher.stats()[outcome] for outcome in ("used", "discarded")
+}, labels=("outcome",))
 
 # Initialize Azure AI models
 endpoint = os.getenv("AZURE_INFERENCE_ENDPOINT")
 model_name = os.getenv("AZURE_DEEPSEEK_DEPLOYMENT")
 key = os.getenv("AZURE_AI_API_KEY")
 
-# Set up the AI model
-deep_seek_model = AzureAIChatCompletionsModel(
-    endpoint=endpoint,
-    credential=AzureKeyCredential(key),
-    model_name=model_name,  
-)
+# Set up the AI models, one client per deployment
+models = {}
+
+def get_model(deployment: str = None):
+    deployment = deployment or model_name
+    if deployment not in models:
+        models[deployment] = cassette.wrap_model(AzureAIChatCompletionsModel(
+            endpoint=endpoint,
+            credential=AzureKeyCredential(key),
+            model_name=deployment,
+            **without_sdk_retries(AzureAIChatCompletionsModel),
+        ))
+    return models[deployment]
 
+deep_seek_model = get_model(model_name)
 
 
-# Helper function to strip thinking tokens
-def strip_thinking_tokens(text: str):
+
+# Helper function to call the model, going through the response cache for nodes that opted in
+async def invoke_model(node: str, messages, configuration: Configuration, client_id: str = None, answer_delta_type: str = None,
+                       until: Optional[Callable[[str], bool]] = None) -> str:
+    """
+    Stream a completion, forwarding coalesced thinking deltas (and answer deltas
+    when answer_delta_type is set) to the client, and return the full text.
+
+    until, if given, is called with each chunk of text; once it returns True the
+    stream is closed, which cancels the rest of the generation. A completion it
+    never accepted is not cached, so a retry asks the model again.
+    """
+    deployment = configuration.llm_deployment or model_name
+    model = get_model(deployment)
+
+    key = None
+    if llm_cache is not None and llm_cache.enabled_for(node):
+        key = llm_cache_key(deployment, messages, sampling_params(model))
+        content = llm_cache.get(key)
+        if content is not None:
+            return content
+
+    session = sessions.get(client_id)
+    if session is not None:
+        session.llm_calls += 1
+    prompt_tokens = token_counter.count_messages(messages)
+
+    send = lambda message: sessions.send(client_id, message)
+    call = {"node": node, "call": uuid.uuid4().hex}
+    thinking = DeltaCoalescer(send, "thinking_delta", call)
+    answer = DeltaCoalescer(send, answer_delta_type, call) if answer_delta_type else None
+
+    parser = ThinkTagParser()
+
+    async def forward(segments):
+        for is_thinking, text in segments:
+            if is_thinking:
+                await thinking.add(text)
+            elif answer is not None:
+                await answer.add(text)
+
+    # Reserve the prompt against the deployment's token budget; the completion is settled afterwards
+    limiter = get_rate_limiter("llm", endpoint, deployment)
+    parts = []
+    usage = None
+    complete = until is None
+    stream = limiter.stream(lambda: model.astream(messages), tokens=prompt_tokens)
+    try:
+        async for chunk in stream:
+            if chunk.usage_metadata:
+                usage = add_usage(usage, chunk.usage_metadata)
+            content = chunk.content
+            if not content:
+                continue
+            parts.append(content)
+            if client_id is not None:
+                await forward(parser.feed(content))
+            if until is not None and until(content):
+                complete = True
+                break
+    finally:
+        await stream.aclose()
+    if client_id is not None:
+        await forward(parser.close())
+    await thinking.flush()
+    if answer is not None:
+        await answer.flush()
+
+    content = "".join(parts)
+    prompt_usage.record(node, prompt_tokens, usage)
+    if usage and usage.get("input_tokens"):
+        token_counter.calibrate(messages, usage["input_tokens"])
+    limiter.settle(prompt_tokens, usage["total_tokens"] if usage else prompt_tokens + token_counter.count(content))
+
+    completion_tokens = usage["output_tokens"] if usage else token_counter.count(content)
+    reasoning_tokens = (usage or {}).get("output_token_details", {}).get("reasoning")
+    if reasoning_tokens is None and "<think>" in content:
+        # Reasoning deployments that do not report it separately think inside <think> tags
+        reasoning_tokens = token_counter.count(strip_thinking_tokens(content)[0])
+    llm_calls_total.inc(1, node)
+    llm_tokens_total.inc(usage["input_tokens"] if usage else prompt_tokens, node, "prompt")
+    llm_tokens_total.inc(completion_tokens, node, "completion")
+    llm_tokens_total.inc(reasoning_tokens or 0, node, "reasoning")
+
+    if key is not None and complete:
+        llm_cache.set(key, content)
+    return content
+
+# Helper function to get a JSON object from the model, asking again (within a budget) when an answer has none
+async def invoke_for_json(node: str, messages, configuration: Configuration, required: Tuple[str, ...], client_id: str = None,
+                          on_field: Optional[Callable[[str, object], None]] = None):
     """
-    Extract the content between <think> and </think> tags and remove them from the text.
+    Stream a completion only until its first JSON object with the required keys
+    closes. Returns the thoughts and that object, or None once
+    configuration.max_json_retries further attempts have failed too. on_field
+    sees each top-level field as soon as it has streamed.
     """
-    thoughts = ""
-    while "<think>" in text and "</think>" in text:
-        start = text.find("<think>")
-        end = text.find("</think>")
-        # Extract the content between tags (excluding the tags themselves)
-        thoughts += text[start + len("<think>"):end].strip() + "\n\n"
-        # Remove the tags and their content from the original text
-        text = text[:start] + text[end + len("</think>"):]
-    return thoughts.strip(), text.strip()
+    thoughts = []
+    for attempt in range(configuration.max_json_retries + 1):
+        if attempt:
+            json_retries_total.inc(1, node)
+        extractor = JSONObjectExtractor(required, on_field=on_field)
+        content = await invoke_model(node, messages, configuration, client_id=client_id, until=extractor.feed)
+        attempt_thoughts, text = strip_thinking_tokens(content)
+        thoughts.append(attempt_thoughts)
+        # A cached answer never went through the extractor
+        result = extractor.close() or extract_json_object(content, required)
+        if result is not None:
+            break
+        messages = [*messages, AIMessage(content=text), HumanMessage(
+            content=f"Your answer did not contain a JSON object with the keys {', '.join(required)}. Reply with only that JSON object."
+        )]
+    return "\n\n".join(t for t in thoughts if t), result
+
+# Helper function to read one or several queries from the model's JSON answer
+def as_query_list(value, limit: int):
+    queries = [value] if isinstance(value, str) else list(value or [])
+    return [query for query in queries if isinstance(query, str) and query.strip()][:limit]
+
+# Helper function to estimate the prompt tokens a source adds to the summarizer context: its snippet,
+# plus at most the per-source budget of its full page
+def source_tokens(result: dict, fetch_full_page: bool, max_tokens_per_source: int = 1000) -> int:
+    tokens = token_counter.count(result.get("content") or "")
+    if fetch_full_page:
+        page = (result.get("raw_content") or "")[:max_tokens_per_source * 4]
+        tokens += min(token_counter.count(page), max_tokens_per_source)
+    return tokens
+
+# Helper function to search for one query the way web_research does
+def run_search(query: str, configuration: Configuration):
+    return search_client.search(
+        query, 
+        max_results=1, 
+        max_tokens_per_source=1000,
+        include_raw_content=configuration.fetch_full_page,
+        include_images=True
+    )
+
+# Helper function that starts the search for each query of a streamed answer as soon as the query field is complete,
+# so the search runs while the rest of the answer is still generating
+def prefetch_searches(config: RunnableConfig, configuration: Configuration, query_key: str):
+    run_id = (config or {}).get("configurable", {}).get("thread_id")
+    if not configuration.pipelined_search or run_id is None:
+        return None
+
+    def on_field(key, value):
+        if key == query_key:
+            for query in as_query_list(value, configuration.queries_per_loop):
+                search_prefetcher.start(run_id, query, lambda query=query: run_search(query, configuration))
+    return on_field
+
+# Helper function that passes the follow-up queries on to prefetch only when the stopping policy would run another loop,
+# judging the knowledge gap and the queries from the reflection as they stream (the gap comes first)
+def continuing_only(prefetch, state: SummaryState, configuration: Configuration, query_key: str):
+    policy = StoppingPolicy.from_configuration(configuration)
+    signals = LoopSignals.from_state(state)
+    signals.knowledge_gap, signals.repeated_query = True, False
+
+    def on_field(key, value):
+        if key == "knowledge_gap":
+            signals.knowledge_gap = has_knowledge_gap(value if isinstance(value, str) else None)
+        elif key == query_key:
+            signals.repeated_query = is_repeated_query(as_query_list(value, configuration.queries_per_loop), state.queries_tried)
+            if policy.stop_reason(state.research_loop_count, signals) is None:
+                prefetch(key, value)
+    return on_field
 
 # Step 1: Generate a query to search the web for the latest info
-async def generate_query(state: SummaryState):
+async def generate_query(state: SummaryState, config: RunnableConfig):
+    configuration = Configuration.from_runnable_config(config)
+
     # Format the prompt
     current_date = get_current_date()
-    formatted_prompt = query_writer_instructions.format(
-        current_date=current_date,
-        research_topic=state.research_topic
-    )
+    if configuration.queries_per_loop > 1:
+        formatted_prompt = multi_query_writer_instructions.format(
+            number_of_queries=configuration.queries_per_loop,
+            current_date=current_date,
+            research_topic=state.research_topic
+        )
+    else:
+        formatted_prompt = query_writer_instructions.format(
+            current_date=current_date,
+            research_topic=state.research_topic
+        )
 
     messages = [
         SystemMessage(content=formatted_prompt),
@@ -85,165 +356,255 @@ async def generate_query(state: SummaryState):
     ]
 
     # Use the model to analyze the summary and decide whether to continue research or finalize it
-    result = await deep_seek_model.ainvoke(messages)
-    
-    thoughts, text = strip_thinking_tokens(result.content)
+    query_key = "queries" if configuration.queries_per_loop > 1 else "query"
+    thoughts, query = await invoke_for_json("generate_query", messages, configuration, (query_key,), client_id=state.websocket_id,
+                                            on_field=prefetch_searches(config, configuration, query_key))
 
     # Send thinking update to client
-    if state.websocket_id in active_connections:
-        await active_connections[state.websocket_id].send({
-            "type": "thinking", 
-            "data": {"thoughts": thoughts}
-        })
-
-    query = json.loads(text)
-    search_query = query['query']
-    rationale = query['rationale']
+    await sessions.send(state.websocket_id, {
+        "type": "thinking", 
+        "data": {"thoughts": thoughts}
+    })
+
+    # Without a usable answer, or with an empty query list, search for the topic itself rather than ending the run
+    search_queries = as_query_list(query[query_key], configuration.queries_per_loop) if query else []
+    search_queries = search_queries or [state.research_topic]
+    search_query = search_queries[0]
+    rationale = query.get('rationale', "") if query else ""
     # Send update to client
-    if state.websocket_id in active_connections:
-        await active_connections[state.websocket_id].send({
-            "type": "generate_query", 
-            "data": {"query": search_query, "rationale": rationale, "thoughts": thoughts}
-        })
+    await sessions.send(state.websocket_id, {
+        "type": "generate_query", 
+        "data": {"query": search_query, "queries": search_queries, "rationale": rationale, "thoughts": thoughts}
+    })
     
-    return {"search_query": search_query, "rationale": rationale}
+    return {"search_query": search_query, "search_queries": search_queries, "rationale": rationale}
 
 
 # Step 2: Look for that info online and get the results in a specific format
-async def web_research(state: SummaryState):
-    tavily_client = AsyncTavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
-    search_results = await tavily_client.search(
-        state.search_query, 
-        max_results=1, 
+async def web_research(state: SummaryState, config: RunnableConfig):
+    configuration = Configuration.from_runnable_config(config)
+
+    # Run every query of this loop concurrently
+    search_queries = state.search_queries or [state.search_query]
+    session = sessions.get(state.websocket_id)
+    if session is not None:
+        session.search_calls += len(search_queries)
+    search_queries_total.inc(len(search_queries))
+    # Searches the previous step started while streaming are picked up; any it started for other queries are cancelled
+    run_id = config.get("configurable", {}).get("thread_id")
+    searches = [search_prefetcher.take(run_id, query) or run_search(query, configuration) for query in search_queries]
+    search_prefetcher.discard(run_id)
+    responses = await asyncio.gather(*searches)
+
+    # Merge the responses, keeping the first result for each URL
+    results = {}
+    images = []
+    for response in responses:
+        for result in response.get('results', []):
+            results.setdefault(result['url'], result)
+        images.extend(response.get('images', []))
+
+    # Full pages are cut down to the passages that best match this loop's queries and the topic
+    format_results = lambda response: deduplicate_and_format_sources(
+        response,
         max_tokens_per_source=1000,
-        include_raw_content=False,
-        include_images=True
+        fetch_full_page=configuration.fetch_full_page,
+        query=" ".join([*search_queries, state.research_topic or ""]),
+        count_tokens=token_counter.count,
     )
-    
-    for image in search_results.get('images', []):
-        images.append(image)
 
-    search_str = deduplicate_and_format_sources(search_results, max_tokens_per_source=1000)
+    # Drop sources whose content nearly matches one already summarized in this run or earlier in this batch
+    fingerprints = []
+    duplicate_urls = set()
+    tokens_saved = 0
+    if configuration.near_duplicate_distance >= 0:
+        index = FingerprintIndex(state.fingerprints, max_distance=configuration.near_duplicate_distance)
+        # Hashing full pages is CPU-bound, so it runs off the event loop
+        page_fingerprints = await asyncio.to_thread(lambda: [simhash(source_text(result)) for result in results.values()])
+        for (url, result), fingerprint in zip(list(results.items()), page_fingerprints):
+            if fingerprint is None:
+                continue
+            if index.find(fingerprint) is not None:
+                del results[url]
+                duplicate_urls.add(url)
+                tokens_saved += source_tokens(result, configuration.fetch_full_page)
+                continue
+            index.add(fingerprint)
+            fingerprints.append(fingerprint)
+
+    search_results = {"results": list(results.values()), "images": images}
+    urls = list(results)
+    seen_urls = set(state.source_urls)
+    new_urls = [url for url in urls if url not in seen_urls]
+    duplicates = len(duplicate_urls)
     
+    if session is not None:
+        session.images.extend(images)
+        session.sources.extend(search_results['results'])
+        session.duplicate_sources += duplicates
+        session.duplicate_tokens_saved += tokens_saved
+
+    # BM25 passage selection over full pages is CPU-bound too
+    search_str = await asyncio.to_thread(format_results, search_results)
+
     # Send update to client
-    if state.websocket_id in active_connections:
-        await active_connections[state.websocket_id].send({
-            "type": "web_research", 
-            "data": {
-                "sources": search_results.get('results', []),
-                "images": search_results.get('images', [])
-            }
-        })
+    await sessions.send(state.websocket_id, {
+        "type": "web_research", 
+        "data": {
+            "sources": search_results['results'],
+            "images": images,
+            "duplicates_dropped": duplicates,
+            "duplicate_tokens_saved": tokens_saved
+        }
+    })
     
     return {
         "sources_gathered": [format_sources(search_results)], 
         "research_loop_count": state.research_loop_count + 1, 
-        "web_research_results": [search_str]
+        "web_research_results": [search_str],
+        "queries_tried": search_queries,
+        "source_urls": new_urls,
+        # Near-duplicates count as sources already seen
+        "new_source_share": new_source_share(urls + list(duplicate_urls), seen_urls | duplicate_urls),
+        "fingerprints": fingerprints,
+        "images": images,
     }
 
-# Step 3: Summarize web research results
-async def summarize_sources(state: SummaryState):
-    # Existing summary
-    existing_summary = state.running_summary
-    
-    # Most recent web research
-    most_recent_web_research = state.web_research_results[-1]
-    
+# Helper function to build the summarizer prompt
+def summary_messages(research_topic: str, existing_summary: str, most_recent_web_research: str):
     # Build the human message
     if existing_summary:
         human_message_content = (
             f"<Existing Summary> \n {existing_summary} \n </Existing Summary>\n\n"
             f"<New Context> \n {most_recent_web_research} \n </New Context>"
-            f"Update the Existing Summary with the New Context on this topic: \n <User Input> \n {state.research_topic} \n </User Input>\n\n"
+            f"Update the Existing Summary with the New Context on this topic: \n <User Input> \n {research_topic} \n </User Input>\n\n"
         )
     else:
         human_message_content = (
             f"<Context> \n {most_recent_web_research} \n </Context>"
-            f"Create a Summary using the Context on this topic: \n <User Input> \n {state.research_topic} \n </User Input>\n\n"
+            f"Create a Summary using the Context on this topic: \n <User Input> \n {research_topic} \n </User Input>\n\n"
         )
     
-    messages = [
+    return [
         SystemMessage(content=summarizer_instructions),
         HumanMessage(content=human_message_content)
     ]
 
+# Step 3: Summarize web research results
+async def summarize_sources(state: SummaryState, config: RunnableConfig):
+    configuration = Configuration.from_runnable_config(config)
+
+    # Existing summary
+    existing_summary = state.running_summary
+    
+    # Most recent web research
+    most_recent_web_research = state.web_research_results[-1]
+
+    messages = summary_messages(state.research_topic, existing_summary, most_recent_web_research)
+
+    # Keep the prompt within the token budget. The oldest paragraphs of the existing summary are
+    # trimmed first and set aside unchanged, then the end of the new context if that is not enough
+    archived_summary = ""
+    prompt_tokens = token_counter.count_messages(messages)
+    if 0 < configuration.max_prompt_tokens < prompt_tokens:
+        sections = [(existing_summary or "", "end"), (most_recent_web_research, "start")]
+        fixed_tokens = prompt_tokens - sum(token_counter.count(text) for text, _ in sections)
+        (existing_summary, most_recent_web_research), (archived_summary, _) = fit_sections(
+            sections, max(configuration.max_prompt_tokens - fixed_tokens, 0), token_counter
+        )
+        messages = summary_messages(state.research_topic, existing_summary, most_recent_web_research)
+        prompt_usage.record_trim("summarize_sources", prompt_tokens - token_counter.count_messages(messages))
+        # The set-aside text comes back into the summary every loop, so it gets a budget of its own
+        archived_summary, _ = trim_paragraphs(archived_summary, configuration.max_archived_summary_tokens, token_counter)
+
     # Use the model to analyze the summary and decide whether to continue research or finalize it
-    result = await deep_seek_model.ainvoke(messages)
+    content = await invoke_model("summarize_sources", messages, configuration, client_id=state.websocket_id, answer_delta_type="summary_delta")
     
-    thoughts, text = strip_thinking_tokens(result.content)
+    thoughts, text = strip_thinking_tokens(content)
 
     # Send thinking update to client
-    if state.websocket_id in active_connections:
-        await active_connections[state.websocket_id].send({
-            "type": "thinking", 
-            "data": {"thoughts": thoughts}
-        })
+    await sessions.send(state.websocket_id, {
+        "type": "thinking", 
+        "data": {"thoughts": thoughts}
+    })
 
-    running_summary = text
+    running_summary = f"{archived_summary}\n\n{text}" if archived_summary else text
     
     # Send update to client
-    if state.websocket_id in active_connections:
-        await active_connections[state.websocket_id].send({
-            "type": "summarize", 
-            "data": {"summary": running_summary}
-        })
+    await sessions.send(state.websocket_id, {
+        "type": "summarize", 
+        "data": {"summary": running_summary}
+    })
     
-    return {"running_summary": running_summary}
+    return {"running_summary": running_summary, "previous_summary": state.running_summary}
 
 # Step 4: Reflect on the summary and identify areas for further research
-async def reflect_on_summary(state: SummaryState):
+async def reflect_on_summary(state: SummaryState, config: RunnableConfig):
+    configuration = Configuration.from_runnable_config(config)
+
+    system_message = SystemMessage(content=multi_reflection_instructions.format(research_topic=state.research_topic, number_of_queries=configuration.queries_per_loop)
+                                   if configuration.queries_per_loop > 1 else
+                                   reflection_instructions.format(research_topic=state.research_topic))
+    reflect_message = lambda summary: HumanMessage(content=f"Reflect on our existing knowledge: \n === \n {summary}, \n === \n And now identify a knowledge gap and generate a follow-up web search query:")
+    messages = [system_message, reflect_message(state.running_summary)]
+
+    # Keep the prompt within the token budget by leaving out the oldest paragraphs of the summary
+    prompt_tokens = token_counter.count_messages(messages)
+    if 0 < configuration.max_prompt_tokens < prompt_tokens:
+        summary = state.running_summary or ""
+        available = configuration.max_prompt_tokens - (prompt_tokens - token_counter.count(summary))
+        (summary,), _ = fit_sections([(summary, "end")], max(available, 0), token_counter)
+        messages = [system_message, reflect_message(summary)]
+        prompt_usage.record_trim("reflect_on_summary", prompt_tokens - token_counter.count_messages(messages))
+
     # Use the model to analyze the summary and decide whether to continue research or finalize it
-    result = await deep_seek_model.ainvoke(
-        [
-            SystemMessage(content=reflection_instructions.format(research_topic=state.research_topic)),
-            HumanMessage(content=f"Reflect on our existing knowledge: \n === \n {state.running_summary}, \n === \n And now identify a knowledge gap and generate a follow-up web search query:")
-        ]
-    )
-    
-    thoughts, text = strip_thinking_tokens(result.content)
+    query_key = "follow_up_queries" if configuration.queries_per_loop > 1 else "follow_up_query"
+    on_field = prefetch_searches(config, configuration, query_key)
+    if on_field is not None:
+        on_field = continuing_only(on_field, state, configuration, query_key)
+    thoughts, reflection_content = await invoke_for_json("reflect_on_summary", messages, configuration, (query_key, "knowledge_gap"),
+                                                         client_id=state.websocket_id, on_field=on_field)
     
     # Send thinking update to client
-    if state.websocket_id in active_connections:
-        await active_connections[state.websocket_id].send({
-            "type": "thinking", 
-            "data": {"thoughts": thoughts}
-        })
+    await sessions.send(state.websocket_id, {
+        "type": "thinking", 
+        "data": {"thoughts": thoughts}
+    })
     
     try:
-        # Try to parse as JSON first
-        reflection_content = json.loads(text)
-        # Get the follow-up query
-        query = reflection_content['follow_up_query']
+        # Get the follow-up queries
+        queries = as_query_list(reflection_content[query_key], configuration.queries_per_loop)
+        query = queries[0] if queries else None
         knowledge_gap = reflection_content['knowledge_gap']
         
         # Send reflection update to client
-        if state.websocket_id in active_connections:
-            await active_connections[state.websocket_id].send({
-                "type": "reflection", 
-                "data": {"query": query, "knowledge_gap": knowledge_gap}
-            })
+        await sessions.send(state.websocket_id, {
+            "type": "reflection", 
+            "data": {"query": query, "queries": queries, "knowledge_gap": knowledge_gap}
+        })
         
         # Check if query is None or empty
         if not query:
             # Use a fallback query
-            return {"search_query": f"Tell me more about {state.research_topic}", "knowledge_gap": ""}
-        return {"search_query": query, "knowledge_gap": knowledge_gap}
-    except (json.JSONDecodeError, KeyError, AttributeError):
+            fallback_query = f"Tell me more about {state.research_topic}"
+            return {"search_query": fallback_query, "search_queries": [fallback_query], "knowledge_gap": ""}
+        return {"search_query": query, "search_queries": queries, "knowledge_gap": knowledge_gap}
+    except (KeyError, AttributeError, TypeError):
         # If parsing fails or the key is not found, use a fallback query
         fallback_query = f"Tell me more about {state.research_topic}"
         
         # Send fallback update to client
-        if state.websocket_id in active_connections:
-            await active_connections[state.websocket_id].send({
-                "type": "reflection", 
-                "data": {"query": fallback_query, "knowledge_gap": "Unable to identify specific knowledge gap"}
-            })
+        await sessions.send(state.websocket_id, {
+            "type": "reflection", 
+            "data": {"query": fallback_query, "knowledge_gap": "Unable to identify specific knowledge gap"}
+        })
             
-        return {"search_query": fallback_query}
+        return {"search_query": fallback_query, "search_queries": [fallback_query]}
 
 # Step 5: Finalize the summary
 async def finalize_summary(state: SummaryState):
     # Format the final summary with images and sources
+    images = state.images
     
     # Add images section if any images were collected during research
     image_section = ""
@@ -270,47 +631,57 @@ async def finalize_summary(state: SummaryState):
 """
     
     # Add the image section at the beginning of the summary
-    final_summary = f"{image_section}## Summary\n{state.running_summary}\n\n### Sources:\n"
-    for source in state.sources_gathered:
-        final_summary += f"{source}\n"
+    final_summary = format_final_summary(state.running_summary, state.sources_gathered, header=image_section)
     
     # Send update to client
-    if state.websocket_id in active_connections:
-        await active_connections[state.websocket_id].send({
-            "type": "finalize", 
-            "data": {"summary": final_summary}
-        })
+    await sessions.send(state.websocket_id, {
+        "type": "finalize", 
+        "data": {"summary": final_summary}
+    })
     
     return {"running_summary": final_summary}
 
 # Conditional function that decides whether to continue research or finalize summary
-async def route_research(state: SummaryState):
-    if state.research_loop_count <= 3:
+async def route_research(state: SummaryState, config: RunnableConfig):
+    configuration = Configuration.from_runnable_config(config)
+    policy = StoppingPolicy.from_configuration(configuration)
+    signals = LoopSignals.from_state(state)
+    reason = policy.stop_reason(state.research_loop_count, signals)
+    if reason is None:
         # Send update to client
-        if state.websocket_id in active_connections:
-            await active_connections[state.websocket_id].send({
-                "type": "routing", 
-                "data": {"decision": "continue", "loop_count": state.research_loop_count}
-            })
+        await sessions.send(state.websocket_id, {
+            "type": "routing", 
+            "data": {"decision": "continue", "loop_count": state.research_loop_count, "signals": signals.as_dict()}
+        })
         return "web_research"
     else:
+        loops_saved = policy.loops_saved(state.research_loop_count)
+        session = sessions.get(state.websocket_id)
+        if session is not None:
+            session.stop_reason = reason
+            session.loops_saved = loops_saved
+
         # Send update to client
-        if state.websocket_id in active_connections:
-            await active_connections[state.websocket_id].send({
-                "type": "routing", 
-                "data": {"decision": "finalize", "loop_count": state.research_loop_count}
-            })
+        await sessions.send(state.websocket_id, {
+            "type": "routing", 
+            "data": {"decision": "finalize", "loop_count": state.research_loop_count, "reason": reason,
+                     "loops_saved": loops_saved, "signals": signals.as_dict()}
+        })
         return "finalize_summary"
 
 # Set up the graph
-def setup_graph():
+def setup_graph(checkpointer=None):
     # Add nodes and edges
     builder = StateGraph(SummaryState, input=SummaryStateInput, output=SummaryStateOutput)
-    builder.add_node("generate_query", generate_query)
-    builder.add_node("web_research", web_research)
-    builder.add_node("summarize_sources", summarize_sources)
-    builder.add_node("reflect_on_summary", reflect_on_summary)
-    builder.add_node("finalize_summary", finalize_summary)
+    # Each node records its latency in the node_duration_seconds histogram
+    for name, node in (
+        ("generate_query", generate_query),
+        ("web_research", web_research),
+        ("summarize_sources", summarize_sources),
+        ("reflect_on_summary", reflect_on_summary),
+        ("finalize_summary", finalize_summary),
+    ):
+        builder.add_node(name, timed(node_duration, name)(node))
     
     # Add edges
     builder.add_edge(START, "generate_query")
@@ -320,118 +691,331 @@ def setup_graph():
     builder.add_conditional_edges("reflect_on_summary", route_research)
     builder.add_edge("finalize_summary", END)
     
-    return builder.compile()
+    # With a checkpointer, every finished node is saved under the run's thread id
+    return builder.compile(checkpointer=checkpointer)
 
-# WebSocket connection handler
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections = {}
-        
-    def connect(self, websocket: WebSocket, client_id: str):
-        # Store the websocket but don't call accept() here
-        self.active_connections[client_id] = websocket
-        active_connections[client_id] = self
-        
-    def disconnect(self, client_id: str):
-        if client_id in self.active_connections:
-            del self.active_connections[client_id]
-        if client_id in active_connections:
-            del active_connections[client_id]
+# Stream a new or resumed research run to the client, recording its outcome for resumption
+async def run_research(session, client_id: str, run_id: str, graph_input: Optional[dict], configurable: dict):
+    status = "interrupted"
+    summary = None
+    try:
+        async for event in research_graph.astream(graph_input, config={"configurable": {**configurable, "thread_id": run_id}}):
+            # Extract the node name and state from the event
+            node_name = next(iter(event.keys()), None)
+            node_state = event.get(node_name, {})
             
-    async def send(self, message: dict):
-        if self.active_connections:  # Check if there are any connections
-            client_id = list(self.active_connections.keys())[0]
-            await self.active_connections[client_id].send_json(message)
-
-# Initialize connection manager
-manager = ConnectionManager()
+            if node_name == "generate_query":
+                # Send query generation updates to the client
+                await sessions.send(client_id, {
+                    "type": "generate_query", 
+                    "data": {"query": node_state.get("search_query", ""),
+                             "rationale": node_state.get("rationale", "")}
+                })
+            elif node_name == "web_research":
+                # Send web research updates to the client
+                await sessions.send(client_id, {
+                    "type": "web_research", 
+                    "data": {
+                        "sources": node_state.get("sources_gathered"),
+                        "images": session.images  # Images collected by this session's run
+                    }
+                })
+            elif node_name == "summarize_sources":
+                # Send summary updates to the client
+                await sessions.send(client_id, {
+                    "type": "summarize", 
+                    "data": {"summary": node_state.get("running_summary", "")}
+                })
+            elif node_name == "reflect_on_summary":
+                # Send reflection updates to the client
+                await sessions.send(client_id, {
+                    "type": "reflection", 
+                    "data": {"query": node_state.get("search_query", ""),
+                             "knowledge_gap": node_state.get("knowledge_gap", "")}
+                })
+            elif node_name == "finalize_summary":
+                # Send final summary to the client
+                summary = node_state.get("running_summary", "")
+                await sessions.send(client_id, {
+                    "type": "finalize", 
+                    "data": {"summary": summary}
+                })
+                status = "complete"
+        
+        # Send a final message indicating research is complete
+        if status == "complete":
+            # From here on the run is done, so a client leaving on research_complete does not cancel it
+            session.run_complete = True
+            await sessions.send(client_id, {
+                "type": "research_complete",
+                "data": {"status": "complete", "run_id": run_id}
+            })
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        status = "failed"
+        raise
+    finally:
+        search_prefetcher.discard(run_id)
+        sessions.finish_run(client_id, completed=status == "complete")
+        if checkpoint_store is not None:
+            # Shielded so a second cancellation cannot lose the run's final status
+            await asyncio.shield(checkpoint_store.update_run(run_id, status, summary=summary))
+
+# Research one topic without a websocket client, for batch jobs
+async def research_topic(topic: str, configurable: dict) -> dict:
+    configurable = Configuration.configurable_from_request(configurable)
+    run_id = uuid.uuid4().hex
+    if checkpoint_store is not None:
+        await checkpoint_store.start_run(run_id, None, topic, configurable)
+    status = "interrupted"
+    summary = None
+    try:
+        result = await research_graph.ainvoke(
+            {"research_topic": topic, "websocket_id": None},
+            config={"configurable": {**configurable, "thread_id": run_id}},
+        )
+        summary = result["running_summary"]
+        status = "complete"
+        return {"run_id": run_id, "report": summary}
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        status = "failed"
+        raise
+    finally:
+        search_prefetcher.discard(run_id)
+        if checkpoint_store is not None:
+            await asyncio.shield(checkpoint_store.update_run(run_id, status, summary=summary))
+
+# Reset the session for a run. A full run makes one query call plus a summary and a
+# reflection per loop, and searches every query of a loop
+def begin_run(session, configurable: dict):
+    configuration = Configuration.from_runnable_config({"configurable": configurable})
+    session.start_run(
+        expected_llm_calls=1 + 2 * configuration.max_web_research_loops,
+        expected_search_calls=configuration.max_web_research_loops * configuration.queries_per_loop,
+    )
 
 # Routes
 @app.get("/", response_class=HTMLResponse)
 def get_html(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
+@app.get("/metrics")
+async def get_metrics():
+    # Rendered on the event loop, so the session registry is not read while a node changes it
+    return Response(metrics.render(), media_type=metrics.content_type)
+
+# Admin and batch endpoints require the ADMIN_TOKEN in an X-Admin-Token header, and are disabled when none is configured
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if not admin_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token.encode("utf-8"), admin_token.encode("utf-8")):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@app.get("/admin/sessions", dependencies=[Depends(require_admin)])
+def get_session_stats():
+    return sessions.session_stats()
+
+@app.get("/admin/memory", dependencies=[Depends(require_admin)])
+def get_memory():
+    return {**memory_profiler.stats(), "snapshot_list": memory_profiler.snapshots()}
+
+@app.post("/admin/memory/start", dependencies=[Depends(require_admin)])
+def start_memory_trace(frames: int = memory_profiler.frames):
+    try:
+        memory_profiler.start(frames)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return memory_profiler.stats()
+
+@app.post("/admin/memory/stop", dependencies=[Depends(require_admin)])
+def stop_memory_trace():
+    memory_profiler.stop()
+    return memory_profiler.stats()
+
+@app.post("/admin/memory/snapshots", dependencies=[Depends(require_admin)])
+async def take_memory_snapshot(label: Optional[str] = None):
+    if not memory_profiler.tracing:
+        raise HTTPException(status_code=409, detail="Memory tracing is not running")
+    # Record the session count with the snapshot, so a diff can be read per session
+    return await asyncio.to_thread(memory_profiler.take_snapshot, label, active_sessions=len(sessions))
+
+@app.get("/admin/memory/snapshots/{snapshot_id}", dependencies=[Depends(require_admin)])
+async def get_memory_top(snapshot_id: int, key_type: str = "lineno", limit: int = 20):
+    try:
+        return await asyncio.to_thread(memory_profiler.top, snapshot_id, key_type, limit)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown snapshot {snapshot_id}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/admin/memory/diff", dependencies=[Depends(require_admin)])
+async def get_memory_diff(first: int, second: int, key_type: str = "lineno", limit: int = 20):
+    try:
+        return await asyncio.to_thread(memory_profiler.diff, first, second, key_type, limit)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=f"Unknown snapshot {e.args[0]}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/stats")
+async def get_stats():
+    return {
+        **sessions.stats(),
+        "search_pool": search_client.stats(),
+        "search_cache": search_client.cache.stats() if search_client.cache is not None else None,
+        "llm_cache": llm_cache.stats() if llm_cache is not None else None,
+        "tokenizer": token_counter.stats(),
+        "prompt_tokens": prompt_usage.stats(),
+        "checkpoints": await checkpoint_store.stats() if checkpoint_store is not None else None,
+        "rate_limits": rate_limit_stats(),
+        "memory": memory_profiler.stats(),
+        "cassette": cassette.stats(),
+        "search_prefetch": search_prefetcher.stats(),
+    }
+
+# Start a batch job in the background, reading its topics from the stored input file
+def start_batch_job(batch_id: str, concurrency: int) -> BatchRunner:
+    if batch_id in batches and not batches[batch_id][1].done():
+        raise HTTPException(status_code=409, detail=f"Batch {batch_id} is already running")
+    runner = BatchRunner(research_topic, concurrency=concurrency)
+    runner.prepare(read_topics(batch_dir / f"{batch_id}.topics.jsonl"), batch_dir / f"{batch_id}.reports.jsonl")
+    task = asyncio.create_task(runner.run())
+    batches[batch_id] = (runner, task)
+    return runner
+
+@app.post("/batch", dependencies=[Depends(require_admin)])
+async def create_batch(file: UploadFile = File(...), concurrency: int = Form(int(os.getenv("BATCH_CONCURRENCY", "4")))):
+    """Research every topic of an uploaded JSONL file; reports are written as they complete."""
+    content = (await file.read()).decode("utf-8")
+    try:
+        topics = parse_topics(content.splitlines())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if concurrency < 1:
+        raise HTTPException(status_code=400, detail="concurrency must be at least 1")
+
+    batch_id = uuid.uuid4().hex
+    batch_dir.mkdir(parents=True, exist_ok=True)
+    with open(batch_dir / f"{batch_id}.topics.jsonl", "w", encoding="utf-8") as f:
+        f.writelines(json.dumps(topic, ensure_ascii=False) + "\n" for topic in topics)
+    runner = start_batch_job(batch_id, concurrency)
+    return {"batch_id": batch_id, **runner.stats()}
+
+@app.post("/batch/{batch_id}/resume", dependencies=[Depends(require_admin)])
+async def resume_batch(batch_id: str, concurrency: int = int(os.getenv("BATCH_CONCURRENCY", "4"))):
+    """Continue a batch, for example after a restart, skipping topics that already have reports."""
+    if not (batch_dir / f"{batch_id}.topics.jsonl").exists():
+        raise HTTPException(status_code=404, detail=f"Unknown batch {batch_id}")
+    runner = start_batch_job(batch_id, concurrency)
+    return {"batch_id": batch_id, **runner.stats()}
+
+@app.get("/batch/{batch_id}", dependencies=[Depends(require_admin)])
+def get_batch(batch_id: str):
+    if batch_id not in batches:
+        raise HTTPException(status_code=404, detail=f"Batch {batch_id} is not running in this process")
+    return {"batch_id": batch_id, **batches[batch_id][0].stats()}
+
+@app.get("/batch/{batch_id}/reports", dependencies=[Depends(require_admin)])
+def get_batch_reports(batch_id: str):
+    path = batch_dir / f"{batch_id}.reports.jsonl"
+    if not path.exists():
+        raise HTTPException(status_code=404, detail=f"No reports for batch {batch_id}")
+    return FileResponse(path, media_type="application/x-ndjson")
+
+# Tell the client its last message was rejected, leaving the connection open
+async def send_error(client_id: str, message: str):
+    await sessions.send(client_id, {"type": "error", "data": {"message": message}})
+
 @app.websocket("/ws/{client_id}")
 async def websocket_endpoint(websocket: WebSocket, client_id: str):
     await websocket.accept()  # Accept the connection first
-    manager.connect(websocket, client_id)
+    session = await sessions.connect(websocket, client_id)
     try:
-        # Set up the graph
-        graph = setup_graph()
-        
         while True:
             data = await websocket.receive_text()
-            data_json = json.loads(data)
+            try:
+                data_json = json.loads(data)
+            except json.JSONDecodeError:
+                data_json = None
+            if not isinstance(data_json, dict):
+                await send_error(client_id, "Messages must be JSON objects")
+                continue
             
             if data_json.get("type") == "research":
-                # Clear images from previous research
-                global images
-                images = []
-                
                 # Start the deep research process
                 research_topic = data_json.get("topic", "")
-                
-                # Stream graph execution
-                async def stream_graph_updates():
-                    is_research_complete = False
-                    async for event in graph.astream({"research_topic": research_topic, "websocket_id": client_id}):
-                        # Process events as needed
-                        await asyncio.sleep(0.1)  # Small delay to avoid overwhelming the client
-                        
-                        # Extract the node name and state from the event
-                        node_name = next(iter(event.keys()), None)
-                        node_state = event.get(node_name, {})
-                        
-                        if node_name == "generate_query":
-                            # Send query generation updates to the client
-        
-                            await manager.send({
-                                "type": "generate_query", 
-                                "data": {"query": node_state.get("search_query", ""),
-                                         "rationale": node_state.get("rationale", "")}
-                            })
-                        elif node_name == "web_research":
-                            # Send web research updates to the client
-                            await manager.send({
-                                "type": "web_research", 
-                                "data": {
-                                    "sources": node_state.get("sources_gathered"),
-                                    "images": images  # Using the global images list
-                                }
-                            })
-                        elif node_name == "summarize_sources":
-                            # Send summary updates to the client
-                            await manager.send({
-                                "type": "summarize", 
-                                "data": {"summary": node_state.get("running_summary", "")}
-                            })
-                        elif node_name == "reflect_on_summary":
-                            # Send reflection updates to the client
-                            await manager.send({
-                                "type": "reflection", 
-                                "data": {"query": node_state.get("search_query", ""),
-                                         "knowledge_gap": node_state.get("knowledge_gap", "")}
-                            })
-                        elif node_name == "finalize_summary":
-                            # Send final summary to the client
-                            await manager.send({
-                                "type": "finalize", 
-                                "data": {"summary": node_state.get("running_summary", "")}
-                            })
-                            is_research_complete = True
-                    
-                    # Send a final message indicating research is complete
-                    if is_research_complete:
-                        await asyncio.sleep(0.5)  # Small delay to ensure all other messages are processed
-                        await manager.send({
-                            "type": "research_complete",
-                            "data": {"status": "complete"}
-                        })
+                if not isinstance(research_topic, str):
+                    await send_error(client_id, "topic must be a string")
+                    continue
+                # Optional per-run settings such as max_web_research_loops or llm_deployment, checked before
+                # anything else happens so a bad request leaves the run in flight alone
+                try:
+                    configurable = Configuration.configurable_from_request(data_json.get("config"))
+                except ConfigurationError as e:
+                    await send_error(client_id, str(e))
+                    continue
+
+                # A new topic replaces the run that is still in flight
+                await sessions.cancel_run(client_id, websocket)
+
+                # Clear images and sources from previous research
+                begin_run(session, configurable)
+
+                # Every run gets an id the client can resume it with
+                run_id = uuid.uuid4().hex
+                if checkpoint_store is not None:
+                    await checkpoint_store.start_run(run_id, client_id, research_topic, configurable)
+                await sessions.send(client_id, {
+                    "type": "run_started",
+                    "data": {"run_id": run_id, "resumable": checkpoint_store is not None}
+                })
                 
                 # Run graph execution in the background
-                asyncio.create_task(stream_graph_updates())
+                session.task = asyncio.create_task(run_research(
+                    session, client_id, run_id, {"research_topic": research_topic, "websocket_id": client_id}, configurable
+                ))
+
+            elif data_json.get("type") == "resume":
+                run_id = data_json.get("run_id", "")
+                if not isinstance(run_id, str):
+                    await send_error(client_id, "run_id must be a string")
+                    continue
+                await sessions.cancel_run(client_id, websocket)
+                run = await checkpoint_store.get_run(run_id) if checkpoint_store is not None else None
+                config = {"configurable": {**(run or {}).get("config", {}), "thread_id": run_id}}
+                snapshot = await research_graph.aget_state(config) if run is not None and run["status"] != "complete" else None
+
+                if run is not None and run["status"] == "complete":
+                    # Finished while the client was away: send the stored report
+                    await sessions.send(client_id, {"type": "finalize", "data": {"summary": run["summary"]}})
+                    await sessions.send(client_id, {"type": "research_complete", "data": {"status": "complete", "run_id": run_id}})
+                elif snapshot is None or not snapshot.next:
+                    await sessions.send(client_id, {
+                        "type": "resume_failed",
+                        "data": {"run_id": run_id, "reason": "Unknown or expired research run"}
+                    })
+                else:
+                    # Continue from the last finished node, sending updates to this client
+                    if run["client_id"] != client_id:
+                        await research_graph.aupdate_state(config, {"websocket_id": client_id})
+                    begin_run(session, run["config"])
+                    session.images = list(snapshot.values.get("images", []))
+                    await checkpoint_store.update_run(run_id, "running", client_id=client_id)
+                    await sessions.send(client_id, {
+                        "type": "run_resumed",
+                        "data": {"run_id": run_id, "loop_count": snapshot.values.get("research_loop_count", 0),
+                                 "next": list(snapshot.next)}
+                    })
+                    session.task = asyncio.create_task(run_research(session, client_id, run_id, None, run["config"]))
                 
     except WebSocketDisconnect:
-        manager.disconnect(client_id)
+        # Nobody is listening any more, so stop spending model and search calls on the run. If the
+        # client has already reconnected under the same id, the run and queue belong to the new socket
+        await sessions.cancel_run(client_id, websocket)
+        await sessions.disconnect(client_id, websocket)
 
 # Run with: uvicorn app.main:app --reload
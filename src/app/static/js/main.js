@@ -21,6 +21,10 @@ let researchInProgress = false;
 let stepsCompleted = new Set();
 let currentStep = '';
 let latestThoughts = '';  // Store the latest thoughts
+let thoughtsCall = null;  // Model call the streamed thoughts belong to
+let summaryCall = null;  // Model call the streamed summary belongs to
+let streamingSummary = '';
+let currentRunId = null;  // Run to resume after a dropped connection
 
 // Step definitions
 const researchSteps = {
@@ -158,6 +162,12 @@ function createStepElement(step, status = 'pending') {
     return stepElement;
 }
 
+function formatQueries(data) {
+    // Several queries are searched in parallel when queries_per_loop > 1
+    const queries = data.queries && data.queries.length ? data.queries : [data.query];
+    return queries.map(query => `<div class="text-blue-600 font-medium">"${query}"</div>`).join('');
+}
+
 function updateStepDetails(step, data) {
     const stepDetailsElement = document.getElementById(`step-${step}-details`);
     if (!stepDetailsElement) return;
@@ -166,7 +176,7 @@ function updateStepDetails(step, data) {
     
     switch (step) {
         case 'generate_query':
-            detailsContent = `<div class="text-blue-600 font-medium">"${data.query}"</div>
+            detailsContent = `${formatQueries(data)}
                              <div class="text-gray-500 text-xs mt-1">${data.rationale}</div>`;
             break;
         case 'web_research':
@@ -177,14 +187,15 @@ function updateStepDetails(step, data) {
             detailsContent = `<div class="text-xs text-gray-500">Building comprehensive summary...</div>`;
             break;
         case 'reflection':
-            detailsContent = `<div class="text-blue-600 font-medium">"${data.query}"</div>
+            detailsContent = `${formatQueries(data)}
                              <div class="text-gray-500 text-xs mt-1">Identified gap: ${data.knowledge_gap}</div>`;
             break;
         case 'routing':
-            if (data.loop_count <= 3) {
+            if (data.decision === 'continue') {
                 detailsContent = `<div class="text-xs text-gray-500">Research cycle ${data.loop_count} - continuing research...</div>`;
             } else {
-                detailsContent = `<div class="text-xs text-gray-500">Research cycles complete - finalizing report...</div>`;
+                const saved = data.loops_saved ? ` (stopped early: ${data.reason.replace(/_/g, ' ')}, ${data.loops_saved} cycle${data.loops_saved === 1 ? '' : 's'} saved)` : '';
+                detailsContent = `<div class="text-xs text-gray-500">Research cycles complete${saved} - finalizing report...</div>`;
             }
             break;
     }
@@ -198,6 +209,13 @@ function connectWebSocket() {
     
     websocket.onopen = () => {
         console.log('WebSocket connection established');
+        if (researchInProgress && currentRunId) {
+            // Pick the run up from its last finished step
+            websocket.send(JSON.stringify({
+                type: 'resume',
+                run_id: currentRunId
+            }));
+        }
     };
     
     websocket.onmessage = (event) => {
@@ -222,6 +240,31 @@ function handleWebSocketMessage(message) {
     const { type, data } = message;
     
     switch(type) {
+        case 'run_started':
+            currentRunId = data.resumable ? data.run_id : null;
+            break;
+            
+        case 'run_resumed':
+            progressStatus.textContent = `Reconnected - resuming research from cycle ${data.loop_count}...`;
+            break;
+            
+        case 'resume_failed':
+            currentRunId = null;
+            progressStatus.textContent = 'The research run could not be resumed. Please start it again.';
+            researchInProgress = false;
+            researchButton.disabled = false;
+            researchButton.textContent = 'Research';
+            researchButton.classList.remove('opacity-50');
+            break;
+            
+        case 'error':
+            progressStatus.textContent = `The request was rejected: ${data.message}`;
+            researchInProgress = false;
+            researchButton.disabled = false;
+            researchButton.textContent = 'Research';
+            researchButton.classList.remove('opacity-50');
+            break;
+            
         case 'generate_query':
             updateResearchProgress('generate_query', 'complete', data);
             showThinkingProcess(data.thoughts);
@@ -240,6 +283,14 @@ function handleWebSocketMessage(message) {
             showThinkingProcess(data.thoughts);
             break;
             
+        case 'thinking_delta':
+            appendThinkingDelta(data);
+            break;
+            
+        case 'summary_delta':
+            appendSummaryDelta(data);
+            break;
+            
         case 'reflection':
             updateResearchProgress('reflection', 'complete', data);
             showThinkingProcess(data.thoughts);
@@ -310,6 +361,38 @@ function showThinkingProcess(thoughts) {
     }
 }
 
+function appendThinkingDelta(data) {
+    // Start over when the deltas belong to a new model call
+    if (data.call !== thoughtsCall) {
+        thoughtsCall = data.call;
+        latestThoughts = '';
+    }
+    latestThoughts += data.delta;
+    
+    // Keep the thinking modal live while it is open
+    if (!thinkingModal.classList.contains('hidden')) {
+        modalThinkingContent.textContent = latestThoughts;
+    }
+}
+
+function appendSummaryDelta(data) {
+    if (data.call !== summaryCall) {
+        summaryCall = data.call;
+        streamingSummary = '';
+        updateNextActiveStep('summarize');
+    }
+    streamingSummary += data.delta;
+    
+    const stepDetailsElement = document.getElementById('step-summarize-details');
+    if (stepDetailsElement) {
+        const preview = document.createElement('div');
+        preview.className = 'text-xs text-gray-600 max-h-32 overflow-y-auto whitespace-pre-wrap';
+        preview.textContent = streamingSummary;
+        stepDetailsElement.replaceChildren(preview);
+        preview.scrollTop = preview.scrollHeight;
+    }
+}
+
 function replaceSpinnerWithCheckmark() {
     // Replace the spinner with a checkmark
     const spinner = document.querySelector('.loading-spinner');
@@ -323,6 +406,7 @@ function replaceSpinnerWithCheckmark() {
 
 function finishResearch(summary) {
     researchInProgress = false;
+    currentRunId = null;
     progressStatus.textContent = 'Research completed!';
     
     // Replace the spinner with a checkmark
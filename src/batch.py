@@ -0,0 +1,219 @@
+import asyncio
+import hashlib
+import json
+import time
+import traceback
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+import rich_click as click
+
+from configuration import Configuration
+
+# Default location of batch inputs and reports written through the HTTP API
+DEFAULT_BATCH_DIR = Path(".cache") / "batches"
+
+
+def topic_id(topic: str) -> str:
+    """Stable id for a topic without an explicit one, so a rerun recognizes finished topics."""
+    return hashlib.sha1(topic.strip().encode("utf-8")).hexdigest()[:16]
+
+
+def parse_topics(lines: Iterable[str]) -> List[Dict[str, Any]]:
+    """
+    Parse JSONL topic lines of the form {"topic": ..., "id": ..., "config": {...}}.
+
+    "id" and "config" are optional. Blank lines are skipped and repeated ids are
+    kept once. Each config is checked like a websocket client's, so an invalid
+    one fails the whole file instead of its topic's run.
+    """
+    topics = {}
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Line {number} is not valid JSON: {e}") from e
+        if not isinstance(record, dict) or not isinstance(record.get("topic"), str) or not record["topic"].strip():
+            raise ValueError(f"Line {number} has no topic")
+        try:
+            config = Configuration.configurable_from_request(record.get("config"))
+        except ValueError as e:
+            raise ValueError(f"Line {number}: {e}") from e
+        record_id = str(record.get("id") or topic_id(record["topic"]))
+        topics.setdefault(record_id, {"id": record_id, "topic": record["topic"], "config": config})
+    return list(topics.values())
+
+
+def read_topics(path: Path) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        return parse_topics(f)
+
+
+def completed_ids(output_path: Path) -> set:
+    """Ids of the topics that already have a complete report in the output file."""
+    done = set()
+    if not output_path.exists():
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # A line cut short by an interrupted run
+            if record.get("status") == "complete":
+                done.add(record.get("id"))
+    return done
+
+
+class BatchRunner:
+    """
+    Run research for many topics with at most `concurrency` running at once.
+
+    A fixed pool of workers pulls topics from a queue, so memory stays flat for
+    thousands of topics. Each report is appended to the output JSONL file as
+    soon as it completes. With `resume`, topics that already have a complete
+    report in the output file are skipped, and failed ones are retried.
+    """
+    def __init__(self, research: Callable[[str, Dict[str, Any]], Awaitable[Dict[str, Any]]], concurrency: int = 4):
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        self.research = research
+        self.concurrency = concurrency
+        self.status = "pending"
+        self.total = 0
+        self.skipped = 0
+        self.completed = 0
+        self.failed = 0
+        self.in_flight = 0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.output_path: Optional[Path] = None
+        self.resume = True
+        self._pending: List[Dict[str, Any]] = []
+
+    def prepare(self, topics: List[Dict[str, Any]], output_path: Path, resume: bool = True):
+        """Choose the topics to research, skipping finished ones when resuming."""
+        self.output_path = Path(output_path)
+        self.resume = resume
+        done = completed_ids(self.output_path) if resume else set()
+        self._pending = [topic for topic in topics if topic["id"] not in done]
+        self.total = len(topics)
+        self.skipped = self.total - len(self._pending)
+
+    async def run(self, on_record: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.status = "running"
+        self.started_at = time.monotonic()
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for topic in self._pending:
+            queue.put_nowait(topic)
+
+        with open(self.output_path, "a" if self.resume else "w", encoding="utf-8") as output:
+            # Start on a fresh line if an interrupted run left the last one unfinished
+            if self.resume and output.tell() > 0:
+                with open(self.output_path, "rb") as existing:
+                    existing.seek(-1, 2)
+                    if existing.read(1) != b"\n":
+                        output.write("\n")
+            async def worker():
+                while True:
+                    try:
+                        topic = queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        return
+                    record = await self._research(topic)
+                    # One complete line per report, flushed so a crash never loses finished work
+                    output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    output.flush()
+                    if on_record is not None:
+                        on_record(record)
+
+            try:
+                await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(self._pending)))))
+                self.status = "complete"
+            except asyncio.CancelledError:
+                self.status = "cancelled"
+                raise
+            finally:
+                self.finished_at = time.monotonic()
+
+    async def _research(self, topic: Dict[str, Any]) -> Dict[str, Any]:
+        self.in_flight += 1
+        started = time.monotonic()
+        record = {"id": topic["id"], "topic": topic["topic"]}
+        try:
+            result = await self.research(topic["topic"], topic["config"])
+            record.update(status="complete", **result)
+            self.completed += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            record.update(status="failed", error=f"{type(e).__name__}: {e}")
+            traceback.print_exc()
+            self.failed += 1
+        finally:
+            self.in_flight -= 1
+        record["seconds"] = round(time.monotonic() - started, 3)
+        return record
+
+    def stats(self) -> Dict[str, Any]:
+        if self.started_at is None:
+            elapsed = 0.0
+        else:
+            elapsed = (self.finished_at or time.monotonic()) - self.started_at
+        finished = self.completed + self.failed
+        return {
+            "status": self.status,
+            "total": self.total,
+            "skipped": self.skipped,
+            "completed": self.completed,
+            "failed": self.failed,
+            "in_flight": self.in_flight,
+            "remaining": self.total - self.skipped - finished,
+            "concurrency": self.concurrency,
+            "elapsed_seconds": round(elapsed, 3),
+            "topics_per_minute": finished / elapsed * 60 if elapsed > 0 else 0.0,
+        }
+
+
+@click.command()
+@click.argument("topics", type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.option("--output", "-o", type=click.Path(dir_okay=False, path_type=Path), required=True, help="JSONL file the reports are appended to")
+@click.option("--concurrency", "-c", type=int, default=4, show_default=True, help="Topics researched at the same time")
+@click.option("--no-resume", is_flag=True, help="Overwrite the output file instead of skipping topics it already has reports for")
+def main(topics: Path, output: Path, concurrency: int, no_resume: bool):
+    """Research every topic in a JSONL file of {"topic": ..., "id": ..., "config": {...}} lines."""
+    # Imported here so the app's clients are only set up when the command runs
+    from app.main import app, lifespan, research_topic
+
+    runner = BatchRunner(research_topic, concurrency=concurrency)
+    runner.prepare(read_topics(topics), output, resume=not no_resume)
+
+    def progress(record):
+        stats = runner.stats()
+        color = "green" if record["status"] == "complete" else "red"
+        click.echo(
+            f"{click.style(record['status'], fg=color)} {record['id']} ({record['seconds']:.1f}s) "
+            f"{stats['completed'] + stats['failed']}/{stats['total'] - stats['skipped']} "
+            f"{stats['topics_per_minute']:.2f} topics/min"
+        )
+
+    async def run():
+        async with lifespan(app):
+            await runner.run(on_record=progress)
+
+    asyncio.run(run())
+    stats = runner.stats()
+    click.echo(
+        f"\nDone: {stats['completed']} complete, {stats['failed']} failed, {stats['skipped']} skipped "
+        f"in {stats['elapsed_seconds']:.1f}s ({stats['topics_per_minute']:.2f} topics/min)"
+    )
+
+
+# Run from src with: python batch.py topics.jsonl --output reports.jsonl
+if __name__ == "__main__":
+    main()
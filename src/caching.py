@@ -0,0 +1,246 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+DEFAULT_CACHE_PATH = Path(".cache") / "research_cache.sqlite"
+
+
+class LRUCache:
+    """In-memory cache with per-entry TTL that evicts the least recently used entry when full."""
+    def __init__(self, max_entries: int = 256, ttl: Optional[float] = 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl is not None else float("inf")
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteCache:
+    """
+    On-disk cache of JSON-serializable values with per-entry TTL.
+
+    When the table grows past max_entries the entries closest to expiry are
+    evicted first, together with anything that has already expired. Eviction
+    runs in batches, only once the table is over its limit, and brings it a
+    tenth below the limit, so most writes never count the table.
+    """
+    def __init__(self, path: os.PathLike = DEFAULT_CACHE_PATH, table: str = "cache",
+                 max_entries: int = 10000, ttl: Optional[float] = 3600):
+        if not re.fullmatch(r"\w+", table):
+            raise ValueError(f"Invalid cache table name: {table!r}")
+        self.path = Path(path)
+        self.table = table
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_expires_at ON {table} (expires_at)")
+        # Upper bound on the row count: replaced keys are counted as new until the next eviction recounts
+        self._rows = self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value FROM {self.table} WHERE key = ? AND expires_at >= ?",
+                (key, time.time()),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl is not None else float("inf")
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at),
+            )
+            self._rows += 1
+            if self._rows > self.max_entries:
+                self._evict()
+
+    def _evict(self):
+        removed = self._conn.execute(f"DELETE FROM {self.table} WHERE expires_at < ?", (time.time(),)).rowcount
+        rows = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        overflow = rows - (self.max_entries - self.max_entries // 10)
+        if rows > self.max_entries and overflow > 0:
+            deleted = self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN "
+                f"(SELECT key FROM {self.table} ORDER BY expires_at LIMIT ?)",
+                (overflow,),
+            ).rowcount
+            removed += deleted
+            rows -= deleted
+        self._rows = rows
+        self.evictions += removed
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+            self._rows = 0
+
+    def close(self):
+        self._conn.close()
+
+
+class TieredCache:
+    """An in-memory LRU in front of an optional SQLite store, with hit/miss counters."""
+    def __init__(self, memory: LRUCache, disk: Optional[SQLiteCache] = None):
+        self.memory = memory
+        self.disk = disk
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.memory.get(key)
+        if value is not None:
+            self.memory_hits += 1
+            return value
+        return self._disk_result(key, self.disk.get(key) if self.disk is not None else None)
+
+    def _disk_result(self, key: str, value: Optional[Any]) -> Optional[Any]:
+        if value is not None:
+            self.disk_hits += 1
+            # Promote to the memory tier
+            self.memory.set(key, value)
+            return value
+        self.misses += 1
+        return None
+
+    def set(self, key: str, value: Any):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    async def aget(self, key: str) -> Optional[Any]:
+        """get for async callers: the SQLite tier is read in a worker thread, off the event loop."""
+        value = self.memory.get(key)
+        if value is not None:
+            self.memory_hits += 1
+            return value
+        return self._disk_result(key, await asyncio.to_thread(self.disk.get, key) if self.disk is not None else None)
+
+    async def aset(self, key: str, value: Any):
+        """set for async callers, writing the SQLite tier in a worker thread."""
+        self.memory.set(key, value)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.set, key, value)
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "evictions": self.memory.evictions + (self.disk.evictions if self.disk is not None else 0),
+        }
+
+    def close(self):
+        if self.disk is not None:
+            self.disk.close()
+
+
+def tiered_cache_from_env(prefix: str, table: str, default_ttl: float) -> Optional[TieredCache]:
+    """
+    Build a TieredCache configured from <prefix>_* environment variables.
+
+    <prefix>_ENABLED turns the cache off when set to 0/false, <prefix>_TTL sets
+    the expiry in seconds, <prefix>_MEMORY_ENTRIES and <prefix>_DISK_ENTRIES
+    bound the two tiers, and <prefix>_PATH points at the SQLite file (an empty
+    value keeps the cache in memory only).
+    """
+    if os.getenv(f"{prefix}_ENABLED", "true").lower() in ("0", "false", "no"):
+        return None
+    ttl = float(os.getenv(f"{prefix}_TTL", str(default_ttl)))
+    memory = LRUCache(max_entries=int(os.getenv(f"{prefix}_MEMORY_ENTRIES", "256")), ttl=ttl)
+    path = os.getenv(f"{prefix}_PATH", str(DEFAULT_CACHE_PATH))
+    disk = None
+    if path:
+        disk = SQLiteCache(path, table=table, max_entries=int(os.getenv(f"{prefix}_DISK_ENTRIES", "10000")), ttl=ttl)
+    return TieredCache(memory, disk)
+
+
+def search_cache_from_env() -> Optional[TieredCache]:
+    return tiered_cache_from_env("SEARCH_CACHE", table="search_results", default_ttl=3600)
+
+
+# Helper functions for search result caching
+def normalize_query(query: str) -> str:
+    """Normalize a search query so trivially different spellings share a cache entry."""
+    query = unicodedata.normalize("NFKC", query).casefold()
+    query = " ".join(query.split())
+    return query.strip(" \"'?.!")
+
+
+def search_cache_key(query: str, **params) -> str:
+    """
+    Build a cache key from the normalized query and every search parameter
+    (max_results, include_images, max_tokens_per_source, ...).
+    """
+    payload = json.dumps({"query": normalize_query(query), **params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def cached_search(cache: Optional[TieredCache], search: Callable[..., Dict[str, Any]], query: str, **params) -> Dict[str, Any]:
+    """Call a synchronous search function (e.g. TavilyClient.search) through the cache."""
+    if cache is None:
+        return search(query=query, **params)
+    key = search_cache_key(query, **params)
+    results = cache.get(key)
+    if results is None:
+        results = search(query=query, **params)
+        cache.set(key, results)
+    return results
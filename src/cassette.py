@@ -0,0 +1,275 @@
+import asyncio
+import atexit
+import gzip
+import inspect
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+
+from caching import search_cache_key
+from llm_cache import llm_cache_key, sampling_params
+
+DEFAULT_CASSETTE_PATH = Path(".cache") / "cassette.jsonl.gz"
+
+CASSETTE_MODES = ("off", "record", "replay")
+
+
+class CassetteMiss(LookupError):
+    """Raised in replay mode when the cassette has no recording left for a call."""
+
+
+class Cassette:
+    """
+    Record model and search exchanges to a gzipped JSONL file, or serve them back.
+
+    In record mode every streamed or invoked completion (with the time each
+    chunk arrived) and every search response is appended to the file as it
+    completes. In replay mode calls are answered from the file instead of the
+    network: by an exact match of the request when there is one, otherwise by
+    the next unused recording of the same kind, so runs whose prompts changed
+    slightly (e.g. the current date) still replay. With `timing`, replies keep
+    their recorded latency, divided by `speed`.
+    """
+    def __init__(self, path: str = str(DEFAULT_CASSETTE_PATH), mode: str = "off", timing: bool = True, speed: float = 1.0):
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"Unknown cassette mode: {mode!r}")
+        self.path = Path(path)
+        self.mode = mode
+        self.timing = timing
+        self.speed = speed
+        self._lock = threading.Lock()
+        self._file = None
+        self._by_key: Dict[str, deque] = defaultdict(deque)
+        self._by_kind: Dict[str, deque] = defaultdict(deque)
+        self.recorded = 0
+        self.replayed = 0
+        self.fallbacks = 0
+
+        if mode == "record":
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = gzip.open(self.path, "wt", encoding="utf-8")
+            atexit.register(self.close)
+        elif mode == "replay":
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # The last line of a recording that was cut short
+                    entry["used"] = False
+                    self._by_key[entry["key"]].append(entry)
+                    self._by_kind[entry["kind"]].append(entry)
+
+    def _record(self, kind: str, key: str, label: str, **data):
+        entry = {"kind": kind, "key": key, "label": label, **data}
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._file.flush()
+            self.recorded += 1
+
+    def _take(self, kind: str, key: str) -> Dict[str, Any]:
+        with self._lock:
+            for queue, fallback in ((self._by_key.get(key), False), (self._by_kind.get(kind), True)):
+                while queue:
+                    entry = queue.popleft()
+                    if not entry["used"]:
+                        entry["used"] = True
+                        self.replayed += 1
+                        self.fallbacks += fallback
+                        return entry
+        raise CassetteMiss(f"No {kind} recording left in {self.path} for key {key[:12]}")
+
+    def _delay(self, offset: float, started: float) -> float:
+        """Seconds to wait so an event recorded `offset` seconds into a call replays on time."""
+        if not self.timing:
+            return 0.0
+        return offset / self.speed - (time.monotonic() - started)
+
+    def wrap_model(self, model):
+        """Wrap a chat model so its astream/stream/ainvoke/invoke calls are recorded or replayed."""
+        return model if self.mode == "off" else CassetteModel(model, self)
+
+    def wrap_search(self, search: Callable) -> Callable:
+        """Wrap a search function (async or sync) taking a query and keyword parameters."""
+        if self.mode == "off":
+            return search
+
+        if inspect.iscoroutinefunction(search):
+            async def search_async(query: str, **params):
+                key = search_cache_key(query, **params)
+                started = time.monotonic()
+                if self.mode == "replay":
+                    entry = self._take("search", key)
+                    delay = self._delay(entry["elapsed"], started)
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    return entry["response"]
+                response = await search(query, **params)
+                self._record("search", key, query, elapsed=round(time.monotonic() - started, 3), response=response)
+                return response
+            return search_async
+
+        def search_sync(query: str, **params):
+            key = search_cache_key(query, **params)
+            started = time.monotonic()
+            if self.mode == "replay":
+                entry = self._take("search", key)
+                delay = self._delay(entry["elapsed"], started)
+                if delay > 0:
+                    time.sleep(delay)
+                return entry["response"]
+            response = search(query=query, **params)
+            self._record("search", key, query, elapsed=round(time.monotonic() - started, 3), response=response)
+            return response
+        return search_sync
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "path": str(self.path),
+            "recorded": self.recorded,
+            "replayed": self.replayed,
+            "fallbacks": self.fallbacks,
+            "remaining": sum(1 for queue in self._by_kind.values() for entry in queue if not entry["used"]),
+        }
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class CassetteModel:
+    """A chat model whose calls go through a cassette; every other attribute is the wrapped model's."""
+    def __init__(self, model, cassette: Cassette):
+        self._model = model
+        self._cassette = cassette
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+    def _key(self, messages):
+        if isinstance(messages, str):
+            messages = [HumanMessage(content=messages)]
+        return llm_cache_key(getattr(self._model, "model_name", "") or "", messages, sampling_params(self._model))
+
+    @staticmethod
+    def _chunk(record) -> AIMessageChunk:
+        return AIMessageChunk(content=record.get("c", ""), usage_metadata=record.get("u"))
+
+    @staticmethod
+    def _chunk_record(chunk, started: float) -> Dict[str, Any]:
+        record = {"t": round(time.monotonic() - started, 3), "c": chunk.content}
+        if chunk.usage_metadata:
+            record["u"] = dict(chunk.usage_metadata)
+        return record
+
+    async def astream(self, messages, **kwargs):
+        key = self._key(messages)
+        started = time.monotonic()
+        if self._cassette.mode == "replay":
+            for record in self._cassette._take("llm", key)["chunks"]:
+                delay = self._cassette._delay(record["t"], started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                yield self._chunk(record)
+            return
+        chunks = []
+        stream = self._model.astream(messages, **kwargs)
+        try:
+            async for chunk in stream:
+                chunks.append(self._chunk_record(chunk, started))
+                yield chunk
+        except GeneratorExit:
+            # The caller stopped reading early, e.g. once the JSON it wanted was complete; keep what it read
+            self._cassette._record("llm", key, self._model.model_name, chunks=chunks)
+            raise
+        finally:
+            await stream.aclose()
+        self._cassette._record("llm", key, self._model.model_name, chunks=chunks)
+
+    def stream(self, messages, **kwargs):
+        key = self._key(messages)
+        started = time.monotonic()
+        if self._cassette.mode == "replay":
+            for record in self._cassette._take("llm", key)["chunks"]:
+                delay = self._cassette._delay(record["t"], started)
+                if delay > 0:
+                    time.sleep(delay)
+                yield self._chunk(record)
+            return
+        chunks = []
+        stream = self._model.stream(messages, **kwargs)
+        try:
+            for chunk in stream:
+                chunks.append(self._chunk_record(chunk, started))
+                yield chunk
+        except GeneratorExit:
+            self._cassette._record("llm", key, self._model.model_name, chunks=chunks)
+            raise
+        finally:
+            stream.close()
+        self._cassette._record("llm", key, self._model.model_name, chunks=chunks)
+
+    def _message(self, entry) -> AIMessage:
+        # A recorded stream can answer an invoke too, and the other way round
+        if "chunks" in entry:
+            chunks = [self._chunk(record) for record in entry["chunks"]]
+            return AIMessage(content="".join(chunk.content for chunk in chunks),
+                             usage_metadata=next((c.usage_metadata for c in reversed(chunks) if c.usage_metadata), None))
+        return AIMessage(content=entry["content"], usage_metadata=entry.get("usage"))
+
+    def _entry_elapsed(self, entry) -> float:
+        return entry["chunks"][-1]["t"] if entry.get("chunks") else entry.get("elapsed", 0.0)
+
+    async def ainvoke(self, messages, **kwargs):
+        key = self._key(messages)
+        started = time.monotonic()
+        if self._cassette.mode == "replay":
+            entry = self._cassette._take("llm", key)
+            delay = self._cassette._delay(self._entry_elapsed(entry), started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            return self._message(entry)
+        message = await self._model.ainvoke(messages, **kwargs)
+        self._cassette._record("llm", key, self._model.model_name, content=message.content,
+                               usage=message.usage_metadata, elapsed=round(time.monotonic() - started, 3))
+        return message
+
+    def invoke(self, messages, **kwargs):
+        key = self._key(messages)
+        started = time.monotonic()
+        if self._cassette.mode == "replay":
+            entry = self._cassette._take("llm", key)
+            delay = self._cassette._delay(self._entry_elapsed(entry), started)
+            if delay > 0:
+                time.sleep(delay)
+            return self._message(entry)
+        message = self._model.invoke(messages, **kwargs)
+        self._cassette._record("llm", key, self._model.model_name, content=message.content,
+                               usage=message.usage_metadata, elapsed=round(time.monotonic() - started, 3))
+        return message
+
+
+def cassette_from_env() -> Cassette:
+    """
+    Build the cassette from CASSETTE_MODE (off, record or replay) and CASSETTE_PATH.
+
+    CASSETTE_TIMING=false replays as fast as possible; CASSETTE_SPEED speeds up
+    (or slows down) replay with timing.
+    """
+    return Cassette(
+        path=os.getenv("CASSETTE_PATH", str(DEFAULT_CASSETTE_PATH)),
+        mode=os.getenv("CASSETTE_MODE", "off").lower(),
+        timing=os.getenv("CASSETTE_TIMING", "true").lower() not in ("0", "false", "no"),
+        speed=float(os.getenv("CASSETTE_SPEED", "1.0")),
+    )
@@ -0,0 +1,150 @@
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import aiosqlite
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+# Default location of the checkpoint database, next to the research caches
+DEFAULT_CHECKPOINT_PATH = Path(".cache") / "checkpoints.sqlite"
+
+# Run statuses; every status but "complete" can be resumed while its checkpoints are kept
+RUN_STATUSES = ("running", "interrupted", "failed", "complete")
+
+
+class CheckpointStore:
+    """
+    Persistent graph checkpoints and a table of research runs in one SQLite file.
+
+    Each run's checkpoints are stored under its run id as the LangGraph thread
+    id, so a run can be resumed from its last finished node after a dropped
+    websocket or a restart. When a run completes, its checkpoints are compacted
+    into the final summary kept on the run row. Runs untouched for longer than
+    `retention` seconds are pruned along with their checkpoints.
+    """
+    def __init__(self, conn: aiosqlite.Connection, retention: float = 24 * 3600, prune_interval: float = 3600):
+        self.conn = conn
+        self.saver = AsyncSqliteSaver(conn)
+        self.retention = retention
+        self.prune_interval = prune_interval
+        self._last_prune = 0.0
+        self.runs_compacted = 0
+        self.runs_pruned = 0
+
+    @classmethod
+    async def open(cls, path: str = str(DEFAULT_CHECKPOINT_PATH), **kwargs) -> "CheckpointStore":
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        store = cls(await aiosqlite.connect(path), **kwargs)
+        await store.setup()
+        return store
+
+    async def setup(self):
+        await self.saver.setup()
+        async with self.saver.lock:
+            await self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS research_runs ("
+                " run_id TEXT PRIMARY KEY, client_id TEXT, topic TEXT, config TEXT, status TEXT,"
+                " summary TEXT, created_at REAL, updated_at REAL)"
+            )
+            await self.conn.execute("CREATE INDEX IF NOT EXISTS research_runs_updated ON research_runs (updated_at)")
+            await self.conn.commit()
+        await self.prune()
+
+    @staticmethod
+    def config(run_id: str, configurable: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """RunnableConfig that reads and writes the run's checkpoints."""
+        return {"configurable": {**(configurable or {}), "thread_id": run_id}}
+
+    async def start_run(self, run_id: str, client_id: str, topic: str, configurable: Dict[str, Any]):
+        now = time.time()
+        async with self.saver.lock:
+            await self.conn.execute(
+                "INSERT OR REPLACE INTO research_runs VALUES (?, ?, ?, ?, 'running', NULL, ?, ?)",
+                (run_id, client_id, topic, json.dumps(configurable), now, now),
+            )
+            await self.conn.commit()
+
+    async def get_run(self, run_id: str) -> Optional[Dict[str, Any]]:
+        async with self.saver.lock:
+            async with self.conn.execute(
+                "SELECT run_id, client_id, topic, config, status, summary, created_at, updated_at FROM research_runs WHERE run_id = ?",
+                (run_id,),
+            ) as cursor:
+                row = await cursor.fetchone()
+        if row is None:
+            return None
+        return {
+            "run_id": row[0],
+            "client_id": row[1],
+            "topic": row[2],
+            "config": json.loads(row[3] or "{}"),
+            "status": row[4],
+            "summary": row[5],
+            "created_at": row[6],
+            "updated_at": row[7],
+        }
+
+    async def update_run(self, run_id: str, status: str, client_id: Optional[str] = None, summary: Optional[str] = None):
+        """Record a status change; completing a run compacts its checkpoints into the summary."""
+        if status not in RUN_STATUSES:
+            raise ValueError(f"Unknown run status: {status!r}")
+        async with self.saver.lock:
+            await self.conn.execute(
+                "UPDATE research_runs SET status = ?, client_id = COALESCE(?, client_id), summary = COALESCE(?, summary),"
+                " updated_at = ? WHERE run_id = ?",
+                (status, client_id, summary, time.time(), run_id),
+            )
+            await self.conn.commit()
+        if status == "complete":
+            await self.saver.adelete_thread(run_id)
+            self.runs_compacted += 1
+        if time.monotonic() - self._last_prune >= self.prune_interval:
+            await self.prune()
+
+    async def prune(self):
+        """Delete runs, and their checkpoints, that have not been touched within the retention period."""
+        self._last_prune = time.monotonic()
+        async with self.saver.lock:
+            async with self.conn.execute(
+                "SELECT run_id FROM research_runs WHERE updated_at < ?", (time.time() - self.retention,)
+            ) as cursor:
+                run_ids = [row[0] for row in await cursor.fetchall()]
+        for run_id in run_ids:
+            await self.saver.adelete_thread(run_id)
+        async with self.saver.lock:
+            await self.conn.executemany("DELETE FROM research_runs WHERE run_id = ?", [(run_id,) for run_id in run_ids])
+            await self.conn.commit()
+        self.runs_pruned += len(run_ids)
+
+    async def stats(self) -> Dict[str, Any]:
+        async with self.saver.lock:
+            async with self.conn.execute("SELECT status, COUNT(*) FROM research_runs GROUP BY status") as cursor:
+                runs = dict(await cursor.fetchall())
+            async with self.conn.execute("SELECT COUNT(*) FROM checkpoints") as cursor:
+                (checkpoints,) = await cursor.fetchone()
+        return {
+            "runs": runs,
+            "checkpoints": checkpoints,
+            "runs_compacted": self.runs_compacted,
+            "runs_pruned": self.runs_pruned,
+        }
+
+    async def close(self):
+        await self.conn.close()
+
+
+async def checkpoint_store_from_env() -> Optional[CheckpointStore]:
+    """
+    Open the checkpoint store from the CHECKPOINT_* environment variables.
+
+    Checkpointing is on unless CHECKPOINT_ENABLED is false. CHECKPOINT_RETENTION_HOURS
+    sets how long unfinished and completed runs are kept.
+    """
+    if os.getenv("CHECKPOINT_ENABLED", "true").lower() in ("0", "false", "no"):
+        return None
+    return await CheckpointStore.open(
+        os.getenv("CHECKPOINT_PATH", str(DEFAULT_CHECKPOINT_PATH)),
+        retention=float(os.getenv("CHECKPOINT_RETENTION_HOURS", "24")) * 3600,
+    )
@@ -0,0 +1,135 @@
+import math
+import os
+from dataclasses import dataclass, fields
+from typing import Any, Dict, Optional, Set, Tuple
+
+from langchain_core.runnables import RunnableConfig
+
+from fingerprints import MAX_NEAR_DUPLICATE_DISTANCE
+
+
+def _coerce(value: Any, default: Any) -> Any:
+    # Environment variables and websocket payloads arrive as strings; match the field's default type
+    if isinstance(default, bool):
+        return value if isinstance(value, bool) else str(value).lower() in ("1", "true", "yes")
+    if isinstance(default, (int, float)):
+        return type(default)(value)
+    return value
+
+
+class ConfigurationError(ValueError):
+    """Raised when a client request carries an invalid configuration value."""
+
+
+STOPPING_POLICIES = ("adaptive", "fixed")
+
+
+def request_limits() -> Dict[str, Tuple[float, float]]:
+    """
+    Server-side bounds for the client settings that multiply model and search
+    calls or change detection thresholds; values outside are clamped.
+    """
+    max_loops = int(os.getenv("MAX_WEB_RESEARCH_LOOPS_LIMIT", "10"))
+    return {
+        "max_web_research_loops": (1, max_loops),
+        "min_web_research_loops": (0, max_loops),
+        "queries_per_loop": (1, int(os.getenv("QUERIES_PER_LOOP_LIMIT", "5"))),
+        "max_json_retries": (0, 3),
+        "near_duplicate_distance": (-1, MAX_NEAR_DUPLICATE_DISTANCE),
+        "max_prompt_tokens": (0, math.inf),
+        "max_archived_summary_tokens": (0, math.inf),
+        "min_summary_change": (0.0, 1.0),
+        "min_new_source_share": (0.0, 1.0),
+    }
+
+
+def allowed_deployments() -> Set[str]:
+    """Deployments a client may pick: AZURE_DEEPSEEK_DEPLOYMENT and those listed in ALLOWED_LLM_DEPLOYMENTS."""
+    names = {name.strip() for name in os.getenv("ALLOWED_LLM_DEPLOYMENTS", "").split(",") if name.strip()}
+    default = os.getenv("AZURE_DEEPSEEK_DEPLOYMENT")
+    if default:
+        names.add(default)
+    return names
+
+
+def _validate(name: str, value: Any, default: Any) -> Any:
+    # Like _coerce, but a value that does not fit the field's type is rejected instead of guessed at
+    try:
+        if isinstance(default, bool):
+            if isinstance(value, bool):
+                return value
+            text = str(value).lower()
+            if text in ("1", "true", "yes", "0", "false", "no"):
+                return text in ("1", "true", "yes")
+            raise ValueError
+        if isinstance(default, (int, float)):
+            if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+                raise ValueError
+            number = float(value)
+            if not math.isfinite(number) or (isinstance(default, int) and not number.is_integer()):
+                raise ValueError
+            return type(default)(number)
+        if not isinstance(value, str):
+            raise ValueError
+        return value
+    except (TypeError, ValueError):
+        raise ConfigurationError(f"Invalid value for {name}: {value!r}") from None
+
+
+# Per-run settings passed through the graph's RunnableConfig, so one compiled graph serves every run
+@dataclass(kw_only=True)
+class Configuration:
+    max_web_research_loops: int = 4 # Number of web research loops before the summary is finalized
+    min_web_research_loops: int = 1 # Loops that always run before the stopping policy may end research early
+    stopping_policy: str = "adaptive" # "adaptive" stops early once the research converges, "fixed" always runs the maximum
+    min_summary_change: float = 0.1 # Adaptive policy: stop when a loop changes less of the summary than this
+    min_new_source_share: float = 0.2 # Adaptive policy: stop when a search returns a smaller share of new URLs than this
+    queries_per_loop: int = 1 # Queries generated per loop and searched concurrently
+    fetch_full_page: bool = False # Include the most relevant passages of each full page in the summarizer context
+    near_duplicate_distance: int = 8 # Max SimHash bit distance at which a source counts as a near-duplicate, -1 disables the check
+    max_prompt_tokens: int = 8000 # Token budget for the summarize and reflect prompts, 0 disables trimming
+    max_archived_summary_tokens: int = 4000 # Summary text trimmed from the prompt that is still kept in the report, oldest dropped first
+    max_json_retries: int = 1 # Times a model call is repeated when its answer has no JSON object with the expected keys
+    pipelined_search: bool = False # Start each search as soon as its query has streamed, while the rest of the answer generates
+    llm_deployment: Optional[str] = None # Model deployment used by every node, defaults to AZURE_DEEPSEEK_DEPLOYMENT
+
+    @classmethod
+    def from_runnable_config(cls, config: Optional[RunnableConfig] = None) -> "Configuration":
+        """Create a Configuration from the configurable values of a RunnableConfig, then the environment."""
+        configurable = config.get("configurable", {}) if config else {}
+        values: Dict[str, Any] = {}
+        for f in fields(cls):
+            value = configurable.get(f.name, os.environ.get(f.name.upper()))
+            if value is not None:
+                values[f.name] = _coerce(value, f.default)
+        return cls(**values)
+
+    @classmethod
+    def configurable_from_request(cls, request: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Keep only the known configuration keys from a client request, checked
+        and converted to their field types. Numbers are clamped to
+        request_limits(); anything else invalid raises ConfigurationError.
+        """
+        if request is None:
+            return {}
+        if not isinstance(request, dict):
+            raise ConfigurationError("config must be a JSON object")
+        limits = request_limits()
+        configurable = {}
+        for f in fields(cls):
+            if f.name not in request or request[f.name] is None:
+                continue
+            value = _validate(f.name, request[f.name], f.default)
+            if f.name in limits:
+                low, high = limits[f.name]
+                value = type(value)(min(max(value, low), high))
+            configurable[f.name] = value
+
+        if configurable.get("stopping_policy", STOPPING_POLICIES[0]) not in STOPPING_POLICIES:
+            raise ConfigurationError(f"stopping_policy must be one of {', '.join(STOPPING_POLICIES)}")
+        # Every deployment gets its own client and rate limiter, so only configured ones may be picked
+        deployment = configurable.get("llm_deployment")
+        if deployment and deployment not in allowed_deployments():
+            raise ConfigurationError(f"Unknown llm_deployment: {deployment!r}")
+        return configurable
@@ -0,0 +1,189 @@
+import math
+import os
+import re
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import BaseMessage
+
+try:
+    import tiktoken
+except ImportError:  # Optional: fall back to the characters-per-token estimate
+    tiktoken = None
+
+# Tokens of chat framing (role and separators) added to every message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+class TokenCounter:
+    """
+    Count prompt tokens for the deployed model.
+
+    Raw counts come from a tiktoken encoding when one is installed and can be
+    loaded, otherwise from a characters-per-token estimate. Either way they are
+    multiplied by a scale calibrated against the prompt token usage reported by
+    the model endpoint, so the count follows the model's own tokenizer.
+    """
+    def __init__(self, encoding_name: Optional[str] = "cl100k_base", chars_per_token: float = 4.0, smoothing: float = 0.2):
+        self.encoding_name = encoding_name
+        self.chars_per_token = chars_per_token
+        self.smoothing = smoothing
+        self.scale = 1.0
+        self.calibrations = 0
+        self._encoding = None
+        self._loaded = False
+
+    @property
+    def encoding(self):
+        """The tiktoken encoding, loaded on first use (this may download it), or None."""
+        if not self._loaded:
+            self._loaded = True
+            if tiktoken is not None and self.encoding_name:
+                try:
+                    self._encoding = tiktoken.get_encoding(self.encoding_name)
+                except Exception:
+                    self._encoding = None
+        return self._encoding
+
+    def raw_count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return math.ceil(len(text) / self.chars_per_token)
+
+    def count(self, text: str) -> int:
+        return math.ceil(self.raw_count(text) * self.scale)
+
+    def count_messages(self, messages: Sequence[BaseMessage]) -> int:
+        return sum(self.count(message.content) + MESSAGE_OVERHEAD_TOKENS for message in messages)
+
+    def calibrate(self, messages: Sequence[BaseMessage], reported_tokens: int):
+        """Move the scale towards the ratio between the reported and the raw prompt token count."""
+        raw = sum(self.raw_count(message.content) + MESSAGE_OVERHEAD_TOKENS for message in messages)
+        if raw <= 0 or not reported_tokens:
+            return
+        ratio = reported_tokens / raw
+        if self.calibrations == 0:
+            self.scale = ratio
+        else:
+            self.scale += self.smoothing * (ratio - self.scale)
+        self.calibrations += 1
+
+    def truncate(self, text: str, max_tokens: int, keep: str = "end") -> str:
+        """Cut text down to max_tokens, keeping its end (keep="end") or its start (keep="start")."""
+        if self.count(text) <= max_tokens:
+            return text
+        raw_limit = int(max_tokens / self.scale)
+        if raw_limit <= 0:
+            return ""
+        if self.encoding is not None:
+            tokens = self.encoding.encode(text, disallowed_special=())
+            return self.encoding.decode(tokens[-raw_limit:] if keep == "end" else tokens[:raw_limit])
+        chars = int(raw_limit * self.chars_per_token)
+        return text[-chars:] if keep == "end" else text[:chars]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tokenizer": self.encoding_name if self.encoding is not None else f"{self.chars_per_token} chars per token",
+            "scale": round(self.scale, 3),
+            "calibrations": self.calibrations,
+        }
+
+
+def token_counter_from_env() -> TokenCounter:
+    """Build the counter from TOKENIZER_ENCODING ("none" skips tiktoken) and TOKENIZER_CHARS_PER_TOKEN."""
+    encoding_name = os.getenv("TOKENIZER_ENCODING", "cl100k_base")
+    return TokenCounter(
+        encoding_name=None if encoding_name.lower() == "none" else encoding_name,
+        chars_per_token=float(os.getenv("TOKENIZER_CHARS_PER_TOKEN", "4.0")),
+    )
+
+
+def trim_paragraphs(text: str, max_tokens: int, counter: TokenCounter, keep: str = "end") -> Tuple[str, str]:
+    """
+    Fit text into max_tokens by dropping whole paragraphs from the other end.
+
+    With keep="end" the oldest (leading) paragraphs go first. A paragraph is cut
+    mid-way only when even the one closest to the kept end does not fit.
+    Returns (kept, dropped).
+    """
+    if counter.count(text) <= max_tokens:
+        return text, ""
+    paragraphs = re.split(r"\n\s*\n", text.strip())
+    if keep == "end":
+        paragraphs.reverse()
+
+    kept: List[str] = []
+    used = 0
+    for paragraph in paragraphs:
+        cost = counter.count(paragraph) + (1 if kept else 0)
+        if used + cost > max_tokens:
+            break
+        kept.append(paragraph)
+        used += cost
+    dropped = paragraphs[len(kept):]
+
+    if not kept and paragraphs:
+        # Not even one paragraph fits: keep the part of it nearest to the kept end
+        part = counter.truncate(paragraphs[0], max_tokens, keep=keep)
+        if part and keep == "end" and paragraphs[0].endswith(part):
+            kept, dropped[0] = [part], paragraphs[0][:-len(part)].rstrip()
+        elif part and keep == "start" and paragraphs[0].startswith(part):
+            kept, dropped[0] = [part], paragraphs[0][len(part):].lstrip()
+
+    if keep == "end":
+        kept.reverse()
+        dropped.reverse()
+    return "\n\n".join(kept), "\n\n".join(dropped)
+
+
+def fit_sections(sections: Sequence[Tuple[str, str]], max_tokens: int, counter: TokenCounter) -> Tuple[List[str], List[str]]:
+    """
+    Trim (text, keep) sections, ordered oldest first, until together they fit into max_tokens.
+
+    The oldest sections give up tokens first. Returns the kept and dropped text
+    of every section.
+    """
+    counts = [counter.count(text) for text, _ in sections]
+    overflow = sum(counts) - max_tokens
+    kept = [text for text, _ in sections]
+    dropped = ["" for _ in sections]
+    for i, (text, keep) in enumerate(sections):
+        if overflow <= 0:
+            break
+        kept[i], dropped[i] = trim_paragraphs(text, max(counts[i] - overflow, 0), counter, keep=keep)
+        overflow -= counts[i] - counter.count(kept[i])
+    return kept, dropped
+
+
+class PromptUsage:
+    """Prompt and completion token usage per graph node."""
+    def __init__(self):
+        self.nodes: Dict[str, Dict[str, int]] = defaultdict(lambda: {
+            "calls": 0,
+            "prompt_tokens": 0,
+            "max_prompt_tokens": 0,
+            "reported_prompt_tokens": 0,
+            "reported_completion_tokens": 0,
+            "trimmed_tokens": 0,
+        })
+
+    def record(self, node: str, prompt_tokens: int, usage: Optional[Dict[str, Any]] = None):
+        """Record one call: the counted prompt tokens and the usage_metadata reported by the model, if any."""
+        stats = self.nodes[node]
+        stats["calls"] += 1
+        stats["prompt_tokens"] += prompt_tokens
+        stats["max_prompt_tokens"] = max(stats["max_prompt_tokens"], prompt_tokens)
+        if usage:
+            stats["reported_prompt_tokens"] += usage.get("input_tokens", 0)
+            stats["reported_completion_tokens"] += usage.get("output_tokens", 0)
+
+    def record_trim(self, node: str, tokens: int):
+        self.nodes[node]["trimmed_tokens"] += tokens
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            node: {**stats, "avg_prompt_tokens": stats["prompt_tokens"] / stats["calls"] if stats["calls"] else 0.0}
+            for node, stats in self.nodes.items()
+        }
@@ -0,0 +1,93 @@
+import hashlib
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Fingerprint width; Hamming distances are counted in these bits
+FINGERPRINT_BITS = 64
+
+# Texts shorter than this many words are too short to fingerprint reliably
+MIN_FINGERPRINT_WORDS = 20
+
+# Largest distance FingerprintIndex serves efficiently: its max_distance + 1 bands keep at least 4 bits
+# each, while wider distances leave bands so narrow that every lookup scans most of the index
+MAX_NEAR_DUPLICATE_DISTANCE = FINGERPRINT_BITS // 4 - 1
+
+
+def shingles(text: str, size: int = 3) -> set:
+    """Word n-grams of the lowercased text."""
+    words = re.findall(r"\w+", (text or "").lower())
+    if len(words) < size:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def simhash(text: str, bits: int = FINGERPRINT_BITS, size: int = 3) -> Optional[int]:
+    """
+    SimHash of the text's word shingles, or None when the text is too short.
+
+    Texts that share most of their shingles get fingerprints that differ in only
+    a few bits, so mirrors and syndicated copies of a page end up close together.
+    """
+    grams = shingles(text, size)
+    if len(grams) + size - 1 < MIN_FINGERPRINT_WORDS:
+        return None
+    digests = b"".join(
+        hashlib.blake2b(" ".join(gram).encode("utf-8"), digest_size=bits // 8).digest() for gram in grams
+    )
+    # One row of bits per shingle; a fingerprint bit is set where most shingles have it set
+    ones = np.unpackbits(np.frombuffer(digests, dtype=np.uint8).reshape(len(grams), bits // 8), axis=1).sum(axis=0)
+    return int.from_bytes(np.packbits(ones * 2 > len(grams)).tobytes(), "big")
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class FingerprintIndex:
+    """
+    Index of SimHash fingerprints for near-duplicate lookups.
+
+    Fingerprints are split into max_distance + 1 bands. Two fingerprints within
+    max_distance bits of each other must agree on at least one whole band, so a
+    lookup only compares against the fingerprints sharing a band.
+    """
+    def __init__(self, fingerprints: Iterable[int] = (), max_distance: int = 8, bits: int = FINGERPRINT_BITS):
+        self.max_distance = max_distance
+        self.bits = bits
+        self.bands = max_distance + 1
+        self.band_bits = bits // self.bands
+        self._buckets: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        self.size = 0
+        for fingerprint in fingerprints:
+            self.add(fingerprint)
+
+    def _keys(self, fingerprint: int):
+        for band in range(self.bands):
+            shift = band * self.band_bits
+            # The last band also takes the bits left over by the integer division
+            width = self.bits - shift if band == self.bands - 1 else self.band_bits
+            yield band, fingerprint >> shift & ((1 << width) - 1)
+
+    def add(self, fingerprint: int):
+        for key in self._keys(fingerprint):
+            self._buckets[key].append(fingerprint)
+        self.size += 1
+
+    def find(self, fingerprint: int) -> Optional[int]:
+        """Return an indexed fingerprint within max_distance bits, or None."""
+        for key in self._keys(fingerprint):
+            for candidate in self._buckets.get(key, ()):
+                if hamming_distance(candidate, fingerprint) <= self.max_distance:
+                    return candidate
+        return None
+
+    def __len__(self):
+        return self.size
+
+
+def source_text(source: dict) -> str:
+    """The text of a search result that is fingerprinted: its full page when fetched, otherwise its content."""
+    return source.get("raw_content") or source.get("content") or ""
@@ -1,10 +1,14 @@
 from typing import Dict, Any, List, Union, Optional
 from markdownify import markdownify
 
+from passages import estimate_tokens, select_passages
+
 def deduplicate_and_format_sources(
     search_response: Union[Dict[str, Any], List[Dict[str, Any]]], 
     max_tokens_per_source: int, 
-    fetch_full_page: bool = False
+    fetch_full_page: bool = False,
+    query: Optional[str] = None,
+    count_tokens=estimate_tokens
 ) -> str:
     """
     Format and deduplicate search responses from various search APIs.
@@ -18,6 +22,9 @@ def deduplicate_and_format_sources(
             - A list of dicts, each containing search results
         max_tokens_per_source (int): Maximum number of tokens to include for each source's content
         fetch_full_page (bool, optional): Whether to include the full page content. Defaults to False.
+        query (str, optional): When set, full page content is cut down to the passages that best
+            match the query instead of its first characters. Defaults to None.
+        count_tokens (Callable[[str], int], optional): Token counter used to pack the passages.
             
     Returns:
         str: Formatted string with deduplicated sources
@@ -44,25 +51,50 @@ def deduplicate_and_format_sources(
         if source['url'] not in unique_sources:
             unique_sources[source['url']] = source
     
-    # Format output
-    formatted_text = "Sources:\n\n"
-    for i, source in enumerate(unique_sources.values(), 1):
-        formatted_text += f"Source: {source['title']}\n===\n"
-        formatted_text += f"URL: {source['url']}\n===\n"
-        formatted_text += f"Most relevant content from source: {source['content']}\n===\n"
+    # Rank the passages of every full page against the query in one pass
+    selected_content = {}
+    if fetch_full_page and query:
+        pages = [source for source in unique_sources.values() if source.get('raw_content')]
+        passages = select_passages([source['raw_content'] for source in pages], query, max_tokens_per_source, count_tokens)
+        selected_content = {source['url']: content for source, content in zip(pages, passages)}
+
+    # Format output in one pass: collect the pieces and join them once at the end,
+    # so no source's content is copied more than once
+    parts = ["Sources:\n\n"]
+    append = parts.append
+    if fetch_full_page:
+        # Using rough estimate of 4 characters per token
+        char_limit = max_tokens_per_source * 4
+        full_content_label = f"Full source content limited to {max_tokens_per_source} tokens: "
+    for source in unique_sources.values():
+        append("Source: ")
+        append(str(source['title']))
+        append("\n===\nURL: ")
+        append(str(source['url']))
+        append("\n===\nMost relevant content from source: ")
+        append(str(source['content']))
+        append("\n===\n")
         if fetch_full_page:
-            # Using rough estimate of 4 characters per token
-            char_limit = max_tokens_per_source * 4
             # Handle None raw_content
             raw_content = source.get('raw_content', '')
             if raw_content is None:
                 raw_content = ''
                 print(f"Warning: No raw_content found for source {source['url']}")
-            if len(raw_content) > char_limit:
-                raw_content = raw_content[:char_limit] + "... [truncated]"
-            formatted_text += f"Full source content limited to {max_tokens_per_source} tokens: {raw_content}\n\n"
-                
-    return formatted_text.strip()
+            append(full_content_label)
+            if source['url'] in selected_content:
+                append(selected_content[source['url']])
+            elif len(raw_content) > char_limit:
+                append(raw_content[:char_limit])
+                append("... [truncated]")
+            else:
+                append(str(raw_content))
+            append("\n\n")
+
+    # Same as stripping the joined text: it starts with "Sources:", so only trailing whitespace goes
+    while len(parts) > 1 and (not parts[-1] or parts[-1].isspace()):
+        parts.pop()
+    parts[-1] = parts[-1].rstrip()
+    return "".join(parts)
 
 def format_sources(search_results: Dict[str, Any]) -> str:
     """
@@ -80,4 +112,16 @@ def format_sources(search_results: Dict[str, Any]) -> str:
     return '\n'.join(
         f"* {source['title']} : {source['url']}"
         for source in search_results['results']
-    )
\ No newline at end of file
+    )
+
+def format_final_summary(running_summary: str, sources_gathered: List[str], header: str = "") -> str:
+    """
+    Build the final report: an optional header (e.g. images), the summary and one line per source.
+
+    The pieces are joined once rather than appended to a growing string.
+    """
+    parts = [header, "## Summary\n", str(running_summary), "\n\n### Sources:\n"]
+    for source in sources_gathered:
+        parts.append(str(source))
+        parts.append("\n")
+    return "".join(parts)
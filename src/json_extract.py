@@ -0,0 +1,165 @@
+import json
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+from think_parser import ThinkTagParser
+
+
+class JSONObjectExtractor:
+    """
+    Incrementally find the first balanced JSON object in a streamed completion.
+
+    Feed chunks as they arrive; text inside <think> tags is skipped, so braces
+    in the reasoning never count. The scanner tracks string and escape state
+    and nesting depth, so it knows the moment the outermost object closes, and
+    feed returns True from then on. A candidate that does not parse, or lacks
+    one of the `required` keys, is skipped and scanning resumes after its
+    opening brace: a preamble, a code fence or an example object before the
+    answer does not stop extraction.
+
+    on_field, if given, is called with each top-level key and value as soon as
+    that value is complete, while the rest of the object is still streaming.
+    It can also see the fields of a candidate that is rejected later.
+    """
+    def __init__(self, required: Iterable[str] = (), skip_thinking: bool = True,
+                 on_field: Optional[Callable[[str, Any], None]] = None):
+        self.required = tuple(required)
+        self.on_field = on_field
+        self.result: Optional[Dict[str, Any]] = None
+        self._parser = ThinkTagParser() if skip_thinking else None
+        self._text = ""
+        self._pos = 0
+        self._start = -1
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        # Where the scanner is within the current top-level member: "key", "colon", "value" or "after"
+        self._member = "key"
+        self._key: Optional[str] = None
+        self._token_start = 0
+
+    @property
+    def done(self) -> bool:
+        return self.result is not None
+
+    def feed(self, chunk: str) -> bool:
+        """Add a chunk of the completion; True once the object is complete."""
+        if self.result is not None:
+            return True
+        if self._parser is None:
+            self._text += chunk
+        else:
+            self._text += "".join(text for is_thinking, text in self._parser.feed(chunk) if not is_thinking)
+        return self._scan()
+
+    def close(self) -> Optional[Dict[str, Any]]:
+        """Flush the end of the stream and return the object, or None if there was none."""
+        if self.result is None and self._parser is not None:
+            self._text += "".join(text for is_thinking, text in self._parser.close() if not is_thinking)
+            self._scan()
+        return self.result
+
+    def _accept(self, candidate: str) -> Optional[Dict[str, Any]]:
+        try:
+            # Models put raw newlines inside strings, which strict JSON forbids
+            value = json.loads(candidate, strict=False)
+        except json.JSONDecodeError:
+            return None
+        if not isinstance(value, dict) or any(key not in value for key in self.required):
+            return None
+        return value
+
+    def _field(self, raw: str):
+        self._member = "after"
+        if self.on_field is None or self._key is None:
+            return
+        try:
+            value = json.loads(raw, strict=False)
+        except json.JSONDecodeError:
+            return
+        self.on_field(self._key, value)
+
+    def _scan(self) -> bool:
+        text = self._text
+        i = self._pos
+        while i < len(text):
+            if self._start < 0:
+                i = text.find("{", i)
+                if i == -1:
+                    i = len(text)
+                    break
+                self._start, self._depth, self._in_string, self._escape = i, 1, False, False
+                self._member, self._key = "key", None
+                i += 1
+                continue
+            char = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._member == "key":
+                        try:
+                            self._key = json.loads(text[self._token_start:i + 1], strict=False)
+                        except json.JSONDecodeError:
+                            self._key = None
+                        self._member = "colon"
+                    elif self._depth == 1 and self._member == "value":
+                        self._field(text[self._token_start:i + 1])
+            elif char == '"':
+                self._in_string = True
+                if self._depth == 1 and self._member == "key":
+                    self._token_start = i
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 1 and self._member == "value":
+                    self._field(text[self._token_start:i + 1])
+                elif self._depth == 0:
+                    if self._member == "value":
+                        self._field(text[self._token_start:i])
+                    value = self._accept(text[self._start:i + 1])
+                    if value is not None:
+                        self.result = value
+                        self._pos = i + 1
+                        return True
+                    # Not the answer; an object nested inside it still might be
+                    i = self._start + 1
+                    self._start = -1
+                    continue
+            elif self._depth == 1:
+                if char == ":" and self._member == "colon":
+                    self._member = "value"
+                    self._token_start = i + 1
+                elif char == ",":
+                    if self._member == "value":
+                        self._field(text[self._token_start:i])
+                    self._member = "key"
+            i += 1
+        self._pos = i
+        return False
+
+
+def extract_json_object(text: str, required: Iterable[str] = ()) -> Optional[Dict[str, Any]]:
+    """Return the first JSON object in a complete completion that has the required keys."""
+    extractor = JSONObjectExtractor(required)
+    extractor.feed(text)
+    return extractor.close()
+
+
+def stop_after_json(chunks: Iterator, extractor: JSONObjectExtractor) -> Iterator:
+    """
+    Pass through a model's message chunks until the extractor has its object,
+    then close the stream, which ends the request and the generation with it.
+    """
+    try:
+        for chunk in chunks:
+            yield chunk
+            if extractor.feed(chunk.content or ""):
+                return
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
@@ -4,6 +4,7 @@ from langchain_azure_ai.chat_models import AzureAIChatCompletionsModel
 from azure.core.credentials import AzureKeyCredential
 from langchain_core.messages import HumanMessage
 from rich.prompt import Prompt
+from cassette import cassette_from_env
 
 
 # Load environment variables
@@ -13,12 +14,15 @@ endpoint = os.getenv("AZURE_INFERENCE_ENDPOINT")
 model_name = os.getenv("AZURE_DEEPSEEK_DEPLOYMENT")
 key = os.getenv("AZURE_AI_API_KEY")
 
+# Record or replay the model's calls when CASSETTE_MODE is set
+cassette = cassette_from_env()
+
 # Set up the model
-model = AzureAIChatCompletionsModel(
+model = cassette.wrap_model(AzureAIChatCompletionsModel(
     endpoint=endpoint,
     credential=AzureKeyCredential(key),
     model_name=model_name,  
-)
+))
 
 def run_deep_seek(research_query):
         # Create the messages for the AI model
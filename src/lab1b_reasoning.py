@@ -9,6 +9,7 @@ from rich.console import Console
 from rich.prompt import Prompt
 
 from stream_llm_response import stream_thinking_and_answer
+from cassette import cassette_from_env
 
 # Load environment variables
 load_dotenv()
@@ -20,12 +21,15 @@ endpoint = os.getenv("AZURE_INFERENCE_ENDPOINT")
 model_name = os.getenv("AZURE_DEEPSEEK_DEPLOYMENT")
 key = os.getenv("AZURE_AI_API_KEY")
 
+# Record or replay the model's calls when CASSETTE_MODE is set
+cassette = cassette_from_env()
+
 # Set up the model
-model = AzureAIChatCompletionsModel(
+model = cassette.wrap_model(AzureAIChatCompletionsModel(
     endpoint=endpoint,
     credential=AzureKeyCredential(key),
     model_name=model_name,  
-)
+))
 
 def run_deep_seek(research_query):
         
@@ -10,6 +10,9 @@ from rich.progress import Progress, SpinnerColumn, TextColumn
 
 from stream_llm_response import stream_thinking_and_answer, display_panel
 from prompts import query_writer_instructions, summarizer_instructions, get_current_date
+from caching import search_cache_from_env, cached_search
+from rate_limit import get_rate_limiter, without_sdk_retries
+from cassette import cassette_from_env
 
 
 # Load environment variables
@@ -18,17 +21,26 @@ dotenv.load_dotenv()
 # Initialize console and clients
 console = Console()
 tavily_client = TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
+search_cache = search_cache_from_env()
 
 endpoint = os.getenv("AZURE_INFERENCE_ENDPOINT")
 model_name = os.getenv("AZURE_DEEPSEEK_DEPLOYMENT")
 key = os.getenv("AZURE_AI_API_KEY")
 
+# Record or replay the model and search calls when CASSETTE_MODE is set
+cassette = cassette_from_env()
+
 # Set up the AI model
-model = AzureAIChatCompletionsModel(
+model = cassette.wrap_model(AzureAIChatCompletionsModel(
     endpoint=endpoint,
     credential=AzureKeyCredential(key),
-    model_name=model_name,  
-)
+    model_name=model_name,
+    **without_sdk_retries(AzureAIChatCompletionsModel),
+))
+
+# Shared rate limits and retries for the model and search calls
+llm_limiter = get_rate_limiter("llm", endpoint, model_name)
+search = get_rate_limiter("search", "tavily").wrap(cassette.wrap_search(tavily_client.search))
 
 def generate_search_query(research_topic):
     """Generate an effective search query for the research topic."""
@@ -49,7 +61,7 @@ def generate_search_query(research_topic):
     
     # Stream the model's thinking process
     console.print("\n[bold]Query Generation Process:[/]\n")
-    response_stream = model.stream(messages)
+    response_stream = llm_limiter.stream_sync(lambda: model.stream(messages))
     thoughts, query = stream_thinking_and_answer(response_stream, "🔍 Query Generation Thinking")
     
     display_panel(console, f"**Search Query**: {query}", "🔍 Generated Search Query", "green")
@@ -66,7 +78,7 @@ def perform_web_search(query):
         transient=True,
     ) as progress:
         progress.add_task("Searching the web...", total=None)
-        search_results = tavily_client.search(query=query, max_results=3)
+        search_results = cached_search(search_cache, search, query, max_results=3)
     
     # Display search result snippets
     console.print("\n[bold]Search Results:[/]")
@@ -98,7 +110,7 @@ def summarize_search_results(research_topic, search_results):
     
     # Stream the model's thinking process for summarization
     console.print("\n[bold]Summarization Process:[/]\n")
-    response_stream = model.stream(messages)
+    response_stream = llm_limiter.stream_sync(lambda: model.stream(messages))
     thoughts, summary = stream_thinking_and_answer(response_stream, "📝 Summarization Thinking")
     
     display_panel(console, summary, "📝 Research Summary", "green")
@@ -1,5 +1,4 @@
 import os
-import json
 import dotenv
 from typing import Dict, List, Any, Tuple
 from langchain_azure_ai.chat_models import AzureAIChatCompletionsModel
@@ -13,8 +12,13 @@ from langgraph.graph import StateGraph, START, END
 
 from stream_llm_response import stream_thinking_and_answer, display_panel, strip_thinking_tokens
 from prompts import query_writer_instructions, summarizer_instructions, get_current_date, reflection_instructions
+from caching import search_cache_from_env, cached_search
+from rate_limit import get_rate_limiter, without_sdk_retries
+from stopping import LoopSignals, StoppingPolicy, new_source_share
 from states import SummaryState, SummaryStateInput, SummaryStateOutput
-from formatting import deduplicate_and_format_sources, format_sources
+from formatting import deduplicate_and_format_sources, format_sources, format_final_summary
+from cassette import cassette_from_env
+from json_extract import JSONObjectExtractor, extract_json_object, stop_after_json
 
 # Load environment variables
 dotenv.load_dotenv()
@@ -22,17 +26,29 @@ dotenv.load_dotenv()
 # Initialize console and clients
 console = Console()
 tavily_client = TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
+search_cache = search_cache_from_env()
+
+# Research for at most 2 loops, stopping earlier once the summary stops changing
+stopping_policy = StoppingPolicy(min_loops=1, max_loops=2)
 
 endpoint = os.getenv("AZURE_INFERENCE_ENDPOINT")
 model_name = os.getenv("AZURE_DEEPSEEK_DEPLOYMENT")
 key = os.getenv("AZURE_AI_API_KEY")
 
+# Record or replay the model and search calls when CASSETTE_MODE is set
+cassette = cassette_from_env()
+
 # Set up the AI model
-model = AzureAIChatCompletionsModel(
+model = cassette.wrap_model(AzureAIChatCompletionsModel(
     endpoint=endpoint,
     credential=AzureKeyCredential(key),
-    model_name=model_name,  
-)
+    model_name=model_name,
+    **without_sdk_retries(AzureAIChatCompletionsModel),
+))
+
+# Shared rate limits and retries for the model and search calls
+llm_limiter = get_rate_limiter("llm", endpoint, model_name)
+search = get_rate_limiter("search", "tavily").wrap(cassette.wrap_search(tavily_client.search))
   
 
 def generate_search_query(state: SummaryState):
@@ -54,13 +70,19 @@ def generate_search_query(state: SummaryState):
     
     # Stream the model's thinking process
     console.print("\n[bold]Query Generation Process:[/]\n")
-    response_stream = model.stream(messages)
+    response_stream = llm_limiter.stream_sync(lambda: model.stream(messages))
     thoughts, query = stream_thinking_and_answer(response_stream, "🔍 Query Generation Thinking")
     
     display_panel(console, f"**Search Query**: {query}", "🔍 Generated Search Query and updated state.search_query", "green")
     
     return {"search_query": query}
 
+# Helper function to read the query out of state.search_query, which holds the model's JSON answer for the
+# first query and the plain follow-up query after a reflection
+def query_text(search_query: str) -> str:
+    answer = extract_json_object(search_query or "", ("query",))
+    return answer["query"] if answer is not None else search_query
+
 def perform_web_search(state: SummaryState):
     """Perform a web search using the Tavily API."""
     console.print("\n[bold blue]Performing web search...[/]")
@@ -71,7 +93,7 @@ def perform_web_search(state: SummaryState):
         transient=True,
     ) as progress:
         progress.add_task("Searching the web...", total=None)
-        search_results = tavily_client.search(query=state.search_query, max_results=3)
+        search_results = cached_search(search_cache, search, state.search_query, max_results=3)
     
     # Display search result snippets
     console.print("\n[bold]Search Results:[/]")
@@ -90,7 +112,11 @@ def perform_web_search(state: SummaryState):
     
     search_str = deduplicate_and_format_sources(search_results, max_tokens_per_source=1000)
     
-    return {"sources_gathered": [format_sources(search_results)], "research_loop_count": state.research_loop_count + 1, "web_research_results": [search_str]}
+    urls = [result["url"] for result in search_results["results"]]
+    seen_urls = set(state.source_urls)
+    return {"sources_gathered": [format_sources(search_results)], "research_loop_count": state.research_loop_count + 1, "web_research_results": [search_str],
+            "queries_tried": [query_text(state.search_query)], "source_urls": [url for url in urls if url not in seen_urls],
+            "new_source_share": new_source_share(urls, seen_urls)}
 
 
 def summarize_search_results(state: SummaryState):
@@ -123,12 +149,12 @@ def summarize_search_results(state: SummaryState):
     
     # Stream the model's thinking process for summarization
     console.print("\n[bold]Summarization Process:[/]\n")
-    response_stream = model.stream(messages)
+    response_stream = llm_limiter.stream_sync(lambda: model.stream(messages))
     thoughts, summary = stream_thinking_and_answer(response_stream, "📝 Summarization Thinking")
     
     display_panel(console, summary, "📝 Research Summary created and updated state.running_summary", "green")
     
-    return {"running_summary": summary}
+    return {"running_summary": summary, "previous_summary": existing_summary}
 
 def identify_knowledge_gaps(state: SummaryState):
     """Identify knowledge gaps and generate a follow-up query."""
@@ -141,16 +167,18 @@ def identify_knowledge_gaps(state: SummaryState):
     
     # Stream the model's thinking process for knowledge gap identification
     console.print("\n[bold]Knowledge Gap Analysis Process:[/]\n")
-    response_stream = model.stream(messages)
+    # Stop streaming as soon as the JSON answer is complete
+    extractor = JSONObjectExtractor(required=("follow_up_query",))
+    response_stream = stop_after_json(llm_limiter.stream_sync(lambda: model.stream(messages)), extractor)
     thoughts, json_str = stream_thinking_and_answer(response_stream, "🔍 Reflection Thinking")
     
-    # Try to parse the JSON response
-    try:
-        reflection = json.loads(json_str)
+    # Read the first JSON object of the answer, ignoring any text around it
+    reflection = extractor.close()
+    if reflection is not None:
         knowledge_gap = reflection.get("knowledge_gap", "No specific knowledge gap identified.")
-        follow_up_query = reflection.get("follow_up_query", f"More information about {state.research_topic}")
-    except json.JSONDecodeError:
-        # Fallback if JSON parsing fails
+        follow_up_query = reflection["follow_up_query"]
+    else:
+        # Fallback if the answer has no JSON object
         knowledge_gap = "Unable to parse the identified knowledge gap."
         follow_up_query = f"More information about {state.research_topic}"
     
@@ -168,9 +196,7 @@ def finalize_summary(state: SummaryState):
     console.print("\n[bold]===== Final Research Report =====[/]\n")
 
     # Format the final summary
-    final_summary = f"## Summary\n{state.running_summary}\n\n### Sources:\n"
-    for source in state.sources_gathered:
-        final_summary += f"{source}\n"
+    final_summary = format_final_summary(state.running_summary, state.sources_gathered)
 
     
     display_panel(console, final_summary, "📊 Complete Research Report and updated state.running_summary", "purple")
@@ -178,11 +204,12 @@ def finalize_summary(state: SummaryState):
 
 # Conditional function that decides whether to continue research or finalize summary
 def route_research(state: SummaryState):
-    if state.research_loop_count <= 1:
+    reason = stopping_policy.stop_reason(state.research_loop_count, LoopSignals.from_state(state))
+    if reason is None:
         display_panel(console, "web_research", "📊 Doing more research", "yellow")
         return "web_research"
     else:
-        display_panel(console, "finalize_summary", "📊 Finalizing the summary", "yellow")
+        display_panel(console, f"finalize_summary ({reason})", "📊 Finalizing the summary", "yellow")
         return "finalize_summary" 
 
 # Set up the graph
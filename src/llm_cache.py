@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+from typing import Any, Dict, Iterable, Optional, Sequence
+
+from langchain_core.messages import BaseMessage
+
+from caching import DEFAULT_CACHE_PATH, LRUCache, SQLiteCache
+
+# Model attributes that change the completion and therefore belong in the cache key
+SAMPLING_PARAMS = ("temperature", "top_p", "max_tokens", "seed", "presence_penalty", "frequency_penalty", "stop", "model_kwargs")
+
+# Graph nodes whose prompts are fully determined by the state and the templates in prompts.py
+DEFAULT_CACHED_NODES = ("generate_query", "summarize_sources", "reflect_on_summary")
+
+
+def sampling_params(model) -> Dict[str, Any]:
+    """Collect the sampling parameters configured on a chat model."""
+    params = {}
+    for name in SAMPLING_PARAMS:
+        value = getattr(model, name, None)
+        if value not in (None, {}, []):
+            params[name] = value
+    return params
+
+
+def llm_cache_key(model_name: str, messages: Sequence[BaseMessage], params: Optional[Dict[str, Any]] = None) -> str:
+    """Hash the model name, message roles and contents, and sampling parameters."""
+    payload = json.dumps(
+        {
+            "model": model_name,
+            "messages": [[message.type, message.content] for message in messages],
+            "params": params or {},
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Cache of raw completion text for deterministic graph nodes.
+
+    The backend is any object with get(key) and set(key, value), such as the
+    LRUCache and SQLiteCache from caching.py. Only nodes listed in `nodes` read
+    from or write to the cache.
+    """
+    def __init__(self, backend, nodes: Iterable[str] = DEFAULT_CACHED_NODES):
+        self.backend = backend
+        self.nodes = frozenset(nodes)
+        self.hits = 0
+        self.misses = 0
+
+    def enabled_for(self, node: str) -> bool:
+        return node in self.nodes
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, content: str):
+        self.backend.set(key, content)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "nodes": sorted(self.nodes),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        if hasattr(self.backend, "close"):
+            self.backend.close()
+
+
+def llm_cache_from_env() -> Optional[LLMResponseCache]:
+    """
+    Build the response cache from the LLM_CACHE_* environment variables.
+
+    The cache is off unless LLM_CACHE_BACKEND is "memory" or "sqlite".
+    LLM_CACHE_NODES is a comma-separated list of nodes that opt in.
+    """
+    backend_name = os.getenv("LLM_CACHE_BACKEND", "none").lower()
+    ttl = os.getenv("LLM_CACHE_TTL")
+    ttl = float(ttl) if ttl else None
+    if backend_name == "memory":
+        backend = LRUCache(max_entries=int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "512")), ttl=ttl)
+    elif backend_name == "sqlite":
+        backend = SQLiteCache(
+            os.getenv("LLM_CACHE_PATH", str(DEFAULT_CACHE_PATH)),
+            table="llm_responses",
+            max_entries=int(os.getenv("LLM_CACHE_DISK_ENTRIES", "10000")),
+            ttl=ttl,
+        )
+    else:
+        return None
+
+    nodes = os.getenv("LLM_CACHE_NODES")
+    if nodes is None:
+        return LLMResponseCache(backend)
+    return LLMResponseCache(backend, [node.strip() for node in nodes.split(",") if node.strip()])
@@ -0,0 +1,157 @@
+import os
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+# Allocations made by tracemalloc itself and the import machinery only add noise to the reports
+_NOISE_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+KEY_TYPES = ("lineno", "filename", "traceback")
+
+# Deepest traceback kept per allocation; each extra frame makes tracing slower and hungrier
+MAX_TRACE_FRAMES = 50
+
+
+def _statistic(stat) -> Dict[str, Any]:
+    frames = [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback]
+    return {
+        "location": frames[0] if frames else "<unknown>",
+        "traceback": frames,
+        "size_kib": round(stat.size / 1024, 1),
+        "count": stat.count,
+    }
+
+
+class MemoryProfiler:
+    """
+    Opt-in tracemalloc tracing with named snapshots kept in memory.
+
+    Tracing costs time and memory on every allocation, so it only runs between
+    start() and stop(). Snapshots are numbered and the oldest is dropped once
+    max_snapshots are held. top() lists the biggest allocation sites of one
+    snapshot and diff() what grew between two, which is how a leak shows up:
+    take a snapshot, run some sessions, take another and diff them.
+    """
+    def __init__(self, max_snapshots: int = 5):
+        self.max_snapshots = max_snapshots
+        self.frames = 1
+        self._snapshots: "OrderedDict[int, tuple[tracemalloc.Snapshot, Dict[str, Any]]]" = OrderedDict()
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = 1):
+        """Start tracing, keeping `frames` frames of traceback per allocation; restarts if the depth changes."""
+        if not 1 <= frames <= MAX_TRACE_FRAMES:
+            raise ValueError(f"frames must be between 1 and {MAX_TRACE_FRAMES}")
+        if self.tracing and tracemalloc.get_traceback_limit() != frames:
+            tracemalloc.stop()
+        self.frames = frames
+        if not self.tracing:
+            tracemalloc.start(frames)
+
+    def stop(self):
+        """Stop tracing and drop the snapshots, freeing the tracing memory."""
+        tracemalloc.stop()
+        with self._lock:
+            self._snapshots.clear()
+
+    def take_snapshot(self, label: Optional[str] = None, **metadata) -> Dict[str, Any]:
+        if not self.tracing:
+            raise RuntimeError("Memory tracing is not running")
+        snapshot = tracemalloc.take_snapshot().filter_traces(_NOISE_FILTERS)
+        current, peak = tracemalloc.get_traced_memory()
+        with self._lock:
+            snapshot_id = self._next_id
+            self._next_id += 1
+            info = {
+                "id": snapshot_id,
+                "label": label,
+                "taken_at": time.time(),
+                "frames": snapshot.traceback_limit,
+                "traced_kib": round(current / 1024, 1),
+                "peak_kib": round(peak / 1024, 1),
+                **metadata,
+            }
+            self._snapshots[snapshot_id] = (snapshot, info)
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+        return info
+
+    def snapshots(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [info for _, info in self._snapshots.values()]
+
+    def _get(self, snapshot_id: int):
+        with self._lock:
+            if snapshot_id not in self._snapshots:
+                raise KeyError(snapshot_id)
+            return self._snapshots[snapshot_id]
+
+    def top(self, snapshot_id: int, key_type: str = "lineno", limit: int = 20) -> Dict[str, Any]:
+        """The allocation sites holding the most memory in a snapshot."""
+        if key_type not in KEY_TYPES:
+            raise ValueError(f"key_type must be one of {', '.join(KEY_TYPES)}")
+        snapshot, info = self._get(snapshot_id)
+        stats = snapshot.statistics(key_type)
+        return {
+            "snapshot": info,
+            "total_kib": round(sum(stat.size for stat in stats) / 1024, 1),
+            "top": [_statistic(stat) for stat in stats[:limit]],
+        }
+
+    def diff(self, first_id: int, second_id: int, key_type: str = "lineno", limit: int = 20) -> Dict[str, Any]:
+        """The allocation sites whose memory changed the most from the first snapshot to the second."""
+        if key_type not in KEY_TYPES:
+            raise ValueError(f"key_type must be one of {', '.join(KEY_TYPES)}")
+        first, first_info = self._get(first_id)
+        second, second_info = self._get(second_id)
+        stats = second.compare_to(first, key_type)
+        return {
+            "first": first_info,
+            "second": second_info,
+            "size_diff_kib": round(sum(stat.size_diff for stat in stats) / 1024, 1),
+            "top": [
+                {
+                    **_statistic(stat),
+                    "size_diff_kib": round(stat.size_diff / 1024, 1),
+                    "count_diff": stat.count_diff,
+                }
+                for stat in stats[:limit]
+            ],
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        current, peak = tracemalloc.get_traced_memory() if self.tracing else (0, 0)
+        return {
+            "tracing": self.tracing,
+            "frames": tracemalloc.get_traceback_limit() if self.tracing else self.frames,
+            "traced_kib": round(current / 1024, 1),
+            "peak_kib": round(peak / 1024, 1),
+            "tracing_overhead_kib": round(tracemalloc.get_tracemalloc_memory() / 1024, 1),
+            "snapshots": len(self._snapshots),
+        }
+
+
+def memory_profiler_from_env() -> MemoryProfiler:
+    """
+    Build the profiler from the MEMORY_TRACE_* environment variables.
+
+    Tracing starts right away only when MEMORY_TRACE is true, with
+    MEMORY_TRACE_FRAMES frames per allocation; otherwise it can be started later.
+    """
+    profiler = MemoryProfiler(max_snapshots=int(os.getenv("MEMORY_TRACE_SNAPSHOTS", "5")))
+    profiler.frames = int(os.getenv("MEMORY_TRACE_FRAMES", "1"))
+    if os.getenv("MEMORY_TRACE", "false").lower() in ("1", "true", "yes"):
+        profiler.start(profiler.frames)
+    return profiler
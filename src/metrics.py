@@ -0,0 +1,180 @@
+import bisect
+import functools
+import math
+import time
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple, Union
+
+# Latency buckets in seconds, from a cached model answer up to a long reasoning call
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[Any], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        """(suffix, formatted labels, value) for every sample of the metric."""
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(f"{self.name}{suffix}{labels} {_format_value(value)}" for suffix, labels, value in self.samples())
+        return lines
+
+
+class Counter(Metric):
+    """Monotonic counter; inc() is a single dict update, cheap enough for the hot path."""
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, *label_values):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        for label_values, value in sorted(self._values.items()):
+            yield "", _format_labels(self.labels, label_values), value
+
+
+class Histogram(Metric):
+    """
+    Histogram with fixed buckets.
+
+    observe() finds the value's bucket with one bisect and bumps a single
+    count; the cumulative bucket counts Prometheus expects are only summed up
+    when the metrics are rendered.
+    """
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *label_values):
+        series = self._series.get(label_values)
+        if series is None:
+            # Per-bucket counts (the last one for values above every bucket), then the sum
+            series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def samples(self):
+        for label_values, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), series):
+                cumulative += count
+                yield "_bucket", _format_labels(self.labels, label_values, f'le="{_format_value(float(bound))}"'), cumulative
+            yield "_count", _format_labels(self.labels, label_values), cumulative
+            yield "_sum", _format_labels(self.labels, label_values), series[-1]
+
+
+class Gauge(Metric):
+    """
+    Gauge read from a callback when the metrics are scraped, so it costs nothing between scrapes.
+
+    The callback returns a number, or a dict mapping a label value (or tuple of
+    label values) to a number.
+    """
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, read: Callable[[], Union[float, Dict[Any, float], None]], labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self.read = read
+
+    def samples(self):
+        value = self.read()
+        if value is None:
+            return
+        if not isinstance(value, dict):
+            yield "", "", float(value)
+            return
+        for label_values, item in sorted(value.items(), key=lambda entry: str(entry[0])):
+            if item is None:
+                continue
+            if not isinstance(label_values, tuple):
+                label_values = (label_values,)
+            yield "", _format_labels(self.labels, label_values), float(item)
+
+
+class CounterFunction(Gauge):
+    """Counter read from a callback when scraped, for totals the app already keeps elsewhere."""
+    type = "counter"
+
+
+class MetricsRegistry:
+    """Metrics of one process, rendered in the Prometheus text exposition format."""
+    content_type = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self, prefix: str = ""):
+        self.prefix = prefix
+        self._metrics: Dict[str, Metric] = {}
+
+    def _register(self, metric: Metric) -> Metric:
+        metric.name = self.prefix + metric.name
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name: str, help: str, read: Callable, labels: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help, read, labels))
+
+    def counter_function(self, name: str, help: str, read: Callable, labels: Sequence[str] = ()) -> CounterFunction:
+        return self._register(CounterFunction(name, help, read, labels))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                # A failing gauge callback should not take the whole endpoint down
+                lines.append(f"# {metric.name} unavailable: {_escape(e)}")
+        return "\n".join(lines) + "\n"
+
+
+def timed(histogram: Histogram, *label_values, clock: Callable[[], float] = time.perf_counter):
+    """Decorator recording how long each call of an async function takes, including failed calls."""
+    def decorator(function):
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            started = clock()
+            try:
+                return await function(*args, **kwargs)
+            finally:
+                histogram.observe(clock() - started, *label_values)
+        return wrapper
+    return decorator
+
@@ -0,0 +1,131 @@
+import asyncio
+from collections import deque
+from typing import Any, Dict, Optional
+
+from fastapi import WebSocket
+
+# Message types where only the newest queued message matters
+SUPERSEDED_TYPES = frozenset({"thinking", "summarize"})
+
+# Streamed deltas: consecutive ones from the same model call are merged, and they may be dropped when the queue is full
+DELTA_TYPES = frozenset({"thinking_delta", "summary_delta"})
+
+
+class OutboundQueue:
+    """
+    Bounded send queue for one websocket, drained by its own writer task.
+
+    Producers (the graph nodes) never wait on the network directly. While a
+    message is queued, a newer message of a superseded type replaces it and
+    consecutive deltas from the same model call are concatenated. When the
+    queue is full, deltas are dropped under the "drop" policy; every other
+    message (and deltas under the "block" policy) waits for room, which applies
+    backpressure to the graph run.
+    """
+    def __init__(self, websocket: WebSocket, max_size: int = 256, policy: str = "drop"):
+        if policy not in ("drop", "block"):
+            raise ValueError(f"Unknown outbound queue policy: {policy!r}")
+        self.websocket = websocket
+        self.max_size = max_size
+        self.policy = policy
+        self._queue: deque = deque()
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+        self._writer: Optional[asyncio.Task] = None
+        self.closed = False
+
+        # Queue statistics
+        self.enqueued = 0
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.blocked = 0
+        self.max_depth = 0
+
+    def __len__(self):
+        return len(self._queue)
+
+    def start(self):
+        self._writer = asyncio.create_task(self._run())
+
+    async def put(self, message: dict):
+        if self.closed:
+            return
+        self.enqueued += 1
+        if self._coalesce(message):
+            self.coalesced += 1
+            return
+
+        while len(self._queue) >= self.max_size:
+            if self.policy == "drop" and message.get("type") in DELTA_TYPES:
+                self.dropped += 1
+                return
+            self.blocked += 1
+            self._not_full.clear()
+            await self._not_full.wait()
+            if self.closed:
+                return
+
+        self._queue.append(message)
+        self.max_depth = max(self.max_depth, len(self._queue))
+        self._not_empty.set()
+
+    def _coalesce(self, message: dict) -> bool:
+        """Fold the message into one that is still queued; return True if nothing else needs queueing."""
+        message_type = message.get("type")
+        if message_type in DELTA_TYPES and self._queue:
+            last = self._queue[-1]
+            if last.get("type") == message_type and last["data"].get("call") == message["data"].get("call"):
+                last["data"] = {**last["data"], "delta": last["data"]["delta"] + message["data"]["delta"]}
+                return True
+        elif message_type in SUPERSEDED_TYPES:
+            # Drop the older queued message and queue the new one at the end to keep ordering
+            for queued in self._queue:
+                if queued.get("type") == message_type:
+                    self._queue.remove(queued)
+                    self.coalesced += 1
+                    self._not_full.set()
+                    break
+        return False
+
+    async def _run(self):
+        try:
+            while True:
+                while not self._queue:
+                    self._not_empty.clear()
+                    await self._not_empty.wait()
+                message = self._queue.popleft()
+                self._not_full.set()
+                await self.websocket.send_json(message)
+                self.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # The socket is gone; stop accepting messages and release blocked producers
+            self._close()
+
+    def _close(self):
+        self.closed = True
+        self._queue.clear()
+        self._not_full.set()
+
+    async def close(self):
+        self._close()
+        if self._writer is not None:
+            self._writer.cancel()
+            try:
+                await self._writer
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "depth": len(self._queue),
+            "max_depth": self.max_depth,
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "blocked": self.blocked,
+        }
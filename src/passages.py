@@ -0,0 +1,130 @@
+import math
+import re
+from typing import Callable, List, Sequence
+
+import numpy as np
+
+_WORD = re.compile(r"\w+")
+
+# Separator between non-adjacent passages picked from the same page
+PASSAGE_SEPARATOR = "\n...\n"
+
+
+def tokenize(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+
+def estimate_tokens(text: str) -> int:
+    # Rough estimate of 4 characters per token, as in formatting.py
+    return math.ceil(len(text) / 4)
+
+
+def split_passages(text: str, max_words: int = 100) -> List[str]:
+    """Split page text into passages of whole lines, each at most max_words words; longer lines are cut into word windows."""
+    passages = []
+    current: List[str] = []
+    words = 0
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        line_words = line.split()
+        if len(line_words) > max_words:
+            if current:
+                passages.append("\n".join(current))
+                current, words = [], 0
+            passages.extend(" ".join(line_words[i:i + max_words]) for i in range(0, len(line_words), max_words))
+            continue
+        if current and words + len(line_words) > max_words:
+            passages.append("\n".join(current))
+            current, words = [], 0
+        current.append(line)
+        words += len(line_words)
+    if current:
+        passages.append("\n".join(current))
+    return passages
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a fixed list of passages.
+
+    The index is stored as flat (term, passage, frequency) arrays, so scoring a
+    query is a handful of numpy operations over the postings of its terms,
+    however many passages and pages are indexed.
+    """
+    def __init__(self, passages: Sequence[str], k1: float = 1.5, b: float = 0.75):
+        tokens = [tokenize(passage) for passage in passages]
+        vocabulary = {}
+        token_ids = np.array([vocabulary.setdefault(term, len(vocabulary)) for terms in tokens for term in terms], dtype=np.int64)
+        lengths = np.array([len(terms) for terms in tokens], dtype=np.float64)
+
+        # Count each (passage, term) pair in one pass over the flattened tokens
+        self.size = len(passages)
+        vocabulary_size = max(len(vocabulary), 1)
+        token_passages = np.repeat(np.arange(self.size, dtype=np.int64), lengths.astype(np.int64))
+        pairs, counts = np.unique(token_passages * vocabulary_size + token_ids, return_counts=True)
+
+        self.k1 = k1
+        self.vocabulary = vocabulary
+        self.term_ids = pairs % vocabulary_size
+        self.passage_ids = pairs // vocabulary_size
+        self.frequencies = counts.astype(np.float64)
+
+        document_frequency = np.bincount(self.term_ids, minlength=len(vocabulary))
+        self.idf = np.log1p((self.size - document_frequency + 0.5) / (document_frequency + 0.5))
+        average_length = lengths.mean() if self.size else 0.0
+        # Per-passage length normalization of the term frequency
+        self.norm = k1 * (1 - b + b * lengths / average_length) if average_length else np.full(self.size, k1)
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every passage for the query."""
+        query_ids = [self.vocabulary[term] for term in set(tokenize(query)) if term in self.vocabulary]
+        if not query_ids:
+            return np.zeros(self.size)
+        mask = np.isin(self.term_ids, query_ids)
+        frequencies = self.frequencies[mask]
+        passage_ids = self.passage_ids[mask]
+        weights = self.idf[self.term_ids[mask]] * frequencies * (self.k1 + 1) / (frequencies + self.norm[passage_ids])
+        return np.bincount(passage_ids, weights=weights, minlength=self.size)
+
+
+def select_passages(texts: Sequence[str], query: str, max_tokens: int,
+                    count_tokens: Callable[[str], int] = estimate_tokens, max_words: int = 100) -> List[str]:
+    """
+    Keep the passages of each text that are most relevant to the query, within max_tokens per text.
+
+    The texts that do not fit are ranked in one shared index, so term weights
+    reflect every long page of the loop. Texts that already fit are returned
+    unchanged; the passages picked from the others are kept in page order.
+    """
+    long_texts = [i for i, text in enumerate(texts) if count_tokens(text) > max_tokens]
+    split = {i: split_passages(texts[i], max_words) for i in long_texts}
+    scores = BM25Index([passage for i in long_texts for passage in split[i]]).scores(query)
+
+    selected = list(texts)
+    start = 0
+    for i in long_texts:
+        passages = split[i]
+        page_scores = scores[start:start + len(passages)]
+        start += len(passages)
+
+        # Pack the best passages first, skipping any that no longer fit
+        chosen = []
+        used = 0
+        for j in np.argsort(-page_scores, kind="stable"):
+            cost = count_tokens(passages[j])
+            if used + cost <= max_tokens:
+                chosen.append(j)
+                used += cost
+
+        # Join in page order, marking the gaps between non-adjacent passages
+        parts = []
+        previous = None
+        for j in sorted(chosen):
+            if previous is not None:
+                parts.append("\n" if j == previous + 1 else PASSAGE_SEPARATOR)
+            parts.append(passages[j])
+            previous = j
+        selected[i] = "".join(parts)
+    return selected
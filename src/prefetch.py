@@ -0,0 +1,52 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+class SearchPrefetcher:
+    """
+    Searches started ahead of the step that uses them, keyed by run and query.
+
+    A step that streams its queries can start each search the moment the query
+    is complete; the search step then takes the running task instead of
+    searching again. Searches that are never taken are cancelled by discard.
+    """
+    def __init__(self):
+        self._tasks: Dict[str, Dict[str, asyncio.Task]] = {}
+        self.started = 0
+        self.used = 0
+        self.discarded = 0
+
+    def start(self, run_id: str, query: str, search: Callable[[], Awaitable[Any]]) -> bool:
+        """Start searching for a query unless the run already has that search; True if it was started."""
+        tasks = self._tasks.setdefault(run_id, {})
+        if query in tasks:
+            return False
+        task = asyncio.create_task(search())
+        # A search that fails and is then discarded should not log "exception was never retrieved"
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        tasks[query] = task
+        self.started += 1
+        return True
+
+    def take(self, run_id: str, query: str) -> Optional[asyncio.Task]:
+        """Hand over the run's search for a query, if one was started."""
+        task = self._tasks.get(run_id, {}).pop(query, None)
+        if task is not None:
+            self.used += 1
+        return task
+
+    def discard(self, run_id: str) -> int:
+        """Cancel the run's searches that were never taken."""
+        tasks = self._tasks.pop(run_id, {})
+        for task in tasks.values():
+            task.cancel()
+        self.discarded += len(tasks)
+        return len(tasks)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "started": self.started,
+            "used": self.used,
+            "discarded": self.discarded,
+            "pending": sum(len(tasks) for tasks in self._tasks.values()),
+        }
@@ -89,4 +89,61 @@ Reflect carefully on the Summary to identify knowledge gaps and produce a follow
 </Task>
 
 Provide your analysis in JSON format. Do not include any tags or backticks. Only return
-Json like in the example:"""
\ No newline at end of file
+Json like in the example:"""
+
+multi_query_writer_instructions="""Your goal is to generate {number_of_queries} targeted web search queries that together cover the topic.
+
+<CONTEXT>
+Current date: {current_date}
+Please ensure your queries account for the most current information available as of this date.
+</CONTEXT>
+
+<TOPIC>
+{research_topic}
+</TOPIC>
+
+<FORMAT>
+Format your response as a JSON object with these exact keys:
+   - "queries": A list of {number_of_queries} distinct search query strings, each covering a different aspect of the topic
+   - "rationale": Brief explanation of why these queries are relevant
+</FORMAT>
+
+<EXAMPLE>
+Example output:
+{{
+    "queries": ["machine learning transformer architecture explained", "transformer attention mechanism performance benchmarks"],
+    "rationale": "Understanding the fundamental structure of transformer models and how they perform"
+}}
+</EXAMPLE>
+
+Provide your response in JSON format. Do not include any tags or backticks. Only return
+Json like in the example:"""
+
+multi_reflection_instructions = """You are an expert research assistant analyzing a summary about {research_topic}.
+
+<GOAL>
+1. Identify knowledge gaps or areas that need deeper exploration
+2. Generate {number_of_queries} follow-up questions that would help expand your understanding
+3. Focus on technical details, implementation specifics, or emerging trends that weren't fully covered
+</GOAL>
+
+<REQUIREMENTS>
+Ensure each follow-up question is self-contained, includes necessary context for web search and covers a different gap.
+</REQUIREMENTS>
+
+<FORMAT>
+Format your response as a JSON object with these exact keys:
+- knowledge_gap: Describe what information is missing or needs clarification
+- follow_up_queries: A list of {number_of_queries} specific questions to address this gap
+</FORMAT>
+
+<Task>
+Reflect carefully on the Summary to identify knowledge gaps and produce follow-up queries. Then, produce your output following this JSON format:
+{{
+    "knowledge_gap": "The summary lacks information about performance metrics and benchmarks",
+    "follow_up_queries": ["What are typical performance benchmarks used to evaluate [specific technology]?", "How does [specific technology] compare with its alternatives in production?"]
+}}
+</Task>
+
+Provide your analysis in JSON format. Do not include any tags or backticks. Only return
+Json like in the example:"""
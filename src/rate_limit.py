@@ -0,0 +1,356 @@
+import asyncio
+import email.utils
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+# HTTP statuses worth retrying: timeouts, throttling and transient server errors
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+# Error classes raised by the model and search clients for throttling and dropped
+# connections. Matched by name anywhere in the class hierarchy, so none of the
+# client libraries has to be imported here.
+RETRYABLE_ERROR_NAMES = {
+    "UsageLimitExceededError",  # Tavily 429
+    "RateLimitError",
+    "APIConnectionError",
+    "APITimeoutError",
+    "ServiceRequestError",
+    "ServiceResponseError",
+    "TransportError",
+    "ConnectionError",
+    "Timeout",
+    "TimeoutError",
+}
+THROTTLE_ERROR_NAMES = {"UsageLimitExceededError", "RateLimitError"}
+
+
+
+def without_sdk_retries(model_class) -> Dict[str, Any]:
+    """
+    Constructor arguments that turn off a chat model's own retries, so throttled
+    calls are retried by the limiter alone instead of by both layers.
+    """
+    # Models on the OpenAI API retry in the openai client; the azure-ai-inference ones in azure-core
+    if "max_retries" in getattr(model_class, "model_fields", {}):
+        return {"max_retries": 0}
+    return {"client_kwargs": {"retry_total": 0}}
+
+
+def parse_retry_after(headers) -> Optional[float]:
+    """Seconds to wait from retry-after-ms or Retry-After (seconds or an HTTP date), or None."""
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms") or headers.get("x-ms-retry-after-ms")
+    if value:
+        try:
+            return max(float(value) / 1000, 0.0)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def status_code(error: BaseException) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """The wait the server asked for, from the error itself or its response headers."""
+    for attribute in ("retry_after", "retry_after_seconds"):
+        value = getattr(error, attribute, None)
+        if value is not None:
+            return float(value)
+    return parse_retry_after(getattr(getattr(error, "response", None), "headers", None))
+
+
+def _error_names(error: BaseException) -> set:
+    return {cls.__name__ for cls in type(error).__mro__}
+
+
+def is_throttled(error: BaseException) -> bool:
+    return status_code(error) == 429 or bool(_error_names(error) & THROTTLE_ERROR_NAMES)
+
+
+def is_retryable(error: BaseException) -> bool:
+    status = status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUSES
+    return bool(_error_names(error) & RETRYABLE_ERROR_NAMES)
+
+
+class TokenBucket:
+    """
+    Token bucket that hands out reservations instead of blocking.
+
+    reserve() always takes the amount, letting the balance go negative, and
+    returns how long the caller has to wait before its reservation is covered.
+    Callers therefore queue up in order without holding a lock while they sleep.
+    """
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        self._refill(now)
+        self.tokens -= min(amount, self.capacity)
+        return max(-self.tokens / self.rate, 0.0)
+
+    def adjust(self, amount: float, now: float):
+        """Take (or give back, when negative) tokens after the fact."""
+        self._refill(now)
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+
+@dataclass
+class RetryPolicy:
+    max_attempts: int = 5
+    base_delay: float = 0.5
+    max_delay: float = 30.0
+
+    @classmethod
+    def from_env(cls) -> "RetryPolicy":
+        return cls(
+            max_attempts=max(int(os.getenv("RETRY_MAX_ATTEMPTS", "5")), 1),
+            base_delay=float(os.getenv("RETRY_BASE_DELAY", "0.5")),
+            max_delay=float(os.getenv("RETRY_MAX_DELAY", "30")),
+        )
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Full-jitter exponential backoff, never shorter than the server's Retry-After."""
+        if retry_after is not None:
+            # A little jitter on top keeps throttled callers from retrying in lockstep
+            return retry_after + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class RateLimiter:
+    """
+    Client-side limit on requests per second and tokens per minute for one endpoint.
+
+    Every caller of the endpoint in the process shares one limiter, so the
+    budget holds however many sessions and nodes run at once. Calls wait for
+    their turn before being sent instead of failing with a 429. When the server
+    throttles anyway, every caller pauses for its Retry-After, and the failed
+    call is retried with jittered exponential backoff. A call's tokens are
+    reserved once, on its first attempt; retries only take a request slot, so
+    one settle() corrects the whole call.
+    """
+    def __init__(self, name: str, requests_per_second: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None, retry: Optional[RetryPolicy] = None):
+        self.name = name
+        self.requests_per_second = requests_per_second
+        self.tokens_per_minute = tokens_per_minute
+        self.retry = retry or RetryPolicy()
+        # Bursts of up to one second of requests and ten seconds of tokens
+        self._requests = TokenBucket(requests_per_second, max(requests_per_second, 1.0)) if requests_per_second else None
+        self._tokens = TokenBucket(tokens_per_minute / 60, tokens_per_minute / 6) if tokens_per_minute else None
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+        # Statistics
+        self.calls = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.tokens_used = 0
+        self.throttled = 0
+        self.retries = 0
+        self.failures = 0
+
+    def _reserve(self, tokens: int) -> float:
+        with self._lock:
+            now = time.monotonic()
+            delay = max(self._blocked_until - now, 0.0)
+            if self._requests is not None:
+                delay = max(delay, self._requests.reserve(1, now))
+            if self._tokens is not None and tokens:
+                delay = max(delay, self._tokens.reserve(tokens, now))
+            self.calls += 1
+            if delay > 0:
+                self.waits += 1
+                self.wait_seconds += delay
+            return delay
+
+    async def acquire(self, tokens: int = 0):
+        """Wait until a request of about `tokens` tokens fits in the limits."""
+        delay = self._reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def acquire_sync(self, tokens: int = 0):
+        delay = self._reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+
+    def settle(self, reserved: int, used: int):
+        """Correct the token budget once a call reports how many tokens it really used."""
+        with self._lock:
+            self.tokens_used += used
+            if self._tokens is not None:
+                self._tokens.adjust(used - reserved, time.monotonic())
+
+    def _backoff(self, error: BaseException, attempt: int) -> Optional[float]:
+        """How long to wait before retrying after `error`, or None to give up."""
+        if not is_retryable(error) or attempt + 1 >= self.retry.max_attempts:
+            with self._lock:
+                self.failures += 1
+            return None
+        wait = retry_after(error)
+        delay = self.retry.delay(attempt, wait)
+        with self._lock:
+            self.retries += 1
+            if is_throttled(error):
+                # The whole endpoint is over quota, so hold back every caller, not just this one
+                self.throttled += 1
+                self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+        return delay
+
+    async def call(self, request: Callable[[], Awaitable[T]], tokens: int = 0) -> T:
+        """Await request() within the limits, retrying transient failures."""
+        for attempt in range(self.retry.max_attempts):
+            await self.acquire(tokens if attempt == 0 else 0)
+            try:
+                return await request()
+            except Exception as e:
+                delay = self._backoff(e, attempt)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+
+    def call_sync(self, request: Callable[[], T], tokens: int = 0) -> T:
+        for attempt in range(self.retry.max_attempts):
+            self.acquire_sync(tokens if attempt == 0 else 0)
+            try:
+                return request()
+            except Exception as e:
+                delay = self._backoff(e, attempt)
+                if delay is None:
+                    raise
+            time.sleep(delay)
+
+    async def stream(self, start: Callable[[], AsyncIterator[T]], tokens: int = 0) -> AsyncIterator[T]:
+        """
+        Iterate a streamed response within the limits.
+
+        A stream is only retried if it fails before its first chunk; once chunks
+        have been passed on, retrying would repeat them, so later errors are raised.
+        """
+        for attempt in range(self.retry.max_attempts):
+            await self.acquire(tokens if attempt == 0 else 0)
+            started = False
+            stream = None
+            try:
+                stream = start()
+                async for chunk in stream:
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                delay = None if started else self._backoff(e, attempt)
+                if delay is None:
+                    raise
+            finally:
+                # A caller that stops iterating early closes the response, ending the request
+                if hasattr(stream, "aclose"):
+                    await stream.aclose()
+            await asyncio.sleep(delay)
+
+    def stream_sync(self, start: Callable[[], Iterator[T]], tokens: int = 0) -> Iterator[T]:
+        for attempt in range(self.retry.max_attempts):
+            self.acquire_sync(tokens if attempt == 0 else 0)
+            started = False
+            stream = None
+            try:
+                stream = start()
+                for chunk in stream:
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                delay = None if started else self._backoff(e, attempt)
+                if delay is None:
+                    raise
+            finally:
+                if hasattr(stream, "close"):
+                    stream.close()
+            time.sleep(delay)
+
+    def wrap(self, function: Callable[..., T]) -> Callable[..., T]:
+        """Wrap a synchronous client call, e.g. TavilyClient.search, in call_sync."""
+        def limited(*args, **kwargs):
+            return self.call_sync(lambda: function(*args, **kwargs))
+        return limited
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests_per_second": self.requests_per_second,
+            "tokens_per_minute": self.tokens_per_minute,
+            "calls": self.calls,
+            "waits": self.waits,
+            "wait_seconds": round(self.wait_seconds, 3),
+            "tokens_used": self.tokens_used,
+            "throttled": self.throttled,
+            "retries": self.retries,
+            "failures": self.failures,
+        }
+
+
+# Process-wide limiters keyed by "<kind>:<endpoint>/<deployment>"
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def _env_float(name: str) -> Optional[float]:
+    value = os.getenv(name)
+    return float(value) if value and float(value) > 0 else None
+
+
+def get_rate_limiter(kind: str, endpoint: Optional[str] = None, deployment: Optional[str] = None) -> RateLimiter:
+    """
+    The shared limiter for one endpoint and deployment.
+
+    Limits come from <KIND>_RATE_LIMIT_RPS and <KIND>_RATE_LIMIT_TPM (e.g.
+    LLM_RATE_LIMIT_TPM); an unset limit is not enforced, but failed calls are
+    still retried as set by the RETRY_* variables.
+    """
+    name = f"{kind}:{endpoint or 'default'}"
+    if deployment:
+        name += f"/{deployment}"
+    with _limiters_lock:
+        if name not in _limiters:
+            prefix = kind.upper()
+            _limiters[name] = RateLimiter(
+                name,
+                requests_per_second=_env_float(f"{prefix}_RATE_LIMIT_RPS"),
+                tokens_per_minute=_env_float(f"{prefix}_RATE_LIMIT_TPM"),
+                retry=RetryPolicy.from_env(),
+            )
+        return _limiters[name]
+
+
+def rate_limit_stats() -> Dict[str, Dict[str, Any]]:
+    with _limiters_lock:
+        return {name: limiter.stats() for name, limiter in _limiters.items()}
@@ -0,0 +1,179 @@
+import asyncio
+import contextvars
+import os
+import time
+import weakref
+from typing import Any, Dict, Optional
+
+import httpx
+from tavily import AsyncTavilyClient
+
+from caching import TieredCache, search_cache_key
+from cassette import Cassette
+from rate_limit import RateLimiter, get_rate_limiter, parse_retry_after
+
+# Retry-After of the last throttled response in the current task; Tavily's 429 error does not carry it
+_retry_after: contextvars.ContextVar = contextvars.ContextVar("search_retry_after", default=None)
+
+
+class SearchClient:
+    """
+    Tavily search client backed by one bounded, keep-alive HTTP connection pool.
+
+    Create one instance per process (the FastAPI app does this in its lifespan)
+    and share it between every research run, so searches reuse warm TLS
+    connections instead of paying a new handshake on each loop. When a cache is
+    given, repeated searches are answered from it without touching the pool.
+    Concurrent searches for the same query and parameters share one request.
+    Searches go through the process-wide search rate limiter, which spaces them
+    out and retries throttled or failed requests.
+    """
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 30.0,
+        api_base_url: Optional[str] = None,
+        cache: Optional[TieredCache] = None,
+        limiter: Optional[RateLimiter] = None,
+        cassette: Optional[Cassette] = None,
+    ):
+        self.cache = cache
+        self.max_connections = max_connections
+        self._semaphore = asyncio.Semaphore(max_connections)
+        self._http = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            event_hooks={"response": [self._track_connection, self._track_retry_after]},
+        )
+        api_base_url = api_base_url or os.getenv("TAVILY_API_BASE_URL")
+        self._tavily = AsyncTavilyClient(
+            api_key=api_key or os.getenv("TAVILY_API_KEY"),
+            api_base_url=api_base_url,
+            client=self._http,
+        )
+        self.limiter = limiter or get_rate_limiter("search", api_base_url or "tavily")
+        # Searches can be recorded to, or replayed from, a cassette instead of going to Tavily
+        self._tavily_search = cassette.wrap_search(self._tavily.search) if cassette is not None else self._tavily.search
+        # Network streams we have already seen, used to tell new connections from reused ones
+        self._seen_streams = weakref.WeakSet()
+        # Requests in flight by cache key, and how many searches are waiting on each
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[str, int] = {}
+
+        # Pool statistics
+        self.requests = 0
+        self.in_use = 0
+        self.max_in_use = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.new_connections = 0
+        self.reused_connections = 0
+        self.errors = 0
+        self.shared = 0
+
+    @classmethod
+    def from_env(cls, cache: Optional[TieredCache] = None, cassette: Optional[Cassette] = None) -> "SearchClient":
+        """Build a client sized from the SEARCH_POOL_* environment variables."""
+        return cls(
+            cache=cache,
+            cassette=cassette,
+            max_connections=int(os.getenv("SEARCH_POOL_MAX_CONNECTIONS", "20")),
+            max_keepalive_connections=int(os.getenv("SEARCH_POOL_MAX_KEEPALIVE", "10")),
+            keepalive_expiry=float(os.getenv("SEARCH_POOL_KEEPALIVE_EXPIRY", "30")),
+        )
+
+    async def _track_connection(self, response: httpx.Response):
+        stream = response.extensions.get("network_stream")
+        if stream is None:
+            return
+        if stream in self._seen_streams:
+            self.reused_connections += 1
+        else:
+            self._seen_streams.add(stream)
+            self.new_connections += 1
+
+    async def _track_retry_after(self, response: httpx.Response):
+        if response.status_code == 429:
+            _retry_after.set(parse_retry_after(response.headers))
+
+    async def search(self, query: str, **kwargs) -> Dict[str, Any]:
+        """Run a Tavily search, waiting for a free pool slot if all are in use."""
+        key = search_cache_key(query, **kwargs)
+        if self.cache is not None:
+            results = await self.cache.aget(key)
+            if results is not None:
+                return results
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._search_and_store(key, query, **kwargs))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.shared += 1
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            # Shielded so one cancelled caller does not cancel the request for the others
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiters[key] == 1:
+                task.cancel()
+            raise
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+
+    async def _search_and_store(self, key: str, query: str, **kwargs) -> Dict[str, Any]:
+        results = await self._search(query, **kwargs)
+        if self.cache is not None:
+            await self.cache.aset(key, results)
+        return results
+
+    async def _search(self, query: str, **kwargs) -> Dict[str, Any]:
+        # Retries wait outside the pool so they do not hold a connection slot
+        return await self.limiter.call(lambda: self._request(query, **kwargs))
+
+    async def _request(self, query: str, **kwargs) -> Dict[str, Any]:
+        self.requests += 1
+        if self._semaphore.locked():
+            self.waits += 1
+        wait_start = time.monotonic()
+        async with self._semaphore:
+            self.wait_seconds += time.monotonic() - wait_start
+            self.in_use += 1
+            self.max_in_use = max(self.max_in_use, self.in_use)
+            _retry_after.set(None)
+            try:
+                return await self._tavily_search(query, **kwargs)
+            except Exception as e:
+                self.errors += 1
+                if _retry_after.get() is not None and getattr(e, "retry_after", None) is None:
+                    e.retry_after = _retry_after.get()
+                raise
+            finally:
+                self.in_use -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        connections = self.new_connections + self.reused_connections
+        return {
+            "max_connections": self.max_connections,
+            "requests": self.requests,
+            "in_use": self.in_use,
+            "max_in_use": self.max_in_use,
+            "waits": self.waits,
+            "wait_seconds": round(self.wait_seconds, 3),
+            "new_connections": self.new_connections,
+            "reused_connections": self.reused_connections,
+            "reuse_ratio": self.reused_connections / connections if connections else 0.0,
+            "errors": self.errors,
+            "shared_requests": self.shared,
+        }
+
+    async def aclose(self):
+        await self._http.aclose()
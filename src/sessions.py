@@ -0,0 +1,229 @@
+import asyncio
+import time
+from collections import Counter
+from dataclasses import field, dataclass
+from typing import Any, Dict, List, Optional
+
+from fastapi import WebSocket
+
+from outbound import OutboundQueue
+
+
+# State of one websocket client and the research run it is driving
+@dataclass(kw_only=True)
+class ResearchSession:
+    client_id: str
+    websocket: Optional[WebSocket] = field(default=None) # Open websocket, None while disconnected
+    outbound: Optional[OutboundQueue] = field(default=None) # Send queue drained into the websocket
+    images: List[str] = field(default_factory=list) # Images collected by the current run
+    sources: List[Any] = field(default_factory=list) # Sources collected by the current run
+    task: Optional[asyncio.Task] = field(default=None) # Background task running the graph
+    connected_at: float = field(default_factory=time.monotonic)
+    runs_started: int = field(default=0)
+    runs_completed: int = field(default=0)
+    run_started_at: Optional[float] = field(default=None)
+    llm_calls: int = field(default=0) # Model calls made by the current run
+    search_calls: int = field(default=0) # Searches made by the current run
+    expected_llm_calls: int = field(default=0) # Model calls a full run would make
+    expected_search_calls: int = field(default=0) # Searches a full run would make
+    stop_reason: Optional[str] = field(default=None) # Why the stopping policy ended the research loop
+    loops_saved: int = field(default=0) # Loops the stopping policy skipped
+    duplicate_sources: int = field(default=0) # Near-duplicate sources dropped by the current run
+    duplicate_tokens_saved: int = field(default=0) # Prompt tokens those sources would have used
+    busy_seconds: float = field(default=0.0) # Total wall-clock time spent in completed runs
+    run_complete: bool = field(default=False) # The current run has sent its report and is only saving its status
+
+    @property
+    def is_running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    async def send(self, message: dict):
+        """Queue a message for the client, silently dropping it while disconnected."""
+        if self.outbound is not None:
+            await self.outbound.put(message)
+
+    def start_run(self, expected_llm_calls: int = 0, expected_search_calls: int = 0):
+        """Reset the per-run collections and call counters before a new research run."""
+        self.images = []
+        self.sources = []
+        self.llm_calls = 0
+        self.search_calls = 0
+        self.expected_llm_calls = expected_llm_calls
+        self.expected_search_calls = expected_search_calls
+        self.stop_reason = None
+        self.loops_saved = 0
+        self.duplicate_sources = 0
+        self.duplicate_tokens_saved = 0
+        self.run_complete = False
+        self.runs_started += 1
+        self.run_started_at = time.monotonic()
+
+    def finish_run(self, completed: bool = True):
+        if completed:
+            self.busy_seconds += time.monotonic() - self.run_started_at
+            self.runs_completed += 1
+        self.run_started_at = None
+
+    def stats(self) -> Dict[str, Any]:
+        uptime = time.monotonic() - self.connected_at
+        return {
+            "connected": self.websocket is not None,
+            "running": self.is_running,
+            "runs_started": self.runs_started,
+            "runs_completed": self.runs_completed,
+            "avg_run_seconds": self.busy_seconds / self.runs_completed if self.runs_completed else None,
+            "stop_reason": self.stop_reason,
+            "duplicate_sources": self.duplicate_sources,
+            "duplicate_tokens_saved": self.duplicate_tokens_saved,
+            "runs_per_minute": self.runs_completed / uptime * 60 if uptime > 0 else 0.0,
+            "outbound": self.outbound.stats() if self.outbound is not None else None,
+        }
+
+
+class SessionRegistry:
+    """
+    Registry of research sessions keyed by client_id.
+
+    A session lives as long as its websocket is connected or its research run is
+    still in flight, so a client that reconnects with the same id picks up the
+    images and sources its run has collected so far.
+    """
+    def __init__(self, queue_size: int = 256, queue_policy: str = "drop"):
+        self.queue_size = queue_size
+        self.queue_policy = queue_policy
+        self._sessions: Dict[str, ResearchSession] = {}
+        self.started_at = time.monotonic()
+        self.runs_completed = 0
+        self.runs_cancelled = 0
+        self.saved_llm_calls = 0
+        self.saved_search_calls = 0
+        self.loops_saved = 0
+        self.stop_reasons: Counter = Counter()
+        self.duplicate_sources = 0
+        self.duplicate_tokens_saved = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, client_id: str):
+        return client_id in self._sessions
+
+    def __iter__(self):
+        return iter(list(self._sessions.values()))
+
+    def get(self, client_id: Optional[str]) -> Optional[ResearchSession]:
+        if client_id is None:
+            return None
+        return self._sessions.get(client_id)
+
+    async def connect(self, websocket: WebSocket, client_id: str) -> ResearchSession:
+        # Store the websocket but don't call accept() here
+        session = self._sessions.get(client_id)
+        if session is None:
+            session = ResearchSession(client_id=client_id)
+            self._sessions[client_id] = session
+        if session.outbound is not None:
+            await session.outbound.close()
+        session.websocket = websocket
+        session.outbound = OutboundQueue(websocket, max_size=self.queue_size, policy=self.queue_policy)
+        session.outbound.start()
+        return session
+
+    async def disconnect(self, client_id: str, websocket: Optional[WebSocket] = None):
+        """
+        Detach the websocket from its session. When websocket is given, nothing
+        happens unless it is still the session's websocket, so an old connection
+        closing after the client reconnected leaves the new one alone.
+        """
+        session = self._sessions.get(client_id)
+        if session is None or (websocket is not None and session.websocket is not websocket):
+            return
+        if session.outbound is not None:
+            await session.outbound.close()
+        session.websocket = None
+        session.outbound = None
+        if not session.is_running:
+            del self._sessions[client_id]
+
+    def finish_run(self, client_id: str, completed: bool = True):
+        """Record the end of a run and drop the session if its client has gone."""
+        session = self._sessions.get(client_id)
+        if session is None:
+            return
+        session.finish_run(completed)
+        if completed:
+            self.runs_completed += 1
+            self.loops_saved += session.loops_saved
+            if session.stop_reason:
+                self.stop_reasons[session.stop_reason] += 1
+        self.duplicate_sources += session.duplicate_sources
+        self.duplicate_tokens_saved += session.duplicate_tokens_saved
+        if session.websocket is None:
+            del self._sessions[client_id]
+
+    async def cancel_run(self, client_id: str, websocket: Optional[WebSocket] = None) -> bool:
+        """
+        Cancel the session's in-flight run and wait for it to unwind.
+
+        Cancellation propagates into the pending model and search calls. The
+        calls the run had not made yet are counted as saved. A run that has
+        already sent its report is left to finish instead. When websocket is
+        given, only a run of the session still attached to it is cancelled.
+        """
+        session = self._sessions.get(client_id)
+        if session is None or not session.is_running:
+            return False
+        if websocket is not None and session.websocket is not websocket:
+            return False
+        task = session.task
+        if session.run_complete:
+            # Only its final bookkeeping is left; let that finish before a new run resets the session
+            try:
+                await asyncio.shield(task)
+            except Exception:
+                pass
+            return False
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            pass
+        self.runs_cancelled += 1
+        self.saved_llm_calls += max(session.expected_llm_calls - session.llm_calls, 0)
+        self.saved_search_calls += max(session.expected_search_calls - session.search_calls, 0)
+        return True
+
+    async def send(self, client_id: Optional[str], message: dict):
+        session = self.get(client_id)
+        if session is not None:
+            await session.send(message)
+
+    def stats(self) -> Dict[str, Any]:
+        uptime = time.monotonic() - self.started_at
+        queues = [s.outbound for s in self._sessions.values() if s.outbound is not None]
+        return {
+            "active_sessions": len(self._sessions),
+            "queued_messages": sum(len(queue) for queue in queues),
+            "max_queue_depth": max((queue.max_depth for queue in queues), default=0),
+            "dropped_messages": sum(queue.dropped for queue in queues),
+            "connected_sessions": sum(1 for s in self._sessions.values() if s.websocket is not None),
+            "running_sessions": sum(1 for s in self._sessions.values() if s.is_running),
+            "runs_completed": self.runs_completed,
+            "runs_cancelled": self.runs_cancelled,
+            "saved_llm_calls": self.saved_llm_calls,
+            "saved_search_calls": self.saved_search_calls,
+            "loops_saved": self.loops_saved,
+            "stop_reasons": dict(self.stop_reasons),
+            "duplicate_sources": self.duplicate_sources,
+            "duplicate_tokens_saved": self.duplicate_tokens_saved,
+            "runs_per_minute": self.runs_completed / uptime * 60 if uptime > 0 else 0.0,
+        }
+
+    def session_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Per-session detail keyed by client_id. A client_id is enough to take over
+        its session by reconnecting, so this is only served to admins.
+        """
+        return {client_id: s.stats() for client_id, s in self._sessions.items()}
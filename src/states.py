@@ -7,11 +7,18 @@ from typing_extensions import Annotated
 class SummaryState:
     research_topic: str = field(default=None) # Report topic     
     search_query: str = field(default=None) # Search query
+    search_queries: list = field(default_factory=list) # Search queries run in parallel by the next web research step
     rationale: str = field(default=None) # rationale for the search query
     web_research_results: Annotated[list, operator.add] = field(default_factory=list) 
     sources_gathered: Annotated[list, operator.add] = field(default_factory=list) 
     research_loop_count: int = field(default=0) # Research loop count
+    queries_tried: Annotated[list, operator.add] = field(default_factory=list) # Queries already searched
+    source_urls: Annotated[list, operator.add] = field(default_factory=list) # URLs already gathered
+    new_source_share: float = field(default=1.0) # Share of new URLs in the last search
+    images: Annotated[list, operator.add] = field(default_factory=list) # Image URLs returned by the searches
+    fingerprints: Annotated[list, operator.add] = field(default_factory=list) # SimHash fingerprints of the sources already summarized
     running_summary: str = field(default=None) # Final report
+    previous_summary: str = field(default=None) # Running summary before the last update
     knowledge_gap: str = field(default=None) # Knowledge gap
     websocket_id: str = field(default=None) # Websocket ID
     thoughts: str = field(default=None) # model thoughts
@@ -0,0 +1,125 @@
+import re
+from dataclasses import dataclass
+from typing import Iterable, Optional, Sequence
+
+from caching import normalize_query
+from fingerprints import shingles
+
+# Reflections that report nothing left to research; the whole answer has to be one of these phrases,
+# so a real gap that merely starts with "None of ..." or "No data on gaps ..." still counts
+_NO_GAP = re.compile(
+    r"^\s*(none|n/?a|no (remaining |further |known |specific )?(knowledge )?gaps?( remain(ing)?| identified| found)?)\s*[.!]?\s*$",
+    re.IGNORECASE,
+)
+
+
+def summary_change(previous: Optional[str], current: Optional[str], size: int = 3) -> float:
+    """One minus the Jaccard similarity of the two summaries' shingles; 1.0 when there is no previous summary."""
+    if not previous:
+        return 1.0
+    before, after = shingles(previous, size), shingles(current, size)
+    union = before | after
+    if not union:
+        return 0.0
+    return 1.0 - len(before & after) / len(union)
+
+
+def new_source_share(urls: Sequence[str], seen_urls: Iterable[str]) -> float:
+    """Share of the URLs that have not been seen in earlier loops."""
+    if not urls:
+        return 0.0
+    seen = set(seen_urls)
+    return sum(1 for url in urls if url not in seen) / len(urls)
+
+
+def is_repeated_query(queries: Sequence[str], queries_tried: Iterable[str]) -> bool:
+    """True when every query has already been searched, ignoring case and punctuation."""
+    tried = {normalize_query(query) for query in queries_tried if query}
+    queries = [normalize_query(query) for query in queries if query]
+    return bool(queries) and all(query in tried for query in queries)
+
+
+def has_knowledge_gap(knowledge_gap: Optional[str]) -> bool:
+    """An unknown gap (None) counts as a gap; an empty one or "none" does not."""
+    if knowledge_gap is None:
+        return True
+    knowledge_gap = knowledge_gap.strip()
+    return bool(knowledge_gap) and not _NO_GAP.fullmatch(knowledge_gap)
+
+
+@dataclass
+class LoopSignals:
+    summary_change: float = 1.0 # How much the running summary changed in the last loop
+    new_source_share: float = 1.0 # Share of new URLs in the last search
+    repeated_query: bool = False # The next query was already searched
+    knowledge_gap: bool = True # The reflection still reports a knowledge gap
+
+    @classmethod
+    def from_state(cls, state) -> "LoopSignals":
+        """Read the signals from a SummaryState after the reflection step."""
+        queries = getattr(state, "search_queries", None) or [state.search_query]
+        return cls(
+            summary_change=summary_change(getattr(state, "previous_summary", None), state.running_summary),
+            new_source_share=getattr(state, "new_source_share", 1.0),
+            repeated_query=is_repeated_query(queries, getattr(state, "queries_tried", [])),
+            knowledge_gap=has_knowledge_gap(state.knowledge_gap),
+        )
+
+    def as_dict(self):
+        return {
+            "summary_change": round(self.summary_change, 3),
+            "new_source_share": round(self.new_source_share, 3),
+            "repeated_query": self.repeated_query,
+            "knowledge_gap": self.knowledge_gap,
+        }
+
+
+@dataclass
+class StoppingPolicy:
+    """
+    Decide after each reflection whether another research loop is worth its cost.
+
+    The loop always runs at least min_loops times and at most max_loops times.
+    In between it stops as soon as the reflection finds no knowledge gap, the
+    follow-up query repeats an earlier one, the summary barely changed, or the
+    search returned mostly URLs that were already seen.
+    """
+    min_loops: int = 1
+    max_loops: int = 4
+    min_summary_change: float = 0.1
+    min_new_source_share: float = 0.2
+    stop_on_repeated_query: bool = True
+    stop_on_no_knowledge_gap: bool = True
+
+    @classmethod
+    def from_configuration(cls, configuration) -> "StoppingPolicy":
+        max_loops = configuration.max_web_research_loops
+        if configuration.stopping_policy == "fixed":
+            return cls(min_loops=max_loops, max_loops=max_loops)
+        if configuration.stopping_policy != "adaptive":
+            raise ValueError(f"Unknown stopping policy: {configuration.stopping_policy!r}")
+        return cls(
+            min_loops=min(configuration.min_web_research_loops, max_loops),
+            max_loops=max_loops,
+            min_summary_change=configuration.min_summary_change,
+            min_new_source_share=configuration.min_new_source_share,
+        )
+
+    def stop_reason(self, loop_count: int, signals: LoopSignals) -> Optional[str]:
+        """Return why the research should stop after loop_count loops, or None to continue."""
+        if loop_count >= self.max_loops:
+            return "max_loops"
+        if loop_count < self.min_loops:
+            return None
+        if self.stop_on_no_knowledge_gap and not signals.knowledge_gap:
+            return "no_knowledge_gap"
+        if self.stop_on_repeated_query and signals.repeated_query:
+            return "repeated_query"
+        if signals.summary_change < self.min_summary_change:
+            return "summary_converged"
+        if signals.new_source_share < self.min_new_source_share:
+            return "no_new_sources"
+        return None
+
+    def loops_saved(self, loop_count: int) -> int:
+        return max(self.max_loops - loop_count, 0)
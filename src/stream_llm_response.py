@@ -1,56 +1,131 @@
+import os
+import sys
+import time
+from collections import deque
+
+from rich.console import Console, Group
 from rich.panel import Panel
 from rich.markdown import Markdown
 from rich.live import Live
 
-def stream_thinking_and_answer(stream_generator, title="🧠 AI Thinking Process (Live)"):
+from think_parser import ThinkTagParser, strip_thinking_tokens
+
+class IncrementalMarkdown:
+    """
+    Markdown renderable for text that only ever grows at the end.
+
+    Finished paragraphs are parsed once and kept; only the unfinished tail is
+    re-parsed when the display refreshes. At most `max_blocks` finished
+    paragraphs are shown, since a live terminal region cannot show more.
+    """
+    def __init__(self, max_blocks: int = 20):
+        self.blocks = deque(maxlen=max_blocks)
+        self.tail = ""
+
+    def append(self, text: str):
+        # Only look for paragraph breaks in the new text (and the character before it)
+        start = max(len(self.tail) - 1, 0)
+        self.tail += text
+        while True:
+            index = self.tail.find("\n\n", start)
+            if index == -1:
+                break
+            block = self.tail[:index]
+            # Never split inside an open code fence
+            if block.count("```") % 2:
+                start = index + 2
+                continue
+            if block.strip():
+                self.blocks.append(Markdown(block))
+            self.tail = self.tail[index + 2:]
+            start = 0
+
+    def renderable(self):
+        return Group(*self.blocks, Markdown(self.tail))
+
+
+def stream_thinking_and_answer(stream_generator, title="🧠 AI Thinking Process (Live)", mode=None, refresh_per_second=4):
     """
     Stream the AI's thinking and answer in real-time, separating them visually.
+
+    mode is "live" (rich panel refreshed refresh_per_second times a second),
+    "plain" (raw thoughts written to stdout, for non-TTY or batch runs) or
+    "auto", which picks live only when stdout is a terminal. It defaults to
+    the STREAM_RENDER_MODE environment variable, then "auto".
     """
+    mode = mode or os.getenv("STREAM_RENDER_MODE", "auto")
+    if mode == "auto":
+        mode = "live" if Console().is_terminal else "plain"
+
     # Containers for accumulating thoughts and answer
-    accumulated_thoughts = ""
-    accumulated_answer = ""
-    in_thinking_section = False
-    
+    thoughts = []
+    answer = []
+    parser = ThinkTagParser()
+
+    if mode == "plain":
+        for chunk in stream_generator:
+            content = chunk.content if hasattr(chunk, 'content') else chunk
+            if not content:
+                continue
+            for is_thinking, text in parser.feed(content):
+                if is_thinking:
+                    thoughts.append(text)
+                    sys.stdout.write(text)
+                    sys.stdout.flush()
+                else:
+                    answer.append(text)
+        for is_thinking, text in parser.close():
+            (thoughts if is_thinking else answer).append(text)
+        if thoughts:
+            sys.stdout.write("\n")
+        return "".join(thoughts), "".join(answer)
+
+    markdown = IncrementalMarkdown()
     thinking_panel = Panel(
-        Markdown(""),
+        markdown.renderable(),
         title=title,
         title_align="left",
         border_style="cyan",
         padding=(1, 2),
         expand=False
     )
+    interval = 1 / refresh_per_second
     
-    with Live(thinking_panel, refresh_per_second=4) as live:
+    with Live(thinking_panel, refresh_per_second=refresh_per_second, auto_refresh=False) as live:
+        last_refresh = 0.0
+        changed = False
+        
+        def add(segments):
+            nonlocal changed
+            for is_thinking, text in segments:
+                # Add content to the appropriate section
+                if is_thinking:
+                    thoughts.append(text)
+                    markdown.append(text)
+                    changed = True
+                else:
+                    answer.append(text)
+
         for chunk in stream_generator:
             content = chunk.content if hasattr(chunk, 'content') else chunk
             if not content:
                 continue
             
-            # Check for thinking tags
-            if "<think>" in content:
-                in_thinking_section = True
-                content = content.replace("<think>", "")
-            if "</think>" in content:
-                in_thinking_section = False
-                content = content.replace("</think>", "")
-                accumulated_thoughts += content
-                
-                # Update the live display with the latest thoughts
-                thinking_panel.renderable = Markdown(accumulated_thoughts)
-                live.update(thinking_panel)
-                continue
+            # Split the chunk on thinking tags, even when a tag spans several chunks
+            add(parser.feed(content))
             
-            # Add content to the appropriate section
-            if in_thinking_section:
-                accumulated_thoughts += content
-                
-                # Update the live display with the latest thoughts
-                thinking_panel.renderable = Markdown(accumulated_thoughts)
-                live.update(thinking_panel)
-            else:
-                accumulated_answer += content
+            # Re-render the latest thoughts at most refresh_per_second times a second
+            now = time.monotonic()
+            if changed and now - last_refresh >= interval:
+                thinking_panel.renderable = markdown.renderable()
+                live.update(thinking_panel, refresh=True)
+                last_refresh = now
+                changed = False
+        add(parser.close())
+        thinking_panel.renderable = markdown.renderable()
+        live.update(thinking_panel, refresh=True)
     
-    return accumulated_thoughts, accumulated_answer
+    return "".join(thoughts), "".join(answer)
 
 def display_panel(console, content, title, style="green"):
     """Display content in a styled panel."""
@@ -62,18 +137,3 @@ def display_panel(console, content, title, style="green"):
         padding=(1, 2),
         expand=False
     ))
-
-# Helper function to strip thinking tokens
-def strip_thinking_tokens(text: str):
-    """
-    Extract the content between <think> and </think> tags and remove them from the text.
-    """
-    thoughts = ""
-    while "<think>" in text and "</think>" in text:
-        start = text.find("<think>")
-        end = text.find("</think>")
-        # Extract the content between tags (excluding the tags themselves)
-        thoughts += text[start + len("<think>"):end].strip() + "\n\n"
-        # Remove the tags and their content from the original text
-        text = text[:start] + text[end + len("</think>"):]
-    return thoughts.strip(), text.strip()
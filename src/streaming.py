@@ -0,0 +1,40 @@
+import time
+from typing import Awaitable, Callable
+
+
+class DeltaCoalescer:
+    """
+    Batch small streamed text deltas into fewer websocket messages.
+
+    Deltas are buffered and sent as one message once `interval` seconds have
+    passed since the last send or `max_chars` characters are waiting, whichever
+    comes first. Call flush() when the stream ends to send the remainder.
+    """
+    def __init__(self, send: Callable[[dict], Awaitable[None]], message_type: str, data: dict = None,
+                 interval: float = 0.05, max_chars: int = 200):
+        self.send = send
+        self.message_type = message_type
+        self.data = data or {}
+        self.interval = interval
+        self.max_chars = max_chars
+        self._buffer = []
+        self._buffered_chars = 0
+        # The first delta goes out immediately so the UI shows output as soon as the model does
+        self._last_sent = 0.0
+
+    async def add(self, text: str):
+        if not text:
+            return
+        self._buffer.append(text)
+        self._buffered_chars += len(text)
+        if self._buffered_chars >= self.max_chars or time.monotonic() - self._last_sent >= self.interval:
+            await self.flush()
+
+    async def flush(self):
+        if not self._buffer:
+            return
+        delta = "".join(self._buffer)
+        self._buffer = []
+        self._buffered_chars = 0
+        self._last_sent = time.monotonic()
+        await self.send({"type": self.message_type, "data": {**self.data, "delta": delta}})
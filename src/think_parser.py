@@ -0,0 +1,69 @@
+from typing import List, Tuple
+
+OPEN_TAG = "<think>"
+CLOSE_TAG = "</think>"
+
+
+class ThinkTagParser:
+    """
+    Incrementally split a streamed completion into thinking and answer text.
+
+    Feed chunks as they arrive; each call returns (is_thinking, text) segments.
+    Tags split across chunk boundaries are handled by holding back the few
+    characters that could be the start of a tag until the next chunk, so the
+    whole stream is processed in O(total length).
+    """
+    def __init__(self):
+        self.in_thinking = False
+        self._pending = ""
+
+    def feed(self, chunk: str) -> List[Tuple[bool, str]]:
+        text = self._pending + chunk if self._pending else chunk
+        self._pending = ""
+        segments = []
+        pos = 0
+        while True:
+            tag = CLOSE_TAG if self.in_thinking else OPEN_TAG
+            index = text.find(tag, pos)
+            if index == -1:
+                break
+            # Every closed thinking block yields a segment, even an empty one, so callers can count blocks
+            if index > pos or self.in_thinking:
+                segments.append((self.in_thinking, text[pos:index]))
+            self.in_thinking = not self.in_thinking
+            pos = index + len(tag)
+
+        # Hold back a suffix that could be the beginning of the next tag. Tags contain a
+        # single "<", so such a suffix can only start at the last "<" of the text
+        end = len(text)
+        tag = CLOSE_TAG if self.in_thinking else OPEN_TAG
+        start = text.rfind("<", max(pos, end - len(tag) + 1))
+        if start != -1 and tag.startswith(text[start:]):
+            end = start
+            self._pending = text[start:]
+        if end > pos:
+            segments.append((self.in_thinking, text[pos:end]))
+        return segments
+
+    def close(self) -> List[Tuple[bool, str]]:
+        """Flush any held-back text at the end of the stream."""
+        pending, self._pending = self._pending, ""
+        return [(self.in_thinking, pending)] if pending else []
+
+
+# Helper function to strip thinking tokens
+def strip_thinking_tokens(text: str):
+    """
+    Extract the content between <think> and </think> tags and remove them from the text.
+    """
+    if OPEN_TAG not in text or CLOSE_TAG not in text:
+        return "", text.strip()
+    parser = ThinkTagParser()
+    thoughts = []
+    answer = []
+    for is_thinking, part in parser.feed(text) + parser.close():
+        if is_thinking:
+            thoughts.append(part.strip())
+        else:
+            answer.append(part)
+    return "\n\n".join(thoughts).strip(), "".join(answer).strip()
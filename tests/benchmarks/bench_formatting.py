@@ -0,0 +1,161 @@
+"""
+Microbenchmarks for source formatting and thinking-token stripping.
+
+Compares deduplicate_and_format_sources and the final report assembly with
+the previous implementations that grew the output with repeated +=, at
+realistic sizes (a few sources of a few thousand characters) and extreme ones
+(hundreds of full pages). Before timing, every case checks that the new
+output is byte-identical to the old. Also times format_sources and
+strip_thinking_tokens at the same sizes.
+
+Run from the repository root:
+    python tests/benchmarks/bench_formatting.py
+"""
+import contextlib
+import io
+import random
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "src"))
+
+from formatting import deduplicate_and_format_sources, format_final_summary, format_sources
+from think_parser import strip_thinking_tokens
+
+WORDS = "research model latency benchmark memory cache query source summary network result analysis".split()
+
+
+def legacy_deduplicate_and_format_sources(search_response, max_tokens_per_source, fetch_full_page=False):
+    # The implementation deduplicate_and_format_sources replaced (without passage selection), kept for comparison
+    if isinstance(search_response, dict):
+        sources_list = search_response['results']
+    elif isinstance(search_response, list):
+        sources_list = []
+        for response in search_response:
+            if isinstance(response, dict) and 'results' in response:
+                sources_list.extend(response['results'])
+            else:
+                sources_list.extend(response)
+    else:
+        raise ValueError("Input must be either a dict with 'results' or a list of search results")
+
+    unique_sources = {}
+    for source in sources_list:
+        if source['url'] not in unique_sources:
+            unique_sources[source['url']] = source
+
+    formatted_text = "Sources:\n\n"
+    for i, source in enumerate(unique_sources.values(), 1):
+        formatted_text += f"Source: {source['title']}\n===\n"
+        formatted_text += f"URL: {source['url']}\n===\n"
+        formatted_text += f"Most relevant content from source: {source['content']}\n===\n"
+        if fetch_full_page:
+            char_limit = max_tokens_per_source * 4
+            raw_content = source.get('raw_content', '')
+            if raw_content is None:
+                raw_content = ''
+                print(f"Warning: No raw_content found for source {source['url']}")
+            if len(raw_content) > char_limit:
+                raw_content = raw_content[:char_limit] + "... [truncated]"
+            formatted_text += f"Full source content limited to {max_tokens_per_source} tokens: {raw_content}\n\n"
+
+    return formatted_text.strip()
+
+
+def legacy_format_final_summary(running_summary, sources_gathered, header=""):
+    # The += loop finalize_summary used before format_final_summary
+    final_summary = f"{header}## Summary\n{running_summary}\n\n### Sources:\n"
+    for source in sources_gathered:
+        final_summary += f"{source}\n"
+    return final_summary
+
+
+def text(rng: random.Random, size: int) -> str:
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)[:size]
+
+
+def make_response(sources: int, content_size: int, page_size: int, duplicates: float = 0.2, seed: int = 0):
+    rng = random.Random(seed)
+    results = []
+    for i in range(sources):
+        url = f"https://example.com/{rng.randrange(int(sources * (1 - duplicates)) + 1) if duplicates else i}"
+        results.append({
+            "title": f"Title {i}",
+            "url": url,
+            "content": text(rng, content_size),
+            "raw_content": text(rng, page_size) if page_size else None,
+        })
+    return {"results": results}
+
+
+def edge_cases():
+    """Inputs that exercise every branch, including trailing whitespace the final strip removes."""
+    base = make_response(6, 200, 3000, seed=1)["results"]
+    yield {"results": []}, 1000, False
+    yield {"results": []}, 1000, True
+    yield {"results": base}, 1000, False
+    yield {"results": base}, 100, True
+    yield [{"results": base[:3]}, base[3:]], 500, True
+    yield {"results": [dict(base[0], raw_content=None), dict(base[1], url="u2"), dict(base[2], url="u3", raw_content="  \n")]}, 10, True
+    yield {"results": [dict(base[0], content="ends with space  \n")]}, 10, False
+    yield {"results": [dict(base[0], raw_content="short page \n\n")]}, 1000, True
+
+
+def check_identical():
+    silent = io.StringIO()
+    with contextlib.redirect_stdout(silent):
+        for response, max_tokens, full_page in edge_cases():
+            assert deduplicate_and_format_sources(response, max_tokens, full_page) == \
+                legacy_deduplicate_and_format_sources(response, max_tokens, full_page), (max_tokens, full_page)
+    for sources in ([], ["* a : b"], [f"* Title {i} : https://example.com/{i}" for i in range(50)]):
+        for header in ("", "<div>images</div>\n"):
+            assert format_final_summary("A summary.", sources, header) == legacy_format_final_summary("A summary.", sources, header)
+
+
+def bench(label, func, number=5):
+    seconds = min(timeit.repeat(func, number=1, repeat=number))
+    print(f"  {label:<48} {seconds * 1000:10.3f} ms")
+
+
+def main():
+    check_identical()
+    print("Outputs are byte-identical to the legacy implementations\n")
+
+    cases = (
+        ("realistic: 5 sources, 4 KB pages", 5, 1000, 4_000, 1000),
+        ("large: 40 sources, 50 KB pages", 40, 2000, 50_000, 2000),
+        ("extreme: 400 sources, 200 KB pages", 400, 2000, 200_000, 20_000),
+    )
+    for label, sources, content_size, page_size, max_tokens in cases:
+        response = make_response(sources, content_size, page_size)
+        assert deduplicate_and_format_sources(response, max_tokens, True) == \
+            legacy_deduplicate_and_format_sources(response, max_tokens, True)
+        print(label)
+        bench("legacy deduplicate_and_format_sources", lambda: legacy_deduplicate_and_format_sources(response, max_tokens, True))
+        bench("deduplicate_and_format_sources", lambda: deduplicate_and_format_sources(response, max_tokens, True))
+        bench("legacy, snippets only", lambda: legacy_deduplicate_and_format_sources(response, max_tokens, False))
+        bench("deduplicate_and_format_sources, snippets only", lambda: deduplicate_and_format_sources(response, max_tokens, False))
+        if sources <= 40:
+            # Passage selection ranks every long page with BM25, which dominates at this point
+            bench("with BM25 passage selection", lambda: deduplicate_and_format_sources(response, max_tokens, True, query="research latency"))
+        bench("format_sources", lambda: format_sources(response))
+
+        gathered = [f"* {source['title']} : {source['url']}" for source in response["results"]] * 10
+        summary = text(random.Random(2), page_size)
+        bench(f"legacy final report ({len(gathered)} sources)", lambda: legacy_format_final_summary(summary, gathered))
+        bench("format_final_summary", lambda: format_final_summary(summary, gathered))
+
+        completion = f"<think>{text(random.Random(3), page_size)}</think>{text(random.Random(4), page_size // 4)}"
+        bench(f"strip_thinking_tokens ({len(completion) // 1024} KB)", lambda: strip_thinking_tokens(completion))
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Microbenchmark for the <think> tag parser on multi-megabyte completions.
+
+Compares the previous find-and-slice strip_thinking_tokens with the linear
+ThinkTagParser, both on a complete text and when the text is streamed in
+small chunks the way the model delivers it.
+
+Run from the repository root:
+    python tests/benchmarks/bench_think_parser.py
+"""
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "src"))
+
+from think_parser import ThinkTagParser, strip_thinking_tokens
+
+
+def legacy_strip_thinking_tokens(text: str):
+    # The implementation strip_thinking_tokens replaced, kept for comparison
+    thoughts = ""
+    while "<think>" in text and "</think>" in text:
+        start = text.find("<think>")
+        end = text.find("</think>")
+        thoughts += text[start + len("<think>"):end].strip() + "\n\n"
+        text = text[:start] + text[end + len("</think>"):]
+    return thoughts.strip(), text.strip()
+
+
+def make_completion(size: int, blocks: int) -> str:
+    # Reasoning blocks interleaved with answer text, `size` characters in total
+    block = "Let me reason about this step by step. " * (size // (blocks * 2 * 40) + 1)
+    answer = "Here is part of the answer with details. " * (size // (blocks * 2 * 41) + 1)
+    return "".join(f"<think>{block}</think>{answer}" for _ in range(blocks))
+
+
+def stream_chunks(text: str, chunk_size: int):
+    parser = ThinkTagParser()
+    thoughts = answer = 0
+    for start in range(0, len(text), chunk_size):
+        for is_thinking, part in parser.feed(text[start:start + chunk_size]):
+            if is_thinking:
+                thoughts += len(part)
+            else:
+                answer += len(part)
+    parser.close()
+    return thoughts, answer
+
+
+def bench(label, func, number=3):
+    seconds = min(timeit.repeat(func, number=1, repeat=number))
+    print(f"  {label:<40} {seconds * 1000:10.2f} ms")
+
+
+def main():
+    for size_mb, blocks in ((1, 50), (4, 200), (8, 1000)):
+        text = make_completion(size_mb * 1024 * 1024, blocks)
+        assert strip_thinking_tokens(text) == legacy_strip_thinking_tokens(text)
+        print(f"{len(text) / 1024 / 1024:.1f} MB, {blocks} thinking blocks")
+        bench("legacy strip_thinking_tokens", lambda: legacy_strip_thinking_tokens(text))
+        bench("strip_thinking_tokens", lambda: strip_thinking_tokens(text))
+        bench("ThinkTagParser, 16 char chunks", lambda: stream_chunks(text, 16))
+        bench("ThinkTagParser, 256 char chunks", lambda: stream_chunks(text, 256))
+
+
+if __name__ == "__main__":
+    main()
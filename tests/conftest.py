@@ -0,0 +1,21 @@
+import contextlib
+import importlib
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+SRC = Path(__file__).resolve().parents[1] / "src"
+sys.path.insert(0, str(SRC))
+
+
+@pytest.fixture(scope="session")
+def main():
+    """The app module, for tests of its graph nodes and helpers; no model or search calls are made."""
+    # The app builds its model client on import and mounts its static files relative to src
+    for name, value in {"AZURE_INFERENCE_ENDPOINT": "http://127.0.0.1:1/openai/v1", "AZURE_DEEPSEEK_DEPLOYMENT": "test",
+                        "AZURE_AI_API_KEY": "test", "TAVILY_API_KEY": "test"}.items():
+        os.environ.setdefault(name, value)
+    with contextlib.chdir(SRC):
+        return importlib.import_module("app.main")
@@ -0,0 +1,276 @@
+"""
+Load test for the research websocket, run against local fake model and search servers.
+
+Starts the fake chat-completions server, the fake Tavily server and the app
+(unless --url points at an app that is already running), then drives
+--clients concurrent websocket clients through /ws/{client_id}, each running
+--runs research runs one after the other.
+
+Reports p50/p95/p99 latency of each stage as the client sees it (time to the
+first thinking delta, then the time between consecutive stage messages),
+end-to-end run latency, runs per minute and the app's resident memory per
+concurrent session.
+
+Run from the repository root:
+    python tests/load/bench_websocket.py --clients 20 --runs 3 --ttft 0.5 --tokens-per-second 60
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+import websockets
+
+ROOT = Path(__file__).resolve().parents[2]
+LOAD_DIR = Path(__file__).resolve().parent
+
+# Websocket messages that mark the end of a stage. Each is sent by the node itself and then
+# repeated by the graph runner, so only the first of two in a row counts.
+STAGES = {
+    "generate_query": "generate_query",
+    "web_research": "web_research",
+    "summarize": "summarize_sources",
+    "reflection": "reflect_on_summary",
+    "finalize": "finalize_summary",
+}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values: List[float], share: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(share * len(ordered)) - 1, 0)]
+
+
+def rss_kib(pid: int) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+async def wait_ready(url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while True:
+            try:
+                await client.get(url, timeout=1)
+                return
+            except httpx.HTTPError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+                await asyncio.sleep(0.2)
+
+
+class Servers:
+    """The fake servers and the app, each in its own process, stopped together."""
+    def __init__(self, args):
+        self.args = args
+        self.processes: List[subprocess.Popen] = []
+        self.app_pid: Optional[int] = None
+        self.tmp = tempfile.TemporaryDirectory(prefix="bench_websocket_")
+
+    def _start(self, command, cwd=LOAD_DIR, env=None) -> subprocess.Popen:
+        process = subprocess.Popen(command, cwd=cwd, env=env)
+        self.processes.append(process)
+        return process
+
+    async def start(self) -> str:
+        args = self.args
+        llm_port, search_port, app_port = free_port(), free_port(), free_port()
+        self._start([
+            sys.executable, "fake_llm.py", "--port", str(llm_port), "--ttft", str(args.ttft),
+            "--tokens-per-second", str(args.tokens_per_second), "--think-tokens", str(args.think_tokens),
+            "--error-rate", str(args.error_rate),
+        ])
+        self._start([
+            sys.executable, "fake_tavily.py", "--port", str(search_port), "--latency", str(args.search_latency),
+            "--error-rate", str(args.error_rate),
+        ])
+        env = {
+            **os.environ,
+            "AZURE_INFERENCE_ENDPOINT": f"http://127.0.0.1:{llm_port}/openai/v1",
+            "AZURE_AI_API_KEY": "fake",
+            "AZURE_DEEPSEEK_DEPLOYMENT": "fake-deepseek",
+            "TAVILY_API_KEY": "fake",
+            "TAVILY_API_BASE_URL": f"http://127.0.0.1:{search_port}",
+            # Every run should reach the fake servers, and leave nothing behind
+            "SEARCH_CACHE_ENABLED": "false",
+            "LLM_CACHE_BACKEND": "none",
+            "CHECKPOINT_PATH": str(Path(self.tmp.name) / "checkpoints.sqlite"),
+            "BATCH_DIR": str(Path(self.tmp.name) / "batches"),
+        }
+        app = self._start(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(app_port), "--log-level", "warning"],
+            cwd=ROOT / "src", env=env,
+        )
+        self.app_pid = app.pid
+        await wait_ready(f"http://127.0.0.1:{llm_port}/docs")
+        await wait_ready(f"http://127.0.0.1:{search_port}/docs")
+        await wait_ready(f"http://127.0.0.1:{app_port}/stats")
+        return f"http://127.0.0.1:{app_port}"
+
+    def stop(self):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self.tmp.cleanup()
+
+
+class Results:
+    def __init__(self):
+        self.stages: Dict[str, List[float]] = defaultdict(list)
+        self.completed = 0
+        self.failed = 0
+        self.errors: Dict[str, int] = defaultdict(int)
+
+
+async def research_run(ws, topic: str, config: dict, results: Results, timeout: float):
+    """Run one research run on an open websocket and record its stage latencies."""
+    started = last = time.monotonic()
+    first_delta = None
+    previous = None
+    await ws.send(json.dumps({"type": "research", "topic": topic, "config": config}))
+
+    async def receive():
+        nonlocal first_delta, last, previous
+        while True:
+            message = json.loads(await ws.recv())
+            kind = message.get("type")
+            now = time.monotonic()
+            if kind == "thinking_delta" and first_delta is None:
+                first_delta = now
+                results.stages["first_thinking_delta"].append(now - started)
+            elif kind in STAGES:
+                if kind != previous:
+                    results.stages[STAGES[kind]].append(now - last)
+                    last = now
+                previous = kind
+            elif kind == "research_complete":
+                results.stages["run"].append(now - started)
+                return
+
+    await asyncio.wait_for(receive(), timeout)
+
+
+async def client(base_url: str, index: int, args, results: Results):
+    ws_url = base_url.replace("http", "ws", 1) + f"/ws/bench-{index}-{uuid.uuid4().hex[:8]}"
+    config = {"max_web_research_loops": args.loops, "queries_per_loop": args.queries_per_loop, "pipelined_search": args.pipelined}
+    async with websockets.connect(ws_url, max_size=None) as ws:
+        for run in range(args.runs):
+            try:
+                await research_run(ws, f"load test topic {index}.{run}", config, results, args.timeout)
+                results.completed += 1
+            except Exception as e:
+                results.failed += 1
+                results.errors[type(e).__name__] += 1
+                return  # The connection is in an unknown state after a failed run
+
+
+async def sample_memory(pid: int, samples: List[int], stop: asyncio.Event):
+    while not stop.is_set():
+        value = rss_kib(pid)
+        if value is not None:
+            samples.append(value)
+        try:
+            await asyncio.wait_for(stop.wait(), 0.2)
+        except asyncio.TimeoutError:
+            pass
+
+
+def report(results: Results, seconds: float, clients: int, baseline: Optional[int], peak: Optional[int], after: Optional[int]):
+    print(f"\n{'stage':<22}{'count':>7}{'p50 s':>9}{'p95 s':>9}{'p99 s':>9}{'max s':>9}")
+    order = ["first_thinking_delta", *STAGES.values(), "run"]
+    for stage in order:
+        values = results.stages.get(stage)
+        if not values:
+            continue
+        print(f"{stage:<22}{len(values):>7}" + "".join(f"{percentile(values, p):>9.3f}" for p in (0.5, 0.95, 0.99)) + f"{max(values):>9.3f}")
+    print(f"\nruns completed {results.completed}, failed {results.failed}" + (f" {dict(results.errors)}" if results.errors else ""))
+    print(f"wall time {seconds:.1f}s, {results.completed / seconds * 60:.1f} runs/min")
+    if baseline is not None and peak is not None:
+        print(f"app RSS: baseline {baseline / 1024:.1f} MiB, peak {peak / 1024:.1f} MiB, after {after / 1024:.1f} MiB")
+        print(f"memory per concurrent session: {(peak - baseline) / clients:.0f} KiB")
+
+
+async def main_async(args):
+    servers = None
+    base_url = args.url
+    pid = args.pid
+    try:
+        if base_url is None:
+            servers = Servers(args)
+            base_url = await servers.start()
+            pid = servers.app_pid
+
+        # One warm-up run loads the tokenizer and opens the pools before measuring
+        await client(base_url, -1, argparse.Namespace(**{**vars(args), "runs": 1}), Results())
+
+        baseline = rss_kib(pid) if pid else None
+        samples: List[int] = []
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(sample_memory(pid, samples, stop)) if pid else None
+
+        results = Results()
+        started = time.monotonic()
+        await asyncio.gather(*(client(base_url, i, args, results) for i in range(args.clients)))
+        seconds = time.monotonic() - started
+
+        stop.set()
+        if sampler is not None:
+            await sampler
+        after = rss_kib(pid) if pid else None
+        report(results, seconds, args.clients, baseline, max(samples, default=baseline), after)
+
+        async with httpx.AsyncClient() as http:
+            stats = (await http.get(f"{base_url}/stats")).json()
+        print(f"rate limiter retries: { {name: s['retries'] for name, s in stats.get('rate_limits', {}).items()} }")
+    finally:
+        if servers is not None:
+            servers.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--clients", type=int, default=10, help="concurrent websocket clients")
+    parser.add_argument("--runs", type=int, default=2, help="research runs per client")
+    parser.add_argument("--loops", type=int, default=2, help="max_web_research_loops of each run")
+    parser.add_argument("--queries-per-loop", type=int, default=1)
+    parser.add_argument("--pipelined", action="store_true", help="start each search while the query answer is still streaming")
+    parser.add_argument("--timeout", type=float, default=300, help="seconds before a run counts as failed")
+    parser.add_argument("--url", help="base URL of an app that is already running, instead of starting one")
+    parser.add_argument("--pid", type=int, help="process id of that app, to measure its memory")
+    parser.add_argument("--ttft", type=float, default=0.5, help="fake model seconds to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=60)
+    parser.add_argument("--think-tokens", type=int, default=120)
+    parser.add_argument("--search-latency", type=float, default=0.8)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of fake model and search requests that fail")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
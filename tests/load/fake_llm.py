@@ -0,0 +1,174 @@
+"""
+Fake chat-completions server for load tests.
+
+Streams a <think> block followed by an answer shaped like the one each
+research step asks for: JSON queries for query generation, JSON knowledge gaps
+for reflection and a paragraph of text for summaries. Time to first token,
+tokens per second and the share of failed requests are configurable, so the
+app can be driven at any load without calling Azure.
+
+Serves any POST path ending in chat/completions, both streamed (SSE) and not.
+Point the app at it with AZURE_INFERENCE_ENDPOINT=http://127.0.0.1:8101/openai/v1.
+
+Run from the repository root:
+    python tests/load/fake_llm.py --port 8101 --ttft 0.5 --tokens-per-second 60 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+import uuid
+from dataclasses import dataclass
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+WORDS = (
+    "research model latency throughput benchmark system memory cache query source summary network "
+    "architecture evaluation result method analysis performance cost accuracy dataset training inference "
+    "deployment scale token context retrieval ranking quality error budget policy limit report"
+).split()
+
+
+@dataclass
+class Settings:
+    ttft: float = 0.5 # Seconds before the first token
+    tokens_per_second: float = 60.0 # Streaming rate after the first token
+    think_tokens: int = 120 # Words of reasoning inside <think> tags
+    answer_tokens: int = 80 # Words of a summary answer
+    error_rate: float = 0.0 # Share of requests that fail before streaming
+    retry_after: float = 1.0 # Retry-After of the 429s among those failures
+    seed: int = 0
+
+
+settings = Settings()
+app = FastAPI(title="Fake chat completions")
+_calls = itertools.count(1)
+
+
+def words(rng: random.Random, count: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(count))
+
+
+def answer_for(messages, rng: random.Random, call: int) -> str:
+    """A completion shaped like the answer the prompt's research step parses."""
+    system = next((m.get("content") or "" for m in messages if m.get("role") == "system"), "")
+    if "knowledge gap" in system.lower():
+        query = f"{words(rng, 5)} {call}"
+        if "follow_up_queries" in system:
+            answer = {"knowledge_gap": words(rng, 12), "follow_up_queries": [query, f"{words(rng, 5)} {call}b"]}
+        else:
+            answer = {"knowledge_gap": words(rng, 12), "follow_up_query": query}
+        body = json.dumps(answer)
+    elif "web search quer" in system.lower():
+        if '"queries"' in system:
+            body = json.dumps({"queries": [f"{words(rng, 5)} {call}", f"{words(rng, 5)} {call}b"], "rationale": words(rng, 10)})
+        else:
+            body = json.dumps({"query": f"{words(rng, 5)} {call}", "aspect": words(rng, 2), "rationale": words(rng, 10)})
+    else:
+        body = words(rng, settings.answer_tokens).capitalize() + "."
+    return f"<think>\n{words(rng, settings.think_tokens)}\n</think>\n{body}"
+
+
+def tokens_of(text: str):
+    # One "token" per word, keeping the whitespace so the stream joins back to the text
+    start = 0
+    for i, char in enumerate(text):
+        if char in " \n" and i > start:
+            yield text[start:i]
+            start = i
+    yield text[start:]
+
+
+def usage(messages, text: str):
+    prompt = sum(len((m.get("content") or "")) for m in messages) // 4
+    completion = len(text.split())
+    return {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion}
+
+
+def error_response():
+    if random.random() < 0.5:
+        return JSONResponse(
+            {"error": {"code": "429", "message": "Rate limit exceeded"}},
+            status_code=429,
+            headers={"Retry-After": str(settings.retry_after)},
+        )
+    return JSONResponse({"error": {"code": "InternalServerError", "message": "Fake failure"}}, status_code=503)
+
+
+@app.post("/{path:path}")
+async def chat_completions(path: str, request: Request):
+    if not path.rstrip("/").endswith("chat/completions"):
+        return JSONResponse({"error": {"message": f"Unknown path /{path}"}}, status_code=404)
+    body = await request.json()
+    messages = body.get("messages", [])
+    model = body.get("model") or "fake"
+    call = next(_calls)
+    if settings.error_rate and random.random() < settings.error_rate:
+        return error_response()
+    text = answer_for(messages, random.Random(settings.seed * 1_000_003 + call), call)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+
+    if not body.get("stream"):
+        await asyncio.sleep(settings.ttft + len(text.split()) / settings.tokens_per_second)
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": usage(messages, text),
+        }
+
+    def chunk(delta, finish_reason=None, **extra):
+        return "data: " + json.dumps({
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if delta is not None else [],
+            **extra,
+        }) + "\n\n"
+
+    async def stream():
+        await asyncio.sleep(settings.ttft)
+        yield chunk({"role": "assistant", "content": ""})
+        # Pace tokens against the clock, so a slow event loop does not lower the rate further
+        interval = 1 / settings.tokens_per_second
+        next_at = time.monotonic()
+        for token in tokens_of(text):
+            delay = next_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            next_at += interval
+            yield chunk({"content": token})
+        yield chunk({}, "stop")
+        yield chunk(None, usage=usage(messages, text))
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8101)
+    parser.add_argument("--ttft", type=float, default=settings.ttft, help="seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=settings.tokens_per_second)
+    parser.add_argument("--think-tokens", type=int, default=settings.think_tokens)
+    parser.add_argument("--answer-tokens", type=int, default=settings.answer_tokens)
+    parser.add_argument("--error-rate", type=float, default=settings.error_rate, help="share of requests answered with a 429 or 503")
+    parser.add_argument("--retry-after", type=float, default=settings.retry_after)
+    parser.add_argument("--seed", type=int, default=settings.seed)
+    args = parser.parse_args()
+    for name in ("ttft", "tokens_per_second", "think_tokens", "answer_tokens", "error_rate", "retry_after", "seed"):
+        setattr(settings, name, getattr(args, name))
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
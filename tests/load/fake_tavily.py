@@ -0,0 +1,90 @@
+"""
+Fake Tavily search server for load tests.
+
+Answers POST /search with deterministic results for each query: a short
+content snippet, a full page when include_raw_content is set, and image URLs
+when include_images is set. Latency and the share of failed requests are
+configurable.
+
+Point the app at it with TAVILY_API_BASE_URL=http://127.0.0.1:8102.
+
+Run from the repository root:
+    python tests/load/fake_tavily.py --port 8102 --latency 0.8 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import hashlib
+import random
+from dataclasses import dataclass
+
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+from fake_llm import WORDS
+
+
+@dataclass
+class Settings:
+    latency: float = 0.8 # Mean seconds per search
+    jitter: float = 0.3 # Latency varies by up to this share either way
+    content_words: int = 120 # Words of each result's content snippet
+    page_words: int = 2000 # Words of each result's raw_content
+    error_rate: float = 0.0 # Share of searches that fail
+    retry_after: float = 1.0 # Retry-After of the 429s among those failures
+
+
+settings = Settings()
+app = FastAPI(title="Fake Tavily")
+
+
+def page(rng: random.Random, count: int) -> str:
+    # Lines of about a dozen words, so full pages split into passages like real ones
+    lines = [" ".join(rng.choice(WORDS) for _ in range(12)) for _ in range(max(count // 12, 1))]
+    return "\n".join(lines)
+
+
+@app.post("/search")
+async def search(body: dict):
+    query = body.get("query", "")
+    await asyncio.sleep(settings.latency * random.uniform(1 - settings.jitter, 1 + settings.jitter))
+    if settings.error_rate and random.random() < settings.error_rate:
+        if random.random() < 0.5:
+            return JSONResponse({"detail": {"error": "Rate limit exceeded"}}, status_code=429,
+                                headers={"Retry-After": str(settings.retry_after)})
+        return JSONResponse({"detail": {"error": "Fake failure"}}, status_code=503)
+
+    digest = hashlib.sha1(query.encode("utf-8")).hexdigest()
+    rng = random.Random(digest)
+    results = []
+    for i in range(int(body.get("max_results") or 5)):
+        result = {
+            "title": f"Result {i + 1} for {query}",
+            "url": f"https://example.com/{digest[:12]}/{i}",
+            "content": page(rng, settings.content_words).replace("\n", " "),
+            "score": round(1 - i * 0.1, 2),
+            "raw_content": page(rng, settings.page_words) if body.get("include_raw_content") else None,
+        }
+        results.append(result)
+    images = [f"https://example.com/{digest[:12]}/image{i}.png" for i in range(2)] if body.get("include_images") else []
+    return {"query": query, "results": results, "images": images, "response_time": settings.latency}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8102)
+    parser.add_argument("--latency", type=float, default=settings.latency, help="mean seconds per search")
+    parser.add_argument("--jitter", type=float, default=settings.jitter)
+    parser.add_argument("--content-words", type=int, default=settings.content_words)
+    parser.add_argument("--page-words", type=int, default=settings.page_words)
+    parser.add_argument("--error-rate", type=float, default=settings.error_rate, help="share of searches answered with a 429 or 503")
+    parser.add_argument("--retry-after", type=float, default=settings.retry_after)
+    args = parser.parse_args()
+    for name in ("latency", "jitter", "content_words", "page_words", "error_rate", "retry_after"):
+        setattr(settings, name, getattr(args, name))
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Tests for reading batch topic files.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from batch import parse_topics, topic_id
+
+
+def test_topics_are_parsed_with_checked_configs():
+    topics = parse_topics([
+        json.dumps({"topic": "first", "id": "a", "config": {"max_web_research_loops": "2"}}),
+        "",
+        json.dumps({"topic": "second"}),
+        json.dumps({"topic": "first again", "id": "a"}),
+    ])
+    assert topics == [
+        {"id": "a", "topic": "first", "config": {"max_web_research_loops": 2}},
+        {"id": topic_id("second"), "topic": "second", "config": {}},
+    ]
+
+
+@pytest.mark.parametrize("line", [
+    "not json",
+    json.dumps({"id": "a"}),
+    json.dumps({"topic": 42}),
+    json.dumps({"topic": "t", "config": "fast"}),
+    json.dumps({"topic": "t", "config": {"stopping_policy": "never"}}),
+])
+def test_invalid_lines_are_rejected(line):
+    with pytest.raises(ValueError, match="Line 1"):
+        parse_topics([line])
@@ -0,0 +1,48 @@
+"""
+Tests for the validation of per-run settings sent by clients.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from configuration import Configuration, ConfigurationError
+
+
+def test_values_are_converted_and_unknown_keys_dropped(monkeypatch):
+    monkeypatch.setenv("AZURE_DEEPSEEK_DEPLOYMENT", "default-deployment")
+    configurable = Configuration.configurable_from_request({
+        "max_web_research_loops": "3",
+        "fetch_full_page": "true",
+        "llm_deployment": "default-deployment",
+        "unknown": 1,
+    })
+    assert configurable == {"max_web_research_loops": 3, "fetch_full_page": True, "llm_deployment": "default-deployment"}
+    assert Configuration.configurable_from_request(None) == {}
+
+
+def test_costly_settings_are_clamped(monkeypatch):
+    monkeypatch.setenv("MAX_WEB_RESEARCH_LOOPS_LIMIT", "6")
+    configurable = Configuration.configurable_from_request({"max_web_research_loops": 1000, "queries_per_loop": 0})
+    assert configurable == {"max_web_research_loops": 6, "queries_per_loop": 1}
+
+
+@pytest.mark.parametrize("request_config", [
+    [1],
+    {"max_web_research_loops": "abc"},
+    {"queries_per_loop": 1.5},
+    {"min_summary_change": "nan"},
+    {"fetch_full_page": "maybe"},
+    {"stopping_policy": "never"},
+    {"llm_deployment": "not-configured"},
+])
+def test_invalid_settings_are_rejected(monkeypatch, request_config):
+    monkeypatch.setenv("AZURE_DEEPSEEK_DEPLOYMENT", "default-deployment")
+    monkeypatch.delenv("ALLOWED_LLM_DEPLOYMENTS", raising=False)
+    with pytest.raises(ConfigurationError):
+        Configuration.configurable_from_request(request_config)
@@ -0,0 +1,56 @@
+"""
+Tests for fitting prompt sections into a token budget.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from context_budget import TokenCounter, fit_sections, trim_paragraphs
+
+# One token per character keeps the budgets below easy to follow
+COUNTER = TokenCounter(encoding_name=None, chars_per_token=1.0)
+
+TEXT = "a" * 10 + "\n\n" + "b" * 10 + "\n\n" + "c" * 10
+
+
+def test_text_within_budget_is_unchanged():
+    assert trim_paragraphs(TEXT, 100, COUNTER) == (TEXT, "")
+
+
+def test_whole_paragraphs_go_from_the_other_end():
+    # Two paragraphs and the separator between them fit into 21 tokens
+    assert trim_paragraphs(TEXT, 21, COUNTER, keep="end") == ("b" * 10 + "\n\n" + "c" * 10, "a" * 10)
+    assert trim_paragraphs(TEXT, 21, COUNTER, keep="start") == ("a" * 10 + "\n\n" + "b" * 10, "c" * 10)
+    assert trim_paragraphs(TEXT, 15, COUNTER, keep="end") == ("c" * 10, "a" * 10 + "\n\n" + "b" * 10)
+
+
+def test_budget_smaller_than_one_paragraph_cuts_the_nearest_one():
+    assert trim_paragraphs(TEXT, 4, COUNTER, keep="end") == ("cccc", "a" * 10 + "\n\n" + "b" * 10 + "\n\n" + "c" * 6)
+    assert trim_paragraphs(TEXT, 4, COUNTER, keep="start") == ("aaaa", "a" * 6 + "\n\n" + "b" * 10 + "\n\n" + "c" * 10)
+
+
+def test_zero_budget_drops_everything():
+    assert trim_paragraphs(TEXT, 0, COUNTER, keep="end") == ("", TEXT)
+    assert trim_paragraphs(TEXT, 0, COUNTER, keep="start") == ("", TEXT)
+
+
+def test_fit_sections_trims_the_oldest_section_from_its_configured_end():
+    summary = "old" * 5 + "\n\n" + "new" * 5
+    context = "first" * 4 + "\n\n" + "last" * 5
+    total = COUNTER.count(summary) + COUNTER.count(context)
+
+    # The summary gives up its oldest paragraph; the context is untouched
+    kept, dropped = fit_sections([(summary, "end"), (context, "start")], total - 10, COUNTER)
+    assert kept == ["new" * 5, context]
+    assert dropped == ["old" * 5, ""]
+
+    # Once the summary is gone, the context loses its end
+    kept, dropped = fit_sections([(summary, "end"), (context, "start")], 20, COUNTER)
+    assert kept == ["", "first" * 4]
+    assert dropped == [summary, "last" * 5]
+
+    assert fit_sections([(summary, "end"), (context, "start")], total, COUNTER) == ([summary, context], ["", ""])
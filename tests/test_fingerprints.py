@@ -0,0 +1,74 @@
+"""
+Tests for SimHash fingerprints and the near-duplicate index.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from configuration import Configuration
+from fingerprints import MAX_NEAR_DUPLICATE_DISTANCE, FingerprintIndex, hamming_distance, simhash, source_text
+
+VOCABULARY = [f"word{i}" for i in range(500)]
+
+
+def page(rng: random.Random, words: int = 200) -> list:
+    return [rng.choice(VOCABULARY) for _ in range(words)]
+
+
+def test_hamming_distance():
+    assert hamming_distance(0b1011, 0b1011) == 0
+    assert hamming_distance(0b1011, 0b0010) == 2
+    assert hamming_distance(0, (1 << 64) - 1) == 64
+
+
+def test_short_texts_are_not_fingerprinted():
+    assert simhash("too short to say anything") is None
+    assert simhash("") is None
+
+
+def test_near_copies_are_close_and_unrelated_pages_far():
+    rng = random.Random(7)
+    for _ in range(10):
+        words = page(rng, 1000)
+        edited = list(words)
+        edited[500] = "changed"
+        original = simhash(" ".join(words))
+        assert simhash(" ".join(words)) == original
+        assert hamming_distance(original, simhash(" ".join(edited))) <= 8
+        assert hamming_distance(original, simhash(" ".join(page(rng, 1000)))) > MAX_NEAR_DUPLICATE_DISTANCE
+
+
+@pytest.mark.parametrize("max_distance", [0, 3, 8, MAX_NEAR_DUPLICATE_DISTANCE])
+def test_index_finds_exactly_the_fingerprints_within_distance(max_distance):
+    rng = random.Random(max_distance)
+    indexed = [rng.getrandbits(64) for _ in range(200)]
+    index = FingerprintIndex(indexed, max_distance=max_distance)
+    assert len(index) == 200
+    for fingerprint in indexed[:50]:
+        # Flip up to twice the distance so lookups both hit and miss
+        probe = fingerprint
+        for bit in rng.sample(range(64), rng.randint(0, 2 * max_distance + 1)):
+            probe ^= 1 << bit
+        expected = any(hamming_distance(probe, other) <= max_distance for other in indexed)
+        found = index.find(probe)
+        assert (found is not None) == expected
+        if found is not None:
+            assert hamming_distance(found, probe) <= max_distance
+
+
+def test_client_distance_is_capped_for_the_index():
+    assert Configuration.configurable_from_request({"near_duplicate_distance": 64}) == {"near_duplicate_distance": MAX_NEAR_DUPLICATE_DISTANCE}
+    assert FingerprintIndex(max_distance=MAX_NEAR_DUPLICATE_DISTANCE).band_bits >= 4
+
+
+def test_source_text_prefers_the_full_page():
+    assert source_text({"content": "snippet", "raw_content": "full page"}) == "full page"
+    assert source_text({"content": "snippet", "raw_content": None}) == "snippet"
+    assert source_text({}) == ""
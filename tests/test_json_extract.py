@@ -0,0 +1,91 @@
+"""
+Tests for reading the JSON answer out of a streamed completion.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from configuration import Configuration
+from json_extract import JSONObjectExtractor, extract_json_object
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('Sure, here is the query:\n```json\n{"query": "heat pumps"}\n```\nLet me know!', {"query": "heat pumps"}),
+    ('{"query": "a {b} \\"quoted\\" }", "rationale": "ends with \\\\"}', {"query": 'a {b} "quoted" }', "rationale": "ends with \\"}),
+    ('For example {"rationale": "why"} or {broken}. Answer: {"query": "real"}', {"query": "real"}),
+    ('{"answer": {"query": "inner", "rationale": "r"}, "note": 1}', {"query": "inner", "rationale": "r"}),
+    ('<think>Maybe {"query": "draft"}?</think>{"query": "final"}', {"query": "final"}),
+    ('{"query": "line one\nline two"}', {"query": "line one\nline two"}),
+])
+def test_first_object_with_the_required_keys_is_extracted(text, expected):
+    assert extract_json_object(text, ("query",)) == expected
+
+
+def test_no_object_gives_none():
+    assert extract_json_object('No JSON here, just {"other": 1}', ("query",)) is None
+    assert extract_json_object('{"query": "never closed"', ("query",)) is None
+
+
+def test_feeding_one_character_at_a_time_stops_at_the_closing_brace():
+    text = 'Thinking done. {"query": "heat pumps", "nested": {"a": [1, "}"]}} trailing text'
+    end = text.index("}} ") + 2
+    extractor = JSONObjectExtractor(("query",))
+    done_at = [i for i, char in enumerate(text, 1) if extractor.feed(char)]
+    assert done_at[0] == end
+    assert done_at == list(range(end, len(text) + 1))
+    assert extractor.close() == {"query": "heat pumps", "nested": {"a": [1, "}"]}}
+
+
+def test_fields_are_reported_in_order_as_each_value_completes():
+    answer = {"knowledge_gap": "costs", "follow_up_queries": ["a", "b"], "detail": {"x": [1, 2]}, "count": 3, "ok": True}
+    text = "<think>{\"knowledge_gap\": \"draft\"}</think>" + json.dumps(answer)
+    fed = []
+    fields = []
+    extractor = JSONObjectExtractor(("knowledge_gap",), on_field=lambda key, value: fields.append((key, value, len(fed))))
+    for char in text:
+        fed.append(char)
+        extractor.feed(char)
+    assert [(key, value) for key, value, _ in fields] == list(answer.items())
+    # Each field fires while the rest of the object is still streaming
+    streamed = "".join(fed)
+    assert fields[0][2] < streamed.index('"follow_up_queries"')
+    assert fields[1][2] < streamed.index('"detail"')
+
+
+def test_invoke_for_json_retries_within_budget(main, monkeypatch):
+    def run(answers, max_json_retries):
+        calls = []
+
+        async def invoke_model(node, messages, configuration, client_id=None, until=None):
+            calls.append(messages)
+            answer = answers[len(calls) - 1]
+            if until is not None:
+                until(answer)
+            return answer
+
+        monkeypatch.setattr(main, "invoke_model", invoke_model)
+        thoughts, result = asyncio.run(main.invoke_for_json(
+            "generate_query", ["prompt"], Configuration(max_json_retries=max_json_retries), ("query",)
+        ))
+        return calls, thoughts, result
+
+    calls, _, result = run(["no json", "still none", '{"query": "q"}'], max_json_retries=1)
+    assert result is None and len(calls) == 2
+    # The retry shows the model its answer and asks for the object again
+    assert calls[1][0] == "prompt" and calls[1][1].content == "no json"
+    assert "query" in calls[1][2].content
+
+    calls, thoughts, result = run(["<think>hmm</think>no json", '<think>ok</think>{"query": "q"}'], max_json_retries=1)
+    assert result == {"query": "q"} and len(calls) == 2
+    assert thoughts == "hmm\n\nok"
+
+    calls, _, result = run(["no json", '{"query": "q"}'], max_json_retries=0)
+    assert result is None and len(calls) == 1
@@ -0,0 +1,109 @@
+"""
+Tests for the per-connection outbound message queue.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from outbound import OutboundQueue
+
+
+class FakeWebSocket:
+    def __init__(self, fail: bool = False):
+        self.sent = []
+        self.fail = fail
+
+    async def send_json(self, message):
+        if self.fail:
+            raise RuntimeError("socket closed")
+        self.sent.append(message)
+
+
+def delta(call: str, text: str, message_type: str = "thinking_delta"):
+    return {"type": message_type, "data": {"call": call, "delta": text}}
+
+
+def test_deltas_of_the_same_call_are_merged():
+    async def scenario():
+        queue = OutboundQueue(FakeWebSocket())
+        for message in (delta("a", "one "), delta("a", "two"), delta("b", "other"), delta("b", "!", "summary_delta"), delta("b", "?", "summary_delta")):
+            await queue.put(message)
+        assert list(queue._queue) == [delta("a", "one two"), delta("b", "other"), delta("b", "!?", "summary_delta")]
+        assert queue.stats()["coalesced"] == 2
+
+    asyncio.run(scenario())
+
+
+def test_newer_superseded_message_replaces_the_queued_one():
+    async def scenario():
+        queue = OutboundQueue(FakeWebSocket())
+        await queue.put({"type": "summarize", "data": {"summary": "old"}})
+        await queue.put({"type": "web_research", "data": {}})
+        await queue.put({"type": "summarize", "data": {"summary": "new"}})
+        assert [message["type"] for message in queue._queue] == ["web_research", "summarize"]
+        assert queue._queue[-1]["data"]["summary"] == "new"
+
+    asyncio.run(scenario())
+
+
+def test_drop_policy_drops_deltas_but_waits_with_other_messages():
+    async def scenario():
+        websocket = FakeWebSocket()
+        queue = OutboundQueue(websocket, max_size=2, policy="drop")
+        await queue.put({"type": "web_research", "data": {}})
+        await queue.put(delta("a", "x"))
+        await queue.put(delta("b", "dropped"))
+        assert queue.stats()["dropped"] == 1
+
+        producer = asyncio.create_task(queue.put({"type": "routing", "data": {}}))
+        await asyncio.sleep(0)
+        assert not producer.done() and queue.stats()["blocked"] == 1
+
+        queue.start()
+        await asyncio.wait_for(producer, 1)
+        await asyncio.sleep(0.01)
+        assert [message["type"] for message in websocket.sent] == ["web_research", "thinking_delta", "routing"]
+        await queue.close()
+
+    asyncio.run(scenario())
+
+
+def test_block_policy_waits_with_deltas_too():
+    async def scenario():
+        websocket = FakeWebSocket()
+        queue = OutboundQueue(websocket, max_size=1, policy="block")
+        await queue.put(delta("a", "first"))
+        producer = asyncio.create_task(queue.put(delta("b", "second")))
+        await asyncio.sleep(0)
+        assert not producer.done()
+
+        queue.start()
+        await asyncio.wait_for(producer, 1)
+        await asyncio.sleep(0.01)
+        assert websocket.sent == [delta("a", "first"), delta("b", "second")]
+        assert queue.stats()["dropped"] == 0
+        await queue.close()
+
+    asyncio.run(scenario())
+
+
+def test_failed_send_closes_the_queue_and_releases_producers():
+    async def scenario():
+        queue = OutboundQueue(FakeWebSocket(fail=True), max_size=1, policy="block")
+        await queue.put({"type": "web_research", "data": {}})
+        producer = asyncio.create_task(queue.put({"type": "routing", "data": {}}))
+        await asyncio.sleep(0)
+
+        queue.start()
+        await asyncio.wait_for(producer, 1)
+        assert queue.closed and len(queue) == 0
+        await queue.put({"type": "finalize", "data": {}})
+        assert len(queue) == 0 and queue.stats()["sent"] == 0
+        await queue.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,46 @@
+"""
+Tests for picking the passages of long pages that best match the research queries.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from passages import PASSAGE_SEPARATOR, BM25Index, select_passages, split_passages
+
+FILLER = "The company history section lists offices, founders and early products of the firm."
+MATCH = "Heat pump efficiency drops in cold climates, and the coefficient of performance falls below two."
+
+
+def test_bm25_ranks_the_matching_passage_first():
+    scores = BM25Index([FILLER, MATCH, "Opening hours and parking information for visitors."]).scores("heat pump efficiency cold")
+    assert scores.argmax() == 1
+    assert scores[0] == 0 and scores[2] == 0
+
+
+def test_rarer_terms_weigh_more():
+    index = BM25Index(["pump pump", "pump efficiency", "pump", "pump"])
+    scores = index.scores("pump efficiency")
+    assert scores[1] > scores[0] > 0
+
+
+def test_unknown_query_terms_score_nothing():
+    assert not BM25Index([FILLER, MATCH]).scores("zeppelin").any()
+    assert BM25Index([]).scores("anything").shape == (0,)
+
+
+def test_split_passages_keeps_whole_lines_within_the_word_limit():
+    text = "one two three\n\nfour five\nsix seven eight nine\n" + " ".join(["long"] * 7)
+    assert split_passages(text, max_words=5) == ["one two three\nfour five", "six seven eight nine", "long long long long long", "long long"]
+
+
+def test_select_passages_keeps_the_best_passages_in_page_order():
+    page = "\n".join([FILLER, MATCH, FILLER, FILLER, MATCH.replace("two", "three")])
+    short = "Already short enough."
+    budget = 60  # Room for about two of the passages at 4 characters per token
+    selected = select_passages([page, short], "heat pump efficiency in cold climates", budget, max_words=20)
+    assert selected[1] == short
+    assert selected[0] == MATCH + PASSAGE_SEPARATOR + MATCH.replace("two", "three")
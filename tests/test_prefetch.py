@@ -0,0 +1,62 @@
+"""
+Tests for searches started while a query or reflection answer is still streaming.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from configuration import Configuration
+from prefetch import SearchPrefetcher
+from states import SummaryState
+
+
+def reflection_prefetches(main, fields, **state):
+    state = SummaryState(**{"research_topic": "heat pumps", "research_loop_count": 1, "previous_summary": "heat pumps",
+                            "running_summary": "heat pumps are efficient in cold climates", **state})
+    configuration = Configuration(max_web_research_loops=4, min_web_research_loops=1)
+    prefetched = []
+    on_field = main.continuing_only(lambda key, value: prefetched.append(value), state, configuration, "follow_up_query")
+    for key, value in fields:
+        on_field(key, value)
+    return prefetched
+
+
+def test_follow_up_is_prefetched_while_a_gap_remains(main):
+    fields = [("knowledge_gap", "None of the sources quantify installation costs"), ("follow_up_query", "heat pump installation cost")]
+    assert reflection_prefetches(main, fields) == ["heat pump installation cost"]
+
+
+@pytest.mark.parametrize("fields, state", [
+    ([("knowledge_gap", "No knowledge gaps remain."), ("follow_up_query", "heat pump brands")], {}),
+    ([("knowledge_gap", "Costs are missing"), ("follow_up_query", "Heat pump costs?")], {"queries_tried": ["heat pump costs"]}),
+    ([("knowledge_gap", "Costs are missing"), ("follow_up_query", "heat pump costs")], {"research_loop_count": 4}),
+])
+def test_no_prefetch_when_research_will_stop(main, fields, state):
+    assert reflection_prefetches(main, fields, **state) == []
+
+
+def test_prefetcher_hands_over_or_cancels_searches():
+    async def scenario():
+        prefetcher = SearchPrefetcher()
+
+        async def search():
+            await asyncio.sleep(10)
+
+        assert prefetcher.start("run", "first", search)
+        assert not prefetcher.start("run", "first", search)
+        prefetcher.start("run", "second", search)
+        taken = prefetcher.take("run", "first")
+        assert taken is not None and prefetcher.take("run", "missing") is None
+        assert prefetcher.discard("run") == 1
+        await asyncio.sleep(0)
+        assert prefetcher.stats() == {"started": 2, "used": 1, "discarded": 1, "pending": 0}
+        taken.cancel()
+
+    asyncio.run(scenario())
@@ -0,0 +1,63 @@
+"""
+Tests for the shared rate limiter.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from rate_limit import RateLimiter, RetryPolicy
+
+
+class Throttled(Exception):
+    status_code = 429
+    retry_after = 0
+
+
+def flaky(failures: int):
+    attempts = []
+
+    async def request():
+        attempts.append(1)
+        if len(attempts) <= failures:
+            raise Throttled()
+        return "ok"
+
+    return request, attempts
+
+
+def test_retries_reserve_tokens_once():
+    async def scenario():
+        limiter = RateLimiter("test", tokens_per_minute=60000, retry=RetryPolicy(max_attempts=3, base_delay=0))
+        request, attempts = flaky(2)
+        assert await limiter.call(request, tokens=1000) == "ok"
+        assert len(attempts) == 3
+        limiter.settle(1000, 1000)
+        # Only the one call's 1000 tokens are gone from the 10000 token burst
+        assert limiter._tokens.tokens == pytest.approx(9000, abs=50)
+
+    asyncio.run(scenario())
+
+
+def test_streams_reserve_tokens_once():
+    async def scenario():
+        limiter = RateLimiter("test", tokens_per_minute=60000, retry=RetryPolicy(max_attempts=3, base_delay=0))
+        attempts = []
+
+        async def start():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise Throttled()
+            yield "chunk"
+
+        assert [chunk async for chunk in limiter.stream(start, tokens=1000)] == ["chunk"]
+        limiter.settle(1000, 1200)
+        assert limiter._tokens.tokens == pytest.approx(8800, abs=50)
+
+    asyncio.run(scenario())
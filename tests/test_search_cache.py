@@ -0,0 +1,75 @@
+"""
+Tests for the search cache and the shared Tavily client.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from caching import LRUCache, SQLiteCache, TieredCache
+from search_client import SearchClient
+
+
+class CountingSearchClient(SearchClient):
+    def __init__(self, **kwargs):
+        super().__init__(api_key="test", **kwargs)
+        self.calls = 0
+
+    async def _search(self, query, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return {"query": query, "results": []}
+
+
+def test_sqlite_cache_evicts_in_batches(tmp_path):
+    cache = SQLiteCache(tmp_path / "cache.db", max_entries=10)
+    for i in range(11):
+        cache.set(f"key-{i}", i)
+    # Going over the limit trims the table a tenth below it, so the next write does not evict again
+    assert len(cache) == 9
+    assert cache.evictions == 2
+    cache.set("key-11", 11)
+    assert cache.evictions == 2
+    assert cache.get("key-11") == 11 and cache.get("key-0") is None
+
+
+def test_concurrent_identical_searches_share_one_request(tmp_path):
+    async def scenario():
+        cache = TieredCache(LRUCache(), SQLiteCache(tmp_path / "cache.db"))
+        client = CountingSearchClient(cache=cache)
+        results = await asyncio.gather(*(client.search("same query", max_results=3) for _ in range(5)))
+        assert client.calls == 1
+        assert all(result == results[0] for result in results)
+        assert client.stats()["shared_requests"] == 4
+
+        # Later searches are answered from the cache
+        assert await client.search("same query", max_results=3) == results[0]
+        assert client.calls == 1
+        await client.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_caller_does_not_cancel_a_shared_search():
+    async def scenario():
+        client = CountingSearchClient()
+        first = asyncio.ensure_future(client.search("query"))
+        second = asyncio.ensure_future(client.search("query"))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        assert (await second)["query"] == "query"
+
+        # When every caller is gone, the request is cancelled too
+        lone = asyncio.ensure_future(client.search("other"))
+        await asyncio.sleep(0.01)
+        (request,) = client._inflight.values()
+        lone.cancel()
+        await asyncio.sleep(0.01)
+        assert request.cancelled() and not client._inflight
+        await client.aclose()
+
+    asyncio.run(scenario())
@@ -0,0 +1,86 @@
+"""
+Tests for the websocket session registry.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from sessions import SessionRegistry
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_json(self, message):
+        self.sent.append(message)
+
+
+def test_old_connection_closing_leaves_the_reconnected_one_alone():
+    async def scenario():
+        sessions = SessionRegistry()
+        old, new = FakeWebSocket(), FakeWebSocket()
+        await sessions.connect(old, "client")
+        session = await sessions.connect(new, "client")
+
+        # The reconnected client starts a run, then the old socket's disconnect handler runs
+        session.start_run()
+        session.task = asyncio.create_task(asyncio.sleep(10))
+        assert not await sessions.cancel_run("client", old)
+        await sessions.disconnect("client", old)
+
+        assert session.is_running
+        assert session.websocket is new
+        await sessions.send("client", {"type": "ping"})
+        await asyncio.sleep(0)
+        assert new.sent == [{"type": "ping"}]
+        assert sessions.stats()["runs_cancelled"] == 0
+
+        # The current socket's own disconnect still cancels its run
+        assert await sessions.cancel_run("client", new)
+        await sessions.disconnect("client", new)
+        assert "client" not in sessions
+
+    asyncio.run(scenario())
+
+
+def test_run_that_sent_its_report_is_not_counted_as_cancelled():
+    async def scenario():
+        sessions = SessionRegistry()
+        websocket = FakeWebSocket()
+        session = await sessions.connect(websocket, "client")
+        saved = asyncio.Event()
+
+        async def run():
+            session.run_complete = True
+            await saved.wait() # Still saving the run's status when the client leaves
+            sessions.finish_run("client")
+
+        session.start_run(expected_llm_calls=5, expected_search_calls=2)
+        session.task = asyncio.create_task(run())
+        await asyncio.sleep(0)
+        asyncio.get_running_loop().call_later(0.01, saved.set)
+
+        assert not await sessions.cancel_run("client", websocket)
+        assert session.task.done() and not session.task.cancelled()
+        stats = sessions.stats()
+        assert stats["runs_cancelled"] == 0
+        assert stats["saved_llm_calls"] == 0 and stats["saved_search_calls"] == 0
+        assert stats["runs_completed"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_public_stats_do_not_list_client_ids():
+    async def scenario():
+        sessions = SessionRegistry()
+        await sessions.connect(FakeWebSocket(), "secret-client")
+        assert "secret-client" not in repr(sessions.stats())
+        assert list(sessions.session_stats()) == ["secret-client"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,87 @@
+"""
+Tests for the signals and policy that decide when research stops.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from configuration import Configuration
+from stopping import LoopSignals, StoppingPolicy, has_knowledge_gap, is_repeated_query, new_source_share, summary_change
+
+
+@pytest.mark.parametrize("knowledge_gap", [
+    "National adoption figures are missing",
+    "Natural gas pricing after 2023 is not covered",
+    "None of the sources quantify the cost",
+    "No data on gaps in EU rollout",
+    None,
+])
+def test_real_gaps_count_as_gaps(knowledge_gap):
+    assert has_knowledge_gap(knowledge_gap)
+
+
+@pytest.mark.parametrize("knowledge_gap", [
+    "",
+    "  ",
+    "None",
+    "none.",
+    "N/A",
+    "na",
+    "No knowledge gaps",
+    "No gaps remain.",
+    "No further gaps identified",
+    "No specific knowledge gap identified.",
+])
+def test_no_gap_answers_do_not_count_as_gaps(knowledge_gap):
+    assert not has_knowledge_gap(knowledge_gap)
+
+
+def test_summary_change():
+    assert summary_change(None, "anything at all") == 1.0
+    assert summary_change("the cat sat on the mat", "the cat sat on the mat") == 0.0
+    assert summary_change("the cat sat on the mat", "a dog ran in the park") == 1.0
+    assert 0.0 < summary_change("the cat sat on the mat", "the cat sat on the rug") < 1.0
+
+
+def test_new_source_share():
+    assert new_source_share([], ["a"]) == 0.0
+    assert new_source_share(["a", "b", "c", "d"], ["a", "b"]) == 0.5
+    assert new_source_share(["a"], []) == 1.0
+
+
+def test_repeated_query_ignores_case_and_punctuation():
+    assert is_repeated_query(["Solar Panel Efficiency?"], ["solar panel efficiency"])
+    assert not is_repeated_query(["solar panel efficiency", "wind farms"], ["solar panel efficiency"])
+    assert not is_repeated_query([], ["solar panel efficiency"])
+
+
+def test_policy_runs_between_min_and_max_loops():
+    policy = StoppingPolicy(min_loops=2, max_loops=4)
+    converged = LoopSignals(summary_change=0.0, knowledge_gap=False)
+    assert policy.stop_reason(1, converged) is None
+    assert policy.stop_reason(2, converged) == "no_knowledge_gap"
+    assert policy.stop_reason(2, LoopSignals()) is None
+    assert policy.stop_reason(4, LoopSignals()) == "max_loops"
+
+
+@pytest.mark.parametrize("signals, reason", [
+    (LoopSignals(repeated_query=True), "repeated_query"),
+    (LoopSignals(summary_change=0.05), "summary_converged"),
+    (LoopSignals(new_source_share=0.1), "no_new_sources"),
+])
+def test_policy_stop_reasons(signals, reason):
+    assert StoppingPolicy(min_loops=1, max_loops=4).stop_reason(1, signals) == reason
+
+
+def test_fixed_policy_always_runs_the_maximum():
+    policy = StoppingPolicy.from_configuration(Configuration(max_web_research_loops=3, stopping_policy="fixed"))
+    converged = LoopSignals(summary_change=0.0, new_source_share=0.0, repeated_query=True, knowledge_gap=False)
+    assert policy.stop_reason(2, converged) is None
+    assert policy.stop_reason(3, converged) == "max_loops"
+    assert policy.loops_saved(3) == 0
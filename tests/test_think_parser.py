@@ -0,0 +1,77 @@
+"""
+Tests for splitting streamed completions into thinking and answer text.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from think_parser import ThinkTagParser, strip_thinking_tokens
+
+TEXT = "Intro <think>step one < two</think> the answer <think>more</think> end"
+
+
+def split(chunks):
+    """Feed the chunks and return the joined thinking and answer text, and the raw segments."""
+    parser = ThinkTagParser()
+    segments = [segment for chunk in chunks for segment in parser.feed(chunk)] + parser.close()
+    thinking = "".join(text for is_thinking, text in segments if is_thinking)
+    answer = "".join(text for is_thinking, text in segments if not is_thinking)
+    return thinking, answer, segments
+
+
+def test_whole_text():
+    thinking, answer, segments = split([TEXT])
+    assert thinking == "step one < twomore"
+    assert answer == "Intro  the answer  end"
+    assert [is_thinking for is_thinking, _ in segments] == [False, True, False, True, False]
+
+
+@pytest.mark.parametrize("offset", range(1, len(TEXT)))
+def test_split_at_every_offset(offset):
+    assert split([TEXT[:offset], TEXT[offset:]])[:2] == split([TEXT])[:2]
+
+
+def test_tags_split_across_three_chunks():
+    expected = split([TEXT])[:2]
+    for tag in ("<think>", "</think>"):
+        start = TEXT.index(tag)
+        for first in range(start, start + len(tag)):
+            for second in range(first + 1, start + len(tag) + 1):
+                assert split([TEXT[:first], TEXT[first:second], TEXT[second:]])[:2] == expected
+
+
+def test_one_character_at_a_time():
+    assert split(list(TEXT))[:2] == split([TEXT])[:2]
+
+
+def test_unclosed_tag_keeps_thinking():
+    parser = ThinkTagParser()
+    assert parser.feed("answer <think>still going") == [(False, "answer "), (True, "still going")]
+    assert parser.in_thinking
+    assert parser.close() == []
+
+
+def test_close_flushes_a_partial_tag():
+    parser = ThinkTagParser()
+    assert parser.feed("answer <thi") == [(False, "answer ")]
+    assert parser.close() == [(False, "<thi")]
+
+    parser = ThinkTagParser()
+    assert parser.feed("<think>idea</thin") == [(True, "idea")]
+    assert parser.close() == [(True, "</thin")]
+
+
+def test_empty_thinking_block_still_yields_a_segment():
+    assert split(["<think></think>answer"])[2] == [(True, ""), (False, "answer")]
+
+
+def test_strip_thinking_tokens():
+    assert strip_thinking_tokens(" <think> a </think> b <think>c</think> ") == ("a\n\nc", "b")
+    assert strip_thinking_tokens("no tags ") == ("", "no tags")
+    assert strip_thinking_tokens("<think>never closed") == ("", "<think>never closed")